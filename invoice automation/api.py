@@ -0,0 +1,298 @@
+# api.py
+"""
+JSON API for integrations: read invoices, and create, patch or mark
+paid many invoices per request.
+
+Each batch endpoint takes up to API_MAX_BATCH_SIZE invoices and applies
+them in one transaction. Validation and lookups happen before anything
+is written. If any entry fails, nothing is written and the response is
+422. The body always has one result per entry, in request order:
+
+    {"ok": true, "results": [{"index": 0, "status": "created", "id": 7, "invoice": {...}}, ...]}
+
+The status is created / updated / unchanged on success, and invalid /
+not_found on failure (with an "error" message). In a rejected batch the
+valid entries get "skipped". ?fields=id,amount,items picks the invoice
+fields in responses; ?fields= leaves the invoices out entirely. Request
+bodies may be sent gzipped with Content-Encoding: gzip; responses are
+gzipped by compression.py. A body over API_MAX_BATCH_BYTES, as sent or
+once gunzipped, is refused with 413 before it is parsed.
+"""
+import json
+import zlib
+from datetime import datetime
+
+from flask import Blueprint, abort, current_app, jsonify, make_response, request
+from sqlalchemy.orm import selectinload
+
+from models import db, Invoice
+from importer import validate, validate_items, write_invoices
+from invoice_items import rows_total, sync_items
+from pdf_cache import pdf_cache
+from result_cache import result_cache
+import archive
+import money
+import rollups
+import search
+
+bp = Blueprint("api", __name__, url_prefix="/api")
+
+FIELDS = ("id", "client_name", "client_email", "description", "issue_date", "due_date", "amount", "status", "items")
+DEFAULT_FIELDS = FIELDS[:-1]  # Invoice.to_dict()
+PATCHABLE = {"client_name", "client_email", "description", "issue_date", "due_date", "status", "items"}
+
+
+# --- Fields ---
+def _error(status, message):
+    abort(make_response(jsonify({"error": message}), status))
+
+
+def selected_fields(args, default=DEFAULT_FIELDS):
+    """The ?fields= list (comma separated) checked against FIELDS, else `default`."""
+    raw = args.get("fields")
+    if raw is None:
+        return default
+    fields = tuple(dict.fromkeys(name.strip() for name in raw.split(",") if name.strip()))
+    unknown = [name for name in fields if name not in FIELDS]
+    if unknown:
+        _error(400, f"unknown field(s) {', '.join(unknown)}; choose from {', '.join(FIELDS)}")
+    return fields
+
+
+def serialize(invoice, fields):
+    """The invoice's `fields` as a dict; load the items first if "items" is one of them."""
+    values = invoice.to_dict()
+    data = {name: values[name] for name in fields if name != "items"}
+    if "items" in fields:
+        data["items"] = [item.to_dict() for item in sorted(invoice.items, key=lambda i: i.id)]
+    return data
+
+
+def _load(ids, fields):
+    """{id: Invoice} for these live invoices in one query, plus one for the items if they're needed."""
+    query = Invoice.query.filter(Invoice.id.in_(ids))
+    if "items" in fields:
+        query = query.options(selectinload(Invoice.items))
+    return {invoice.id: invoice for invoice in query.populate_existing()}
+
+
+# --- Reads ---
+@bp.route("/invoices/<int:invoice_id>")
+def get_invoice(invoice_id):
+    """One invoice, with its items unless ?fields= says otherwise; archived invoices too."""
+    fields = selected_fields(request.args, FIELDS)
+    invoice = _load([invoice_id], fields).get(invoice_id) or archive.find_invoice(invoice_id)
+    if invoice is None:
+        _error(404, f"invoice {invoice_id} not found")
+    return jsonify(serialize(invoice, fields))
+
+
+# --- Batches ---
+def _entries(key):
+    """The JSON body's `key` list, gunzipped first if the client sent it compressed."""
+    limit = current_app.config["API_MAX_BATCH_BYTES"]
+    # the cap holds for the bytes on the wire as well as after gunzip
+    if (request.content_length or 0) > limit:
+        _error(413, f"body is larger than {limit} bytes")
+    data = request.stream.read(limit + 1)  # chunked bodies carry no Content-Length
+    if len(data) > limit:
+        _error(413, f"body is larger than {limit} bytes")
+    if request.content_encoding == "gzip":
+        inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            data = inflater.decompress(data, limit)
+        except zlib.error:
+            _error(400, "body is not valid gzip")
+        if inflater.unconsumed_tail:
+            _error(413, f"body is larger than {limit} bytes uncompressed")
+    elif request.content_encoding:
+        _error(415, f"unsupported Content-Encoding {request.content_encoding!r}")
+    try:
+        body = json.loads(data)
+    except ValueError as e:
+        _error(400, f"invalid JSON: {e}")
+    entries = body.get(key) if isinstance(body, dict) else None
+    if not isinstance(entries, list):
+        _error(400, f'expected a JSON object with a "{key}" list')
+    if len(entries) > current_app.config["API_MAX_BATCH_SIZE"]:
+        _error(413, f"at most {current_app.config['API_MAX_BATCH_SIZE']} {key} per request")
+    return entries
+
+
+def _respond(results, fields, invoices, success_code):
+    """Attach the selected invoice fields to successful results and pick the status code."""
+    ok = all(result["status"] not in ("invalid", "not_found") for result in results)
+    if not ok:
+        for result in results:
+            if "error" not in result:
+                result.update(status="skipped")
+                result.pop("invoice", None)
+    elif fields:
+        for result in results:
+            result["invoice"] = serialize(invoices[result["id"]], fields)
+    return jsonify({"ok": ok, "results": results}), success_code if ok else 422
+
+
+def _fail(results, index, status, message):
+    results.append({"index": index, "status": status, "error": message})
+
+
+def _finish(changed_ids):
+    """After a batch commits: drop cached results and the changed invoices' PDFs."""
+    if changed_ids:
+        result_cache.clear()
+        for invoice_id in changed_ids:
+            pdf_cache.invalidate(invoice_id)
+
+
+@bp.route("/invoices/batch", methods=["POST"])
+def create_invoices():
+    """
+    {"invoices": [{client_name, client_email, description, issue_date,
+    due_date, status, items: [{description, quantity, price, tax}]}]},
+    validated like an import. Answers 201.
+    """
+    entries = _entries("invoices")
+    fields = selected_fields(request.args)
+    results, valid = [], []
+    for index, entry in enumerate(entries):
+        try:
+            if not isinstance(entry, dict):
+                raise ValueError("expected an object")
+            valid.append(validate(entry))
+            results.append({"index": index, "status": "created"})
+        except ValueError as e:
+            _fail(results, index, "invalid", str(e))
+    if len(valid) < len(entries) or not entries:
+        return _respond(results, fields, {}, 201)
+
+    try:
+        ids = write_invoices([invoice for invoice, _ in valid], [items for _, items in valid])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    for result, invoice_id in zip(results, ids):
+        result["id"] = invoice_id
+    result_cache.clear()
+    return _respond(results, fields, _load(ids, fields) if fields else {}, 201)
+
+
+@bp.route("/invoices/batch", methods=["PATCH"])
+def update_invoices():
+    """
+    {"invoices": [{"id": 1, ...changed fields}]}. Any of client_name,
+    client_email, description, issue_date, due_date and status can be
+    changed. "items" replaces the item list, and an item that carries the
+    "id" of an existing item updates that item in place.
+    """
+    entries = _entries("invoices")
+    fields = selected_fields(request.args)
+    ids = [entry.get("id") for entry in entries if isinstance(entry, dict)]
+    invoices = _load([i for i in ids if isinstance(i, int)], ("items",))
+
+    results, changes, changed_ids, seen = [], [], [], set()
+    for index, entry in enumerate(entries):
+        try:
+            invoice_id = entry.get("id") if isinstance(entry, dict) else None
+            if not isinstance(invoice_id, int) or isinstance(invoice_id, bool):
+                raise ValueError('"id" must be an integer')
+            if invoice_id in seen:
+                raise ValueError(f"invoice {invoice_id} appears more than once")
+            seen.add(invoice_id)
+            unknown = sorted(set(entry) - PATCHABLE - {"id"})
+            if unknown:
+                raise ValueError(f"unknown field(s) {', '.join(unknown)}")
+            invoice = invoices.get(invoice_id)
+            if invoice is None:
+                _fail(results, index, "not_found", f"invoice {invoice_id} not found")
+                continue
+            changes.append((invoice, _validate_patch(invoice, entry)))
+            results.append({"index": index, "status": "unchanged", "id": invoice_id})
+        except ValueError as e:
+            _fail(results, index, "invalid", str(e))
+    if len(changes) < len(entries) or not entries:
+        return _respond(results, fields, {}, 200)
+
+    try:
+        rollup_changes = []
+        for result, (invoice, (values, rows)) in zip(results, changes):
+            before = rollups.snapshot(invoice)
+            for name, value in values.items():
+                setattr(invoice, name, value)
+            items_changed = rows is not None and sync_items(invoice, rows)
+            if items_changed:
+                invoice.amount_cents = rows_total(rows)
+            if items_changed or db.session.is_modified(invoice):
+                rollup_changes.append((before, rollups.snapshot(invoice)))
+                changed_ids.append(invoice.id)
+                result["status"] = "updated"
+        rollups.record_changes(rollup_changes)
+        search.reindex(changed_ids)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    _finish(changed_ids)
+    return _respond(results, fields, _load(ids, fields) if fields else {}, 200)
+
+
+def _validate_patch(invoice, entry):
+    """(column values, item rows or None) for one PATCH entry, or raise ValueError."""
+    current = {name: getattr(invoice, name) for name in PATCHABLE - {"items"}}
+    merged, _ = validate(dict(current, **{name: entry[name] for name in entry if name != "items"}))
+    values = {name: merged[name] for name in entry if name in merged}
+
+    rows = None
+    if "items" in entry:
+        raw = entry["items"]
+        if not isinstance(raw, list):
+            raise ValueError('"items" must be a list')
+        rows = validate_items(raw)
+        for row, raw_item in zip(rows, raw):
+            item_id = raw_item.get("id")
+            row["id"] = item_id if isinstance(item_id, int) else None
+        money.apply_line_totals([rows])
+    return values, rows
+
+
+@bp.route("/invoices/mark-paid", methods=["POST"])
+def mark_invoices_paid():
+    """{"ids": [1, 2, 3]}: mark each invoice Paid, giving it today's issue date if it has none."""
+    entries = _entries("ids")
+    fields = selected_fields(request.args)
+    invoices = _load([i for i in entries if isinstance(i, int) and not isinstance(i, bool)], ())
+
+    results, seen = [], set()
+    for index, invoice_id in enumerate(entries):
+        if not isinstance(invoice_id, int) or isinstance(invoice_id, bool):
+            _fail(results, index, "invalid", "ids must be integers")
+        elif invoice_id in seen:
+            _fail(results, index, "invalid", f"invoice {invoice_id} appears more than once")
+        elif invoice_id not in invoices:
+            _fail(results, index, "not_found", f"invoice {invoice_id} not found")
+        else:
+            seen.add(invoice_id)
+            paid = invoices[invoice_id].status == "Paid"
+            results.append({"index": index, "status": "unchanged" if paid else "updated", "id": invoice_id})
+    if len(seen) < len(entries) or not entries:
+        return _respond(results, fields, {}, 200)
+
+    changed_ids = [result["id"] for result in results if result["status"] == "updated"]
+    today = datetime.now().date()
+    try:
+        rollup_changes = []
+        for invoice_id in changed_ids:
+            invoice = invoices[invoice_id]
+            before = rollups.snapshot(invoice)
+            invoice.status = "Paid"
+            if not invoice.issue_date:
+                invoice.issue_date = today
+            rollup_changes.append((before, rollups.snapshot(invoice)))
+        rollups.record_changes(rollup_changes)
+        db.session.commit()  # the flush sends the UPDATEs as one executemany
+    except Exception:
+        db.session.rollback()
+        raise
+    _finish(changed_ids)
+    return _respond(results, fields, _load(seen, fields) if fields else {}, 200)
@@ -0,0 +1,276 @@
+# archive.py
+"""
+Closed years moved out of the live database into one SQLite file per year.
+
+`flask archive-year 2022` moves the paid invoices issued in 2022, and
+their items, into ARCHIVE_DIR/invoices-2022.db. The file is built under
+a temporary name and then renamed into place, so a file is never changed
+while it is in use. Every new connection ATTACHes each archive read-only
+and immutable as schema archive_<year>, with the app's mmap size.
+Reading an archive therefore takes no locks.
+
+The revenue rollups are left as they are. The dashboard, /reports?year=
+and the revenue API still count archived invoices from those
+precomputed totals. ArchivedYear summarises what each file holds.
+Invoice and item ids are AUTOINCREMENT, so an archived id is never
+issued to a new row.
+Queries that need the rows themselves read live and archived invoices
+together through invoice_tables() or invoices(). Date-range reports and
+rollups.rebuild() do this.
+The invoice page and its PDF fall back to find_invoice(). The invoice
+list, search, exports and aging only cover live invoices.
+
+A connection attaches the archives that exist when it opens, so reload
+the web workers after archiving. SQLite attaches at most 10 databases by
+default. Archives past that limit are skipped with a warning.
+"""
+import os
+import re
+import shutil
+import sqlite3
+from datetime import date, datetime
+from urllib.parse import quote
+
+from sqlalchemy import MetaData, create_engine, delete, event, func, insert, select, text, union_all
+from sqlalchemy.orm import joinedload
+from sqlalchemy.schema import CreateTable
+
+from models import db, ArchivedYear, Invoice, InvoiceDelivery, InvoiceItem, PdfJob
+import search
+
+FILE_PATTERN = re.compile(r"^invoices-(\d{4})\.db$")
+
+_metadata = MetaData()
+_tables = {}
+
+
+def schema_name(year):
+    return f"archive_{year}"
+
+
+def enabled(conn=None):
+    """Archives are SQLite files; conn is a Connection or a Session (default db.session)."""
+    conn = conn or db.session
+    dialect = conn.dialect if hasattr(conn, "dialect") else conn.get_bind().dialect
+    return dialect.name == "sqlite"
+
+
+class Archive:
+    """Finds the year archives in ARCHIVE_DIR and attaches them to each new SQLite connection."""
+
+    def __init__(self, app=None):
+        self.directory = None
+        self.mmap_size = 0
+        self.logger = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("ARCHIVE_DIR", os.environ.get("ARCHIVE_DIR") or os.path.join(app.instance_path, "archive"))
+        self.directory = app.config["ARCHIVE_DIR"]
+        self.mmap_size = app.config.get("SQLITE_MMAP_SIZE", 0)
+        self.logger = app.logger
+        app.extensions["archive"] = self
+
+        with app.app_context():
+            engine = db.engine
+        if engine.dialect.name == "sqlite":
+            event.listen(engine, "connect", self._attach_all)
+
+    def path(self, year):
+        return os.path.join(self.directory, f"invoices-{year}.db")
+
+    def files(self):
+        """[(year, path)] of the archive files, newest first."""
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        years = sorted((int(m.group(1)) for m in map(FILE_PATTERN.match, names) if m), reverse=True)
+        return [(year, self.path(year)) for year in years]
+
+    def _attach_all(self, dbapi_connection, connection_record):
+        # needs URI filenames, which database.configure() turns on for SQLite
+        for year, path in self.files():
+            schema = schema_name(year)
+            try:
+                dbapi_connection.execute(f"ATTACH DATABASE ? AS {schema}",
+                                         (f"file:{quote(path)}?mode=ro&immutable=1",))
+            except sqlite3.OperationalError as e:  # e.g. more archives than SQLITE_MAX_ATTACHED
+                self.logger.warning("Archive %s not attached: %s", path, e)
+                continue
+            if self.mmap_size:
+                dbapi_connection.execute(f"PRAGMA {schema}.mmap_size={int(self.mmap_size)}")
+
+
+archive = Archive()
+
+
+# --- Reads ---
+def attached_years(conn=None):
+    """Years whose archive is attached to this connection (or session), oldest first."""
+    conn = conn or db.session
+    if not enabled(conn):
+        return []
+    names = [row[1] for row in conn.execute(text("PRAGMA database_list"))]
+    return sorted(int(name[len("archive_"):]) for name in names if name.startswith("archive_"))
+
+
+def _table(table, schema):
+    """`table` as it is in the attached database `schema`."""
+    key = (table.name, schema)
+    if key not in _tables:
+        _tables[key] = table.to_metadata(_metadata, schema=schema)
+    return _tables[key]
+
+
+def invoice_tables(first_year=None, last_year=None, conn=None):
+    """The live invoices table, then the attached archives' tables for years in [first_year, last_year]."""
+    live = Invoice.__table__
+    years = [year for year in attached_years(conn)
+             if (first_year is None or year >= first_year) and (last_year is None or year <= last_year)]
+    return [live] + [_table(live, schema_name(year)) for year in years]
+
+
+def invoices(first_year=None, last_year=None, conn=None):
+    """
+    invoice_tables() as one UNION ALL subquery with the invoices columns.
+    Returns the invoices table itself when no archive is in range.
+    """
+    tables = invoice_tables(first_year, last_year, conn)
+    if len(tables) == 1:
+        return tables[0]
+    return union_all(*(select(table) for table in tables)).subquery("all_invoices")
+
+
+def max_id(table, conn=None):
+    """The highest id in `table` (invoices or invoice_items), live or in an attached archive; 0 if none."""
+    conn = conn or db.session
+    tables = [table] + [_table(table, schema_name(year)) for year in attached_years(conn)]
+    return max(conn.scalar(select(func.coalesce(func.max(t.c.id), 0))) for t in tables)
+
+
+def find_invoice(invoice_id, session=None):
+    """The archived Invoice with this id, items loaded and detached from the session, or None."""
+    session = session or db.session
+    for year in reversed(attached_years(session)):
+        invoice = session.scalars(
+            select(Invoice).options(joinedload(Invoice.items)).where(Invoice.id == invoice_id)
+            .execution_options(schema_translate_map={None: schema_name(year)})
+        ).unique().first()
+        if invoice is not None:
+            session.expunge(invoice)
+            return invoice
+    return None
+
+
+# --- Archiving ---
+def archive_year(year, vacuum=False):
+    """
+    Move the paid invoices issued in `year`, and their items, into the
+    year's archive file. They are then removed from the live tables, the
+    search index, the PDF job queue and the email delivery log. Returns the year's ArchivedYear,
+    which is None if the year has never had anything to archive.
+
+    Running it again for the same year adds invoices paid since then. It
+    also finishes a run that stopped after the file was written: rows
+    that are still live are copied again and replace their archived
+    copies. Other writers wait while it runs (up to
+    SQLITE_BUSY_TIMEOUT_MS). With vacuum, the live database file is
+    compacted afterwards.
+    """
+    if year >= date.today().year:
+        raise ValueError(f"{year} is not a closed year yet")
+    if not enabled():
+        raise ValueError("archiving needs an SQLite database")
+
+    live, items = Invoice.__table__, InvoiceItem.__table__
+    moving = _moving_ids(live, year)
+
+    os.makedirs(archive.directory, exist_ok=True)
+    path = archive.path(year)
+    building = path + ".tmp"
+
+    with db.engine.connect() as conn:
+        # Hold the write lock from here until the live rows are deleted, so
+        # nothing can change them in between. The file is written on its
+        # own connection and committed first: one transaction over both
+        # files would not be atomic, because the live database uses WAL.
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+        ids = conn.scalars(moving).all()
+        if not ids:
+            conn.rollback()
+            return db.session.get(ArchivedYear, year)
+
+        if os.path.exists(building):
+            os.remove(building)
+        if os.path.exists(path):
+            shutil.copyfile(path, building)
+        summary = _write_file(building, conn.engine.url.database, year)
+        os.chmod(building, 0o444)
+        os.replace(building, path)
+
+        search.remove(ids, conn)
+        conn.execute(delete(PdfJob.__table__).where(PdfJob.__table__.c.invoice_id.in_(moving)))
+        conn.execute(delete(InvoiceDelivery.__table__).where(InvoiceDelivery.__table__.c.invoice_id.in_(moving)))
+        conn.execute(delete(items).where(items.c.invoice_id.in_(moving)))
+        conn.execute(delete(live).where(live.c.id.in_(moving)))
+        conn.execute(delete(ArchivedYear.__table__).where(ArchivedYear.__table__.c.year == year))
+        conn.execute(insert(ArchivedYear.__table__).values(
+            year=year, filename=os.path.basename(path), archived_at=datetime.utcnow(), **summary,
+        ))
+        conn.commit()
+        if vacuum:
+            conn.exec_driver_sql("VACUUM")
+            conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    # pooled connections attached the old set of files
+    db.engine.dispose()
+    return db.session.get(ArchivedYear, year)
+
+
+def _moving_ids(invoices, year):
+    """Ids of the invoices (table) that archiving `year` moves."""
+    return select(invoices.c.id).where(
+        invoices.c.status == "Paid",
+        invoices.c.issue_date.between(date(year, 1, 1), date(year, 12, 31)),
+    )
+
+
+def _write_file(building, live_path, year):
+    """
+    Copy the year's moving invoices and their items into the file being
+    built, with INSERT ... SELECT over an ATTACH of the live database.
+    A new file gets its indexes after the rows are in. Returns the
+    ArchivedYear totals of the whole file.
+    """
+    live, items = Invoice.__table__, InvoiceItem.__table__
+    source = {table: _table(table, "live") for table in (live, items)}
+    moving = _moving_ids(source[live], year)
+    new_file = not os.path.exists(building)
+
+    engine = create_engine(f"sqlite:///{building}")
+    try:
+        with engine.connect() as out:
+            out.exec_driver_sql("ATTACH DATABASE ? AS live", (live_path,))
+            if new_file:
+                for table in (live, items):
+                    out.execute(CreateTable(table))
+            for table, key in ((live, source[live].c.id), (items, source[items].c.invoice_id)):
+                out.execute(insert(table).prefix_with("OR REPLACE").from_select(
+                    [column.name for column in table.columns], select(source[table]).where(key.in_(moving)),
+                ))
+            if new_file:
+                for index in (*live.indexes, *items.indexes):
+                    index.create(out)
+            invoice_count, total_cents = out.execute(
+                select(func.count(), func.coalesce(func.sum(live.c.amount_cents), 0)).select_from(live)
+            ).one()
+            item_count = out.scalar(select(func.count()).select_from(items))
+            out.commit()
+            out.exec_driver_sql("DETACH DATABASE live")
+            out.exec_driver_sql("ANALYZE")
+            out.exec_driver_sql("VACUUM")
+    finally:
+        engine.dispose()
+    return {"invoice_count": invoice_count, "item_count": item_count, "total_cents": total_cents}
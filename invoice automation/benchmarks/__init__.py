@@ -0,0 +1,11 @@
+# benchmarks/__init__.py
+"""
+Performance benchmarks. Run from the app directory, e.g.:
+
+    python -m benchmarks.suite --invoices 200000 --output results.json
+    python -m benchmarks.pdf_render
+    python -m benchmarks.cold_start
+
+Every benchmark accepts --output FILE to save its results as JSON (see
+results.py); the suite can compare a run against a saved --baseline.
+"""
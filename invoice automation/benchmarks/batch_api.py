@@ -0,0 +1,111 @@
+# benchmarks/batch_api.py
+"""
+Batch JSON API against the HTML forms on a throwaway SQLite database,
+through the Flask test client: creating invoices one form post at a time
+versus POST /api/invoices/batch, then batch PATCH and mark-paid, and the
+size of a page of /api/invoices with and without ?fields= and gzip.
+
+    python -m benchmarks.batch_api --invoices 5000 --batch-size 500 --output batch_api.json
+"""
+import argparse
+import gzip
+import os
+import tempfile
+import time
+
+from benchmarks import results as result_files
+
+
+def _invoice(n, items):
+    return {
+        "client_name": f"Client {n % 500:04d}",
+        "client_email": f"billing{n % 500:04d}@example.com",
+        "description": f"Order {n}",
+        "items": [{"description": f"Item {i + 1}", "quantity": i + 1, "price": "12.50", "tax": 5}
+                  for i in range(items)],
+    }
+
+
+def _form(invoice):
+    items = invoice["items"]
+    return {
+        "client_name": invoice["client_name"],
+        "client_email": invoice["client_email"],
+        "item_name[]": [i["description"] for i in items],
+        "item_qty[]": [str(i["quantity"]) for i in items],
+        "item_price[]": [i["price"] for i in items],
+        "item_tax[]": [str(i["tax"]) for i in items],
+    }
+
+
+def _timed(label, count, call):
+    start = time.perf_counter()
+    call()
+    elapsed = time.perf_counter() - start
+    print(f"{label:40} {count:6} invoices in {elapsed:6.2f}s: {count / elapsed:8,.0f}/sec")
+    return {"invoices": count, "total_ms": round(elapsed * 1000, 3), "per_sec": round(count / elapsed, 1)}
+
+
+def _batches(client, method, path, key, entries, size):
+    for n in range(0, len(entries), size):
+        response = client.open(path, method=method, json={key: entries[n:n + size]})
+        assert response.status_code in (200, 201), response.get_json()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--invoices", type=int, default=5000)
+    parser.add_argument("--items", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--output", help="Write results to this JSON file.")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="invoice-bench-")
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(workdir, "bench.db")
+
+    from app import create_app
+    import migrations
+
+    app = create_app()
+    with app.app_context():
+        migrations.upgrade()
+    client = app.test_client()
+
+    invoices = [_invoice(n, args.items) for n in range(args.invoices)]
+    results = {
+        "form_posts": _timed("create, one form post each", len(invoices), lambda: [
+            client.post("/create", data=_form(invoice)) for invoice in invoices
+        ]),
+        "batch_create": _timed(f"create, batches of {args.batch_size}", len(invoices), lambda: _batches(
+            client, "POST", "/api/invoices/batch?fields=id", "invoices", invoices, args.batch_size,
+        )),
+    }
+    ids = list(range(len(invoices) + 1, 2 * len(invoices) + 1))  # the batch-created invoices
+    patches = [{"id": invoice_id, "due_date": "2031-01-31", "description": "Revised"} for invoice_id in ids]
+    results["batch_patch"] = _timed(f"patch, batches of {args.batch_size}", len(ids), lambda: _batches(
+        client, "PATCH", "/api/invoices/batch?fields=", "invoices", patches, args.batch_size,
+    ))
+    results["batch_mark_paid"] = _timed(f"mark paid, batches of {args.batch_size}", len(ids), lambda: _batches(
+        client, "POST", "/api/invoices/mark-paid?fields=", "ids", ids, args.batch_size,
+    ))
+
+    sizes = {}
+    for label, query in (("all fields", ""), ("id,amount,status", "&fields=id,amount,status")):
+        for encoding in ("identity", "gzip"):
+            response = client.get(f"/api/invoices?limit=500{query}", headers={"Accept-Encoding": encoding})
+            sizes[f"{label}, {encoding}"] = len(response.data)
+            if encoding == "gzip":
+                assert response.content_encoding == "gzip" and gzip.decompress(response.data)
+    for label, size in sizes.items():
+        print(f"/api/invoices?limit=500, {label:28} {size:9,} bytes")
+    results["page_bytes"] = sizes
+
+    if args.output:
+        params = {"invoices": args.invoices, "items": args.items, "batch_size": args.batch_size}
+        result_files.write(args.output, "batch_api", params, results)
+        print(f"results written to {args.output}")
+    return results
+
+
+if __name__ == "__main__":
+    main()
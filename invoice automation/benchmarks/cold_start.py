@@ -0,0 +1,69 @@
+# benchmarks/cold_start.py
+"""
+Worker cold start: time `create_app()` in fresh interpreters, the way a
+new gunicorn worker pays for it, and report which heavy modules it loaded.
+
+    python -m benchmarks.cold_start --runs 20 --output cold_start.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks import results as result_files
+
+# runs in the child; imports are timed from a bare interpreter
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+print(json.dumps({
+    "import": imported - start,
+    "create_app": created - imported,
+    "total": created - start,
+    "reportlab_loaded": "reportlab" in sys.modules,
+    "modules": len(sys.modules),
+}))
+"""
+
+
+def probe(env):
+    out = subprocess.run([sys.executable, "-c", PROBE], env=env, capture_output=True,
+                         text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--output", help="Write results to this JSON file.")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="invoice-cold-")
+    env = dict(os.environ, DATABASE_URL="sqlite:///" + os.path.join(workdir, "bench.db"))
+    probe(env)  # warm the bytecode and OS file caches
+
+    samples = [probe(env) for _ in range(args.runs)]
+    results = {phase: result_files.timings([s[phase] for s in samples])
+               for phase in ("import", "create_app", "total")}
+    results["reportlab_loaded"] = any(s["reportlab_loaded"] for s in samples)
+    results["modules"] = samples[-1]["modules"]
+
+    for phase in ("import", "create_app", "total"):
+        stats = results[phase]
+        print(f"  {phase:12} median {stats['median_ms']:8.2f}ms  p95 {stats['p95_ms']:8.2f}ms")
+    print(f"  reportlab loaded: {results['reportlab_loaded']}, modules: {results['modules']}")
+
+    if args.output:
+        result_files.write(args.output, "cold_start", {"runs": args.runs}, results)
+        print(f"results written to {args.output}")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# benchmarks/db_concurrency.py
+"""
+Mixed read/write throughput with several worker processes sharing one
+SQLite file, comparing the tuned engine (WAL + pragmas) with SQLite's
+defaults (rollback journal, synchronous=FULL).
+
+    python -m benchmarks.db_concurrency --workers 4 --seconds 10 --write-ratio 0.2
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from benchmarks import results as result_files
+
+READ_PATHS = ["/dashboard", "/api/invoices?limit=50", "/api/monthly-revenue-status"]
+
+
+def _worker(db_path, tuned, seconds, write_ratio, seed, results):
+    os.environ["DATABASE_URL"] = "sqlite:///" + db_path
+    os.environ["SQLITE_TUNING"] = "1" if tuned else "0"
+    if not tuned:
+        os.environ["SQLITE_BUSY_TIMEOUT_MS"] = "5000"  # pysqlite's default
+    from app import create_app
+    import migrations
+
+    app = create_app()
+    logging.getLogger(app.logger.name).disabled = True
+    with app.app_context():
+        migrations.upgrade()
+
+    client = app.test_client()
+    rng = random.Random(seed)
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        if rng.random() < write_ratio:
+            resp = client.post("/create", data={
+                "client_name": f"Bench {rng.randrange(100)}", "client_email": "bench@example.com",
+                "item_name[]": ["Work"], "item_qty[]": ["2"], "item_price[]": ["50"], "item_tax[]": ["10"],
+            })
+            kind = "writes"
+        else:
+            resp = client.get(rng.choice(READ_PATHS))
+            kind = "reads"
+        counts[kind if resp.status_code < 500 else "errors"] += 1
+    results.put(counts)
+
+
+def run(tuned, workers, seconds, write_ratio):
+    db_path = os.path.join(tempfile.mkdtemp(prefix="invoice-conc-"), "bench.db")
+    # create the schema once, before the workers race for it
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    setup = ctx.Process(target=_worker, args=(db_path, tuned, 0, 0, 0, results))
+    setup.start(); setup.join(); results.get()
+
+    procs = [ctx.Process(target=_worker, args=(db_path, tuned, seconds, write_ratio, n, results))
+             for n in range(workers)]
+    for p in procs:
+        p.start()
+    totals = {"reads": 0, "writes": 0, "errors": 0}
+    for _ in procs:
+        for key, value in results.get().items():
+            totals[key] += value
+    for p in procs:
+        p.join()
+    return {
+        "reads_per_sec": round(totals["reads"] / seconds, 1),
+        "writes_per_sec": round(totals["writes"] / seconds, 1),
+        "errors": totals["errors"],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--output", help="Write results to this JSON file.")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for label, tuned in (("sqlite_defaults", False), ("tuned", True)):
+        results[label] = run(tuned, args.workers, args.seconds, args.write_ratio)
+        r = results[label]
+        print(f"{label:16} reads/s={r['reads_per_sec']:8.1f}  writes/s={r['writes_per_sec']:7.1f}  "
+              f"errors={r['errors']}")
+    if args.output:
+        params = {"workers": args.workers, "seconds": args.seconds, "write_ratio": args.write_ratio}
+        result_files.write(args.output, "db_concurrency", params, results)
+    return results
+
+
+if __name__ == "__main__":
+    main()
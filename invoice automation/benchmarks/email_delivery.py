@@ -0,0 +1,103 @@
+# benchmarks/email_delivery.py
+"""
+Invoice email throughput against the local SMTP sink on a throwaway
+SQLite database: the pooled sender, then one connection per message from
+a single thread for comparison. PDFs are rendered into the cache first
+unless --render, so the timings are about SMTP and the delivery log.
+
+    python -m benchmarks.email_delivery --invoices 2000 --fail-rate 0.02 --output email.json
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks import results as result_files
+from benchmarks.smtp_sink import SMTPSink
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--invoices", type=int, default=2000)
+    parser.add_argument("--items", type=int, default=3)
+    parser.add_argument("--pool-size", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Share of messages the sink answers with 451.")
+    parser.add_argument("--delay-ms", type=float, default=2.0, help="Sink delay per message, like a remote relay.")
+    parser.add_argument("--render", action="store_true", help="Render the PDFs during the send instead of before.")
+    parser.add_argument("--workers", type=int, default=None, help="PDF render processes.")
+    parser.add_argument("--output", help="Write results to this JSON file.")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="invoice-bench-")
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(workdir, "bench.db")
+
+    from sqlalchemy import func, select
+    from sqlalchemy.orm import selectinload
+    from app import create_app
+    from bulk_export import render_parallel
+    from mailer import Mailer, mailer
+    from models import db, Invoice, InvoiceDelivery
+    from pdf_cache import pdf_cache
+    from utils import invoice_snapshot
+    import migrations
+    from benchmarks import datagen
+
+    sink = SMTPSink(fail_rate=args.fail_rate, delay_ms=args.delay_ms)
+    port = sink.start()
+
+    app = create_app()
+    app.config.update(MAIL_SERVER="127.0.0.1", MAIL_PORT=port, MAIL_POOL_SIZE=args.pool_size,
+                      MAIL_BATCH_SIZE=args.batch_size, MAIL_RETRY_BACKOFF=0.01)
+    pdf_cache.directory = os.path.join(workdir, "pdf_cache")
+    os.makedirs(pdf_cache.directory)
+
+    results = {}
+    with app.app_context():
+        migrations.upgrade()
+        with db.engine.begin() as conn:
+            datagen.generate(conn, args.invoices, args.items)
+        ids = db.session.scalars(select(Invoice.id).order_by(Invoice.id)).all()
+
+        if not args.render:
+            start = time.perf_counter()
+            for n in range(0, len(ids), args.batch_size):
+                invoices = (Invoice.query.options(selectinload(Invoice.items))
+                            .filter(Invoice.id.in_(ids[n:n + args.batch_size])).all())
+                rendered = render_parallel((invoice_snapshot(invoice) for invoice in invoices), args.workers)
+                for invoice, (_, data) in zip(invoices, rendered):
+                    pdf_cache.fetch(invoice, lambda _, data=data: data)
+                db.session.expunge_all()
+            print(f"pre-rendered {len(ids)} PDFs in {time.perf_counter() - start:.1f}s")
+
+        before = dict(sink.stats)
+        result = mailer.send_invoices(ids, render_workers=args.workers)
+        mailer.pool.close()
+        logged = db.session.scalar(select(func.count()).select_from(InvoiceDelivery).filter_by(status="sent"))
+        accepted = sink.stats["messages"] - before["messages"]
+        assert result.sent == accepted == logged, (result.sent, accepted, logged)
+        results["pooled"] = dict(result.as_dict(), total_ms=round(result.elapsed * 1000, 3))
+
+        # the same invoices, one connection per message from one thread
+        app.config.update(MAIL_POOL_SIZE=1, MAIL_MAX_MESSAGES_PER_CONNECTION=1)
+        single = Mailer(app)
+        baseline = single.send_invoices(ids, render_workers=args.workers)
+        results["connection_per_message"] = dict(baseline.as_dict(), total_ms=round(baseline.elapsed * 1000, 3))
+    sink.stop()
+
+    print(f"pooled: sent {result.sent}, failed {result.failed}, {result.retries} retries over "
+          f"{result.connections} connections in {result.elapsed:.2f}s: {result.rate:,.0f} emails/sec, "
+          f"{result.rate * 60:,.0f}/min")
+    print(f"connection per message: {baseline.connections} connections in {baseline.elapsed:.2f}s: "
+          f"{baseline.rate:,.0f} emails/sec")
+    if args.output:
+        params = {"invoices": args.invoices, "items": args.items, "pool_size": args.pool_size,
+                  "batch_size": args.batch_size, "fail_rate": args.fail_rate, "delay_ms": args.delay_ms,
+                  "render": args.render}
+        result_files.write(args.output, "email_delivery", params, results)
+        print(f"results written to {args.output}")
+    return results
+
+
+if __name__ == "__main__":
+    main()
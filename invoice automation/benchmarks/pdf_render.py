@@ -0,0 +1,70 @@
+# benchmarks/pdf_render.py
+"""
+Per-PDF CPU time with the shared InvoiceTemplate (cached styles and
+prebuilt static blocks) versus rebuilding the template for every invoice.
+
+    python -m benchmarks.pdf_render --runs 200 --items 10
+"""
+import argparse
+import io
+import time
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+from benchmarks import results as result_files
+import money
+import utils
+
+
+def sample_invoice(items):
+    issued = date(2024, 1, 15)
+    return SimpleNamespace(
+        id=1,
+        client_name="Alpha Corp",
+        client_email="alpha@example.com",
+        description="Website design + small CMS",
+        issue_date=issued,
+        due_date=issued + timedelta(days=14),
+        status="Unpaid",
+        amount_cents=0,
+        items=[
+            SimpleNamespace(description=f"Line item {n}", quantity=n % 5 + 1, price_cents=2500 + 100 * n,
+                            tax=5.0, line_total_cents=money.line_total(n % 5 + 1, 2500 + 100 * n, 5.0))
+            for n in range(items)
+        ],
+    )
+
+
+def _cpu_per_pdf(invoice, runs, fresh_template):
+    start = time.process_time()
+    for _ in range(runs):
+        if fresh_template:
+            utils._local.template = None
+        doc = utils._new_document(io.BytesIO())
+        doc.build(utils.build_invoice_elements(invoice))
+    return (time.process_time() - start) / runs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--items", type=int, default=10)
+    parser.add_argument("--output", help="Write results to this JSON file.")
+    args = parser.parse_args(argv)
+
+    invoice = sample_invoice(args.items)
+    utils.render_invoice_pdf(invoice)  # warm up imports and font caches
+
+    rebuilt = _cpu_per_pdf(invoice, args.runs, fresh_template=True)
+    shared = _cpu_per_pdf(invoice, args.runs, fresh_template=False)
+    print(f"template rebuilt per PDF: {rebuilt * 1000:.2f} ms CPU/PDF")
+    print(f"shared template:         {shared * 1000:.2f} ms CPU/PDF")
+    print(f"saving:                  {(1 - shared / rebuilt) * 100:.1f}%")
+    results = {"rebuilt_ms": rebuilt * 1000, "shared_ms": shared * 1000}
+    if args.output:
+        result_files.write(args.output, "pdf_render", {"runs": args.runs, "items": args.items}, results)
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# benchmarks/queries.py
+"""
+Route latency for the dashboard, reports and list views with and without
+the secondary indexes, on a throwaway SQLite database.
+
+    python -m benchmarks.queries --invoices 1000000
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks import results as result_files
+
+
+def _time_route(client, path, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        resp = client.get(path)
+        samples.append(time.perf_counter() - start)
+        assert resp.status_code == 200, (path, resp.status_code)
+    return statistics.median(samples) * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--invoices", type=int, default=100_000)
+    parser.add_argument("--items", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="Write results to this JSON file.")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="invoice-bench-")
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(workdir, "bench.db")
+
+    from app import create_app
+    from models import db
+    import migrations
+    from benchmarks import datagen
+
+    paths = ["/dashboard", "/reports", "/api/monthly-revenue-status",
+             "/invoices", "/invoices?status=Unpaid", "/api/invoices?client=Client%200042"]
+
+    app = create_app()
+    with app.app_context():
+        migrations.upgrade()
+        start = time.perf_counter()
+        with db.engine.begin() as conn:
+            datagen.generate(conn, args.invoices, args.items)
+        print(f"generated {args.invoices} invoices in {time.perf_counter() - start:.1f}s")
+        indexes = [ix for table in db.metadata.sorted_tables for ix in table.indexes]
+
+    client = app.test_client()
+    results = {}
+    for phase in ("without_indexes", "with_indexes"):
+        with app.app_context():
+            with db.engine.begin() as conn:
+                for index in indexes:
+                    if phase == "with_indexes":
+                        index.create(conn, checkfirst=True)
+                    else:
+                        index.drop(conn, checkfirst=True)
+                conn.exec_driver_sql("ANALYZE")
+        results[phase] = {path: _time_route(client, path, args.repeat) for path in paths}
+
+    print(f"{'route':45} {'no index':>10} {'indexed':>10}")
+    for path in paths:
+        print(f"{path:45} {results['without_indexes'][path]:9.1f}ms {results['with_indexes'][path]:9.1f}ms")
+    if args.output:
+        params = {"invoices": args.invoices, "items": args.items, "repeat": args.repeat}
+        result_files.write(args.output, "queries", params,
+                           {phase: {path: {"median_ms": ms} for path, ms in timings.items()}
+                            for phase, timings in results.items()})
+    return results
+
+
+if __name__ == "__main__":
+    main()
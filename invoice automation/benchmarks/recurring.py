@@ -0,0 +1,81 @@
+# benchmarks/recurring.py
+"""
+Recurring invoice generation throughput on a throwaway SQLite database:
+N monthly templates, one scheduler run over `--months` due periods each,
+then a rerun that must issue nothing.
+
+    python -m benchmarks.recurring --templates 20000 --months 3 --output recurring.json
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import date
+
+from benchmarks import results as result_files
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--templates", type=int, default=20_000)
+    parser.add_argument("--items", type=int, default=3, help="Items per template.")
+    parser.add_argument("--months", type=int, default=1, help="Due periods per template.")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--render-pdfs", action="store_true", help="Also pre-render the PDFs.")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", help="Write results to this JSON file.")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="invoice-bench-")
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(workdir, "bench.db")
+
+    from sqlalchemy import insert
+    from app import create_app
+    from models import db, RecurringInvoice, RecurringItem
+    from pdf_cache import pdf_cache
+    import migrations
+    import recurring
+
+    app = create_app()
+    pdf_cache.directory = os.path.join(workdir, "pdf_cache")
+    os.makedirs(pdf_cache.directory)
+
+    start = date(date.today().year, 1, 1)
+    as_of = recurring.add_months(start, args.months - 1)
+    with app.app_context():
+        migrations.upgrade()
+        with db.engine.begin() as conn:
+            conn.execute(insert(RecurringInvoice.__table__), [{
+                "id": n, "client_name": f"Client {n % 5000:04d}", "client_email": f"billing{n % 5000:04d}@example.com",
+                "description": "Monthly retainer", "interval_months": 1, "days_due": 14,
+                "start_date": start, "next_run": start, "periods_generated": 0, "active": True,
+            } for n in range(1, args.templates + 1)])
+            conn.execute(insert(RecurringItem.__table__), [{
+                "recurring_id": n, "description": f"Service {i + 1}", "quantity": 1 + i,
+                "price_cents": 2500 * (i + 1), "tax": 5.0 * i,
+            } for n in range(1, args.templates + 1) for i in range(args.items)])
+
+        result = recurring.generate_due(as_of, args.batch_size, args.render_pdfs, args.workers)
+        rerun_start = time.perf_counter()
+        rerun = recurring.generate_due(as_of, args.batch_size)
+        rerun_ms = (time.perf_counter() - rerun_start) * 1000
+    assert rerun.invoices == 0, "rerun issued invoices"
+
+    print(f"issued {result.invoices} invoices ({result.items} items) in {result.elapsed:.2f}s: "
+          f"{result.rate:,.0f} invoices/sec, {result.rate * 60:,.0f}/min")
+    if args.render_pdfs:
+        print(f"pre-rendered {result.rendered} PDFs")
+    print(f"rerun issued {rerun.invoices} in {rerun_ms:.1f}ms")
+
+    results = {"generate": dict(result.as_dict(), total_ms=round(result.elapsed * 1000, 3)),
+               "rerun": {"invoices": rerun.invoices, "total_ms": round(rerun_ms, 3)}}
+    if args.output:
+        params = {"templates": args.templates, "items": args.items, "months": args.months,
+                  "batch_size": args.batch_size, "render_pdfs": args.render_pdfs}
+        result_files.write(args.output, "recurring", params, results)
+        print(f"results written to {args.output}")
+    return results
+
+
+if __name__ == "__main__":
+    main()
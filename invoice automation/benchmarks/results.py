@@ -0,0 +1,90 @@
+# benchmarks/results.py
+"""
+JSON result files, so runs can be compared across commits:
+
+    python -m benchmarks.suite --output before.json
+    git checkout other-branch
+    python -m benchmarks.suite --output after.json --baseline before.json
+"""
+import json
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+
+def environment():
+    """Where and on what code a run happened."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+    }
+
+
+def timings(samples):
+    """Summary statistics in milliseconds for a list of durations in seconds."""
+    ordered = sorted(samples)
+    return {
+        "runs": len(ordered),
+        "median_ms": round(statistics.median(ordered) * 1000, 3),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3),
+        "min_ms": round(ordered[0] * 1000, 3),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+    }
+
+
+def time_calls(func, repeat):
+    """Call func() `repeat` times and return timings() of the wall-clock durations."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return timings(samples)
+
+
+def write(path, name, params, results):
+    document = {"benchmark": name, "params": params, "environment": environment(), "results": results}
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(document, fh, indent=2, sort_keys=True)
+        fh.write("\n")
+    return document
+
+
+def load(path):
+    with open(path, encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def _flatten(results, prefix=""):
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from _flatten(value, name + ".")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield name, value
+
+
+def compare(baseline, current, out=sys.stdout):
+    """Print the median, p95 and total timings of two result documents side by side."""
+    before = dict(_flatten(baseline["results"]))
+    after = dict(_flatten(current["results"]))
+    print(f"baseline {baseline['environment'].get('commit')} -> current {current['environment'].get('commit')}",
+          file=out)
+    for name, value in after.items():
+        if not name.endswith(("median_ms", "p95_ms", "total_ms")) or name not in before:
+            continue
+        old = before[name]
+        change = f"{(value / old - 1) * 100:+6.1f}%" if old else "   n/a"
+        print(f"  {name:70} {old:10.2f} -> {value:10.2f} ms  {change}", file=out)
@@ -0,0 +1,102 @@
+# benchmarks/smtp_sink.py
+"""
+Local SMTP stand-in that accepts and discards every message, counting
+connections and messages. It can also answer a share of messages with a
+temporary 451 error and add a per-message delay.
+
+    python -m benchmarks.smtp_sink --port 8025 --fail-rate 0.05
+    MAIL_SERVER=localhost MAIL_PORT=8025 flask send-invoices --unsent
+"""
+import argparse
+import random
+import socketserver
+import threading
+import time
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode("ascii") + b"\r\n")
+
+    def handle(self):
+        sink = self.server.sink
+        sink.count("connections")
+        self.reply("220 smtp-sink ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            verb = line.decode("ascii", "replace").strip().split(" ", 1)[0].upper()
+            if verb == "EHLO":
+                self.wfile.write(b"250-smtp-sink\r\n250-8BITMIME\r\n250 SIZE 52428800\r\n")
+            elif verb in ("HELO", "MAIL", "RCPT", "RSET", "NOOP"):
+                self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                if sink.delay:
+                    time.sleep(sink.delay)
+                if sink.fail_rate and sink.random() < sink.fail_rate:
+                    sink.count("rejected")
+                    self.reply("451 4.3.0 Try again later")
+                else:
+                    sink.count("messages")
+                    self.reply("250 OK queued")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class SMTPSink:
+    """Threaded SMTP server on localhost; start() returns the port."""
+
+    def __init__(self, port=0, fail_rate=0.0, delay_ms=0.0, seed=1):
+        self.fail_rate = fail_rate
+        self.delay = delay_ms / 1000
+        self.stats = {"connections": 0, "messages": 0, "rejected": 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = socketserver.ThreadingTCPServer(("127.0.0.1", port), _Handler)
+        self._server.daemon_threads = True
+        self._server.sink = self
+
+    def count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def random(self):
+        with self._lock:
+            return self._random.random()
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self._server.server_address[1]
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Share of messages answered with 451.")
+    parser.add_argument("--delay-ms", type=float, default=0.0, help="Delay before answering each message.")
+    args = parser.parse_args(argv)
+
+    sink = SMTPSink(args.port, args.fail_rate, args.delay_ms)
+    port = sink.start()
+    print(f"SMTP sink listening on 127.0.0.1:{port}, Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        sink.stop()
+        print(sink.stats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+# benchmarks/suite.py
+"""
+Repeatable benchmarks on a generated database: every read route through
+the Flask test client, PDF generation, and bulk create / edit / import.
+
+    python -m benchmarks.suite --invoices 200000 --items 3 --output results.json
+    python -m benchmarks.suite --output after.json --baseline results.json
+"""
+import argparse
+import io
+import json
+import os
+import tempfile
+import time
+from datetime import date, timedelta
+
+from benchmarks import results as result_files
+
+ROUTES = [
+    "/dashboard",
+    "/invoices",
+    "/invoices?status=Unpaid",
+    "/api/invoices?limit=100",
+    "/api/invoices?client=Client%200042",
+    "/reports",
+    "/reports?year={year}",
+    "/reports?start={year}-01-01&end={year}-06-30",
+    "/api/monthly-revenue-status",
+    "/invoice/{id}",
+    "/invoice/{id}/edit",
+]
+PDF_ITEM_COUNTS = (1, 10, 50)
+
+
+def bench_routes(app, client, repeat, params):
+    from models import db
+    from query_plans import capture_statements
+
+    out = {}
+    for template in ROUTES:
+        path = template.format(**params)
+        with app.app_context():
+            with capture_statements(db.engine, selects_only=False) as statements:
+                resp = client.get(path)
+                resp.get_data()
+        assert resp.status_code == 200, (path, resp.status_code)
+        stats = result_files.time_calls(lambda: client.get(path).get_data(), repeat)
+        stats["queries"] = len(statements)
+        out[template] = stats
+    return out
+
+
+def bench_download(app, client, repeat, invoice_id):
+    from pdf_cache import pdf_cache
+
+    path = f"/invoice/{invoice_id}/pdf"
+    client.get(path).get_data()
+
+    def cold():
+        pdf_cache.invalidate(invoice_id)
+        client.get(path).get_data()
+
+    return {
+        "cold": result_files.time_calls(cold, repeat),
+        "cached": result_files.time_calls(lambda: client.get(path).get_data(), repeat),
+    }
+
+
+def bench_pdf(repeat):
+    import utils
+    from benchmarks.pdf_render import sample_invoice
+
+    out = {}
+    for items in PDF_ITEM_COUNTS:
+        invoice = sample_invoice(items)
+        buffer = io.BytesIO()
+        utils.generate_invoice_pdf(invoice, buffer)  # warm up fonts and the template
+
+        def render():
+            utils.generate_invoice_pdf(invoice, io.BytesIO())
+
+        stats = result_files.time_calls(render, repeat)
+        stats["bytes"] = len(buffer.getvalue())
+        out[f"{items}_items"] = stats
+    return out
+
+
+def _item_form(items, ids=None):
+    form = {
+        "item_name[]": [description for description, _, _, _ in items],
+        "item_qty[]": [str(quantity) for _, quantity, _, _ in items],
+        "item_price[]": [str(price) for _, _, price, _ in items],
+        "item_tax[]": [str(tax) for _, _, _, tax in items],
+    }
+    if ids is not None:
+        form["item_id[]"] = [str(i) for i in ids]
+    return form
+
+
+def bench_writes(app, client, count, import_invoices_count):
+    from models import Invoice
+    from importer import import_invoices
+    from sqlalchemy.orm import selectinload
+
+    items = [("Design", 2, "150.00", 10), ("Hosting", 1, "19.99", 0), ("Support (hrs)", 3, "45.50", 5)]
+    out = {}
+
+    def create():
+        resp = client.post("/create", data=dict(_item_form(items), client_name="Bench Client",
+                                                client_email="bench@example.com", status="Unpaid"))
+        assert resp.status_code == 302, resp.status_code
+
+    out["create"] = result_files.time_calls(create, count)
+
+    with app.app_context():
+        targets = (
+            Invoice.query.options(selectinload(Invoice.items))
+            .filter(Invoice.client_name == "Bench Client")
+            .order_by(Invoice.id)
+            .limit(count)
+            .all()
+        )
+        forms = []
+        for invoice in targets:
+            rows = [(i.description, i.quantity + 1, f"{i.price:.2f}", i.tax) for i in invoice.items]
+            forms.append((invoice.id, dict(
+                _item_form(rows, [i.id for i in invoice.items]),
+                client_name=invoice.client_name, client_email=invoice.client_email,
+                description="edited", issue_date=invoice.issue_date.isoformat(),
+                due_date=invoice.due_date.isoformat(),
+            )))
+
+    pending = iter(forms)
+
+    def edit():
+        invoice_id, form = next(pending)
+        resp = client.post(f"/invoice/{invoice_id}/edit", data=form)
+        assert resp.status_code == 302, resp.status_code
+
+    out["edit"] = result_files.time_calls(edit, len(forms))
+
+    issued = date.today()
+    lines = [
+        json.dumps({
+            "client_name": f"Import {n % 100:03d}", "client_email": "import@example.com",
+            "issue_date": (issued - timedelta(days=n % 365)).isoformat(),
+            "status": "paid" if n % 3 else "unpaid",
+            "items": [{"description": d, "quantity": q, "price": p, "tax": t} for d, q, p, t in items],
+        })
+        for n in range(import_invoices_count)
+    ]
+    with app.app_context():
+        start = time.perf_counter()
+        result = import_invoices(io.StringIO("\n".join(lines)), "jsonl", app.config["IMPORT_BATCH_SIZE"])
+        elapsed = time.perf_counter() - start
+    out["import"] = {
+        "invoices": result.imported,
+        "total_ms": round(elapsed * 1000, 3),
+        "invoices_per_sec": round(result.imported / elapsed, 1) if elapsed else None,
+    }
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--invoices", type=int, default=100_000)
+    parser.add_argument("--items", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=20, help="Timed requests per route / PDF size.")
+    parser.add_argument("--writes", type=int, default=200, help="Invoices created and edited through the routes.")
+    parser.add_argument("--import-invoices", type=int, default=20_000, help="Invoices in the bulk import run.")
+    parser.add_argument("--output", help="Write results to this JSON file.")
+    parser.add_argument("--baseline", help="Compare against an earlier JSON result file.")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="invoice-bench-")
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(workdir, "bench.db")
+
+    from app import create_app
+    from models import db, Invoice
+    from pdf_cache import pdf_cache
+    import migrations
+    from benchmarks import datagen
+
+    app = create_app()
+
+    # keep rendered PDFs out of the real instance folder
+    pdf_cache.directory = os.path.join(workdir, "pdf_cache")
+    os.makedirs(pdf_cache.directory)
+
+    with app.app_context():
+        migrations.upgrade()
+        start = time.perf_counter()
+        with db.engine.begin() as conn:
+            datagen.generate(conn, args.invoices, args.items)
+            conn.exec_driver_sql("ANALYZE")
+        generated = time.perf_counter() - start
+        params = {"id": db.session.query(db.func.max(Invoice.id)).scalar(), "year": date.today().year}
+    print(f"generated {args.invoices} invoices x {args.items} items in {generated:.1f}s")
+
+    client = app.test_client()
+    results = {
+        "datagen": {"total_ms": round(generated * 1000, 3)},
+        "routes": bench_routes(app, client, args.repeat, params),
+        "download_invoice": bench_download(app, client, args.repeat, params["id"]),
+        "generate_invoice_pdf": bench_pdf(args.repeat),
+        "writes": bench_writes(app, client, args.writes, args.import_invoices),
+    }
+
+    for section in ("routes", "download_invoice", "generate_invoice_pdf", "writes"):
+        print(section)
+        for name, stats in results[section].items():
+            if "median_ms" in stats:
+                extra = f"  queries={stats['queries']}" if "queries" in stats else ""
+                print(f"  {name:55} median {stats['median_ms']:9.2f}ms  p95 {stats['p95_ms']:9.2f}ms{extra}")
+            else:
+                print(f"  {name:55} " + "  ".join(f"{k}={v}" for k, v in stats.items()))
+
+    params = {"invoices": args.invoices, "items": args.items, "repeat": args.repeat,
+              "writes": args.writes, "import_invoices": args.import_invoices}
+    document = {"benchmark": "suite", "params": params, "environment": result_files.environment(),
+                "results": results}
+    if args.output:
+        document = result_files.write(args.output, "suite", params, results)
+        print(f"results written to {args.output}")
+    if args.baseline:
+        result_files.compare(result_files.load(args.baseline), document)
+    return results
+
+
+if __name__ == "__main__":
+    main()
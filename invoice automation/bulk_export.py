@@ -0,0 +1,297 @@
+# bulk_export.py
+"""
+Streaming PDF exports. utils (and with it ReportLab) and pypdf are
+imported inside the rendering functions, so importing this module stays
+cheap.
+"""
+import atexit
+import copy
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from sqlalchemy.orm import selectinload
+
+from filters import apply_invoice_filters
+from models import Invoice
+
+CHUNK_SIZE = 64 * 1024
+SPOOL_MAX_BYTES = 8 * 1024 * 1024
+
+# Page attributes a page may inherit from its page tree (PDF 1.7, 7.7.3.4).
+INHERITABLE_PAGE_KEYS = ("/Resources", "/MediaBox", "/CropBox", "/Rotate")
+
+# Render pools shared by every export in this process, keyed by size.
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class ExportStats:
+    """Running counters for one export, used to report throughput."""
+
+    def __init__(self):
+        self.count = 0
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self.started
+
+    @property
+    def rate(self):
+        return self.count / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        return {
+            "invoices": self.count,
+            "seconds": round(self.elapsed, 3),
+            "invoices_per_sec": round(self.rate, 1),
+        }
+
+
+class _StreamBuffer:
+    """Write-only sink for zipfile; the exporter drains it after each member."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_invoice_snapshots(filters, batch_size=200):
+    """Yield picklable snapshots of the matching invoices, batch by batch."""
+    from utils import invoice_snapshot
+
+    query = (
+        apply_invoice_filters(Invoice.query, **filters)
+        .options(selectinload(Invoice.items))
+        .order_by(Invoice.issue_date, Invoice.id)
+        .yield_per(batch_size)
+    )
+    for invoice in query:
+        yield invoice_snapshot(invoice)
+
+
+def _render_pool(workers):
+    """The process pool for this size, started on first use and kept for later exports."""
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            pool = _pools[workers] = ProcessPoolExecutor(max_workers=workers)
+        return pool
+
+
+def _drop_pool(workers, pool):
+    with _pools_lock:
+        if _pools.get(workers) is pool:
+            del _pools[workers]
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+@atexit.register
+def shutdown_pools():
+    """Stop the render processes; called at interpreter exit."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def render_parallel(snapshots, workers=None):
+    """
+    Render snapshots on a process pool, yielding (snapshot, pdf_bytes) in
+    input order. Only a couple of renders per worker are kept in flight, so
+    memory stays bounded regardless of how many invoices are exported.
+    The pool outlives the export, so requests don't pay for starting
+    worker processes; concurrent exports share it.
+    """
+    from utils import render_invoice_pdf
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for snap in snapshots:
+            yield snap, render_invoice_pdf(snap)
+        return
+
+    window = workers * 2
+    pending = deque()
+    pool = _render_pool(workers)
+    try:
+        for snap in snapshots:
+            pending.append((snap, pool.submit(render_invoice_pdf, snap)))
+            if len(pending) >= window:
+                snap_done, future = pending.popleft()
+                yield snap_done, future.result()
+        while pending:
+            snap_done, future = pending.popleft()
+            yield snap_done, future.result()
+    except BrokenProcessPool:
+        # a render process died; the next export starts a fresh pool
+        _drop_pool(workers, pool)
+        raise
+    finally:
+        # client went away mid-download: don't render the rest
+        for _, future in pending:
+            future.cancel()
+
+
+def stream_zip(filters, workers=None, stats=None):
+    """Yield a ZIP archive with one invoice_<id>.pdf per matching invoice."""
+    stats = stats or ExportStats()
+    buffer = _StreamBuffer()
+    # PDFs are already compressed, so store them as-is
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_STORED) as archive:
+        for snap, data in render_parallel(iter_invoice_snapshots(filters), workers):
+            archive.writestr(f"invoice_{snap.id}.pdf", data)
+            stats.count += 1
+            yield buffer.drain()
+        stats.finish()
+        archive.writestr("export_summary.json", json.dumps(stats.as_dict(), indent=2))
+    yield buffer.drain()
+
+
+def _inherited(page, key):
+    """
+    The value of an inheritable attribute from the page's nearest ancestor,
+    or None. Direct values are copied, since relinking rewrites them in place
+    and sibling pages may inherit the same one.
+    """
+    from pypdf.generic import IndirectObject
+
+    node = page.get("/Parent")
+    while node is not None:
+        node = node.get_object()
+        if key in node:
+            value = node.raw_get(key)
+            return value if isinstance(value, IndirectObject) else copy.deepcopy(value)
+        node = node.get("/Parent")
+    return None
+
+
+class PdfConcatenator:
+    """
+    Writes the pages of whole PDFs, one document at a time, into a single
+    output PDF. Each document's objects are written out as soon as it is
+    appended, so memory holds only the object offsets and page numbers,
+    however many documents there are. Object 1 is the catalog and object 2
+    the page tree; both are written by close(), with the xref table.
+    """
+
+    def __init__(self, out):
+        self.out = out
+        self.position = 0
+        self.offsets = [None, None]  # per object number; 1 and 2 are written last
+        self.pages = []
+        self._emit(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def _emit(self, data):
+        self.out.write(data)
+        self.position += len(data)
+
+    def append(self, data):
+        """Add every page of the PDF document `data` (bytes)."""
+        from pypdf import PdfReader
+        from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject, NameObject
+
+        numbers, pending = {}, []
+
+        def renumber(ref):
+            if ref.idnum not in numbers:
+                self.offsets.append(None)
+                numbers[ref.idnum] = len(self.offsets)
+                pending.append(ref)
+            return IndirectObject(numbers[ref.idnum], 0, None)
+
+        def relink(obj):
+            # the reader is thrown away afterwards, so its objects are renumbered in place
+            items = obj.items() if isinstance(obj, DictionaryObject) else enumerate(obj)
+            for key, value in list(items):
+                if isinstance(value, IndirectObject):
+                    obj[key] = renumber(value)
+                elif isinstance(value, (DictionaryObject, ArrayObject)):
+                    relink(value)
+
+        reader = PdfReader(io.BytesIO(data))
+        for page in reader.pages:
+            self.pages.append(renumber(page.indirect_reference).idnum)
+        while pending:
+            ref = pending.pop()
+            obj = ref.get_object()
+            is_page = isinstance(obj, DictionaryObject) and obj.get("/Type") == "/Page"
+            if is_page:
+                # the source's page tree isn't copied, so pull down what the page inherits from it
+                for key in INHERITABLE_PAGE_KEYS:
+                    if key not in obj:
+                        value = _inherited(obj, key)
+                        if value is not None:
+                            obj[NameObject(key)] = value
+                del obj["/Parent"]
+            if isinstance(obj, (DictionaryObject, ArrayObject)):
+                relink(obj)
+            if is_page:
+                obj[NameObject("/Parent")] = IndirectObject(2, 0, None)
+            self._write_object(numbers[ref.idnum], obj)
+
+    def _write_object(self, number, obj):
+        self.offsets[number - 1] = self.position
+        body = io.BytesIO()
+        obj.write_to_stream(body)
+        self._emit(b"%d 0 obj\n%s\nendobj\n" % (number, body.getvalue()))
+
+    def close(self):
+        """Write the catalog, the page tree and the xref table."""
+        self.offsets[0] = self.position
+        self._emit(b"1 0 obj\n<< /Type /Catalog /Pages 2 0 R >>\nendobj\n")
+        self.offsets[1] = self.position
+        kids = b" ".join(b"%d 0 R" % number for number in self.pages)
+        self._emit(b"2 0 obj\n<< /Type /Pages /Count %d /Kids [%s] >>\nendobj\n" % (len(self.pages), kids))
+        xref = self.position
+        size = len(self.offsets) + 1
+        self._emit(b"xref\n0 %d\n0000000000 65535 f \n" % size)
+        self._emit(b"".join(b"%010d 00000 n \n" % offset for offset in self.offsets))
+        self._emit(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (size, xref))
+
+
+def stream_merged_pdf(filters, workers=None, stats=None):
+    """
+    Yield one PDF containing every matching invoice. The invoices are
+    rendered on the process pool like the ZIP export, and a
+    PdfConcatenator appends each one's pages to a spooled temp file as it
+    arrives. Large exports therefore spill to disk instead of RAM.
+    """
+    from utils import render_notice_pdf
+
+    stats = stats or ExportStats()
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) as spool:
+        merged = PdfConcatenator(spool)
+        for _, data in render_parallel(iter_invoice_snapshots(filters), workers):
+            merged.append(data)
+            stats.count += 1
+        if not stats.count:
+            merged.append(render_notice_pdf("No invoices matched this export."))
+        merged.close()
+        stats.finish()
+        spool.seek(0)
+        while True:
+            chunk = spool.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
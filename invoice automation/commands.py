@@ -0,0 +1,356 @@
+# commands.py
+"""
+Flask CLI commands, registered without a group prefix (flask db-upgrade,
+flask seed-demo, ...). Schema setup and demo data live here rather than
+at import time, so starting a worker never touches the database.
+"""
+from datetime import datetime, timedelta
+import time
+
+import click
+from flask import Blueprint, current_app
+
+from sqlalchemy import exists
+
+from models import db, Invoice, InvoiceDelivery, InvoiceItem
+from jobs import job_queue
+from filters import invoice_filters_from_args, apply_invoice_filters
+from mailer import mailer
+import archive
+import money
+import migrations
+import rollups
+import search
+import query_plans
+import query_budget
+import recurring
+from bulk_export import ExportStats, stream_zip, stream_merged_pdf
+from importer import import_invoices, READERS as IMPORT_FORMATS
+
+bp = Blueprint("commands", __name__, cli_group=None)
+
+
+def seed_demo_data():
+    """
+    Create several demo invoices with items across different months and statuses.
+    This ensures charts and reports look realistic on a fresh DB.
+    """
+    # Only seed when empty
+    if Invoice.query.count() > 0:
+        return False
+
+    demo = []
+
+    # Helper to add invoice with items and compute amount
+    def make_invoice(client_name, client_email, description, issue_date, days_due, status, items):
+        inv = Invoice(
+            client_name=client_name,
+            client_email=client_email,
+            description=description,
+            issue_date=issue_date,
+            due_date=(issue_date + timedelta(days=days_due)),
+            status=status,
+            amount_cents=0  # will set below
+        )
+        db.session.add(inv)
+        db.session.flush()  # gives inv.id
+
+        total = 0
+        for itm in items:
+            desc = itm.get("description")
+            qty = float(itm.get("quantity", 1))
+            price_cents = money.to_cents(itm.get("price", 0))
+            tax = float(itm.get("tax", 0))
+            line_total = money.line_total(qty, price_cents, tax)
+            total += line_total
+
+            inv_item = InvoiceItem(
+                invoice_id=inv.id,
+                description=desc,
+                quantity=qty,
+                price_cents=price_cents,
+                tax=tax,
+                line_total_cents=line_total
+            )
+            db.session.add(inv_item)
+
+        # store computed total
+        inv.amount_cents = total
+        rollups.record(None, rollups.snapshot(inv))
+        return inv
+
+    # Create multiple demo invoices across months & clients
+    now = datetime.now()
+    demo.append(make_invoice(
+        client_name="Alpha Corp",
+        client_email="alpha@example.com",
+        description="Website design + small CMS",
+        issue_date=datetime(now.year, max(1, now.month - 4), 12).date(),
+        days_due=14,
+        status="Paid",
+        items=[
+            {"description": "Landing page design", "quantity": 1, "price": 600, "tax": 5},
+            {"description": "CMS setup", "quantity": 1, "price": 400, "tax": 0},
+        ]
+    ))
+
+    demo.append(make_invoice(
+        client_name="Beta Ltd",
+        client_email="beta@example.com",
+        description="SEO & content",
+        issue_date=datetime(now.year, max(1, now.month - 3), 6).date(),
+        days_due=30,
+        status="Unpaid",
+        items=[
+            {"description": "SEO package (3 months)", "quantity": 1, "price": 750, "tax": 0},
+        ]
+    ))
+
+    demo.append(make_invoice(
+        client_name="Gamma Inc",
+        client_email="gamma@example.com",
+        description="Mobile App MVP",
+        issue_date=datetime(now.year, max(1, now.month - 2), 3).date(),
+        days_due=30,
+        status="Paid",
+        items=[
+            {"description": "iOS development (hrs)", "quantity": 60, "price": 20, "tax": 10},
+            {"description": "Backend API", "quantity": 1, "price": 1200, "tax": 0},
+        ]
+    ))
+
+    demo.append(make_invoice(
+        client_name="Delta Co",
+        client_email="delta@example.com",
+        description="Branding & logo",
+        issue_date=datetime(now.year, max(1, now.month - 1), 18).date(),
+        days_due=10,
+        status="Paid",
+        items=[
+            {"description": "Branding package", "quantity": 1, "price": 1500, "tax": 0},
+        ]
+    ))
+
+    demo.append(make_invoice(
+        client_name="Epsilon Partners",
+        client_email="eps@partners.com",
+        description="Maintenance & support",
+        issue_date=datetime(now.year, now.month, min(10, now.day)).date(),
+        days_due=7,
+        status="Unpaid",
+        items=[
+            {"description": "Monthly maintenance", "quantity": 1, "price": 199, "tax": 0},
+            {"description": "Emergency support (hrs)", "quantity": 2, "price": 50, "tax": 0},
+        ]
+    ))
+
+    search.reindex([inv.id for inv in demo])
+    # the maintenance contract repeats every month
+    db.session.add(recurring.from_invoice(demo[-1], interval_months=1))
+    db.session.commit()
+    return True
+
+
+# --- CLI ---
+@bp.cli.command("db-upgrade")
+def db_upgrade_command():
+    """Create missing tables and apply pending schema migrations."""
+    applied = migrations.upgrade()
+    click.echo(f"Applied migrations: {applied}" if applied else "Schema is up to date")
+
+
+@bp.cli.command("seed-demo")
+def seed_demo_command():
+    """Add the demo invoices to an empty database."""
+    if seed_demo_data():
+        click.echo("Demo invoices added")
+    else:
+        click.echo("Database already has invoices, nothing seeded")
+
+
+@bp.cli.command("rebuild-rollups")
+def rebuild_rollups_command():
+    """Recompute the monthly and per-client revenue rollups from invoices."""
+    rollups.rebuild()
+    db.session.commit()
+    click.echo("Revenue rollups rebuilt")
+
+
+@bp.cli.command("rebuild-search-index")
+def rebuild_search_index_command():
+    """Recompute the full-text search index from invoices and their items."""
+    search.rebuild()
+    db.session.commit()
+    click.echo("Search index rebuilt")
+
+
+@bp.cli.command("explain-queries")
+@click.argument("paths", nargs=-1)
+@click.option("--verbose", "-v", is_flag=True, help="Print every plan, not just full scans.")
+def explain_queries_command(paths, verbose):
+    """EXPLAIN the SQL issued by the hot routes and fail on full table scans."""
+    paths = list(paths) or query_plans.default_paths()
+    failures = 0
+    for path, statement, plan, scans in query_plans.check_routes(current_app._get_current_object(), paths):
+        if scans:
+            failures += 1
+        if scans or verbose:
+            click.echo(f"{'FULL SCAN' if scans else 'ok':9} {path}")
+            click.echo(f"    {' '.join(statement.split())}")
+            for line in plan:
+                click.echo(f"      -> {line}")
+    click.echo(f"{failures} quer{'y' if failures == 1 else 'ies'} with full table scans")
+    if failures:
+        raise SystemExit(1)
+
+
+@bp.cli.command("check-query-budgets")
+@click.option("--verbose", "-v", is_flag=True, help="Print the statements of every route.")
+def check_query_budgets_command(verbose):
+    """Count the SQL issued by each route and fail when one exceeds its budget."""
+    failures = 0
+    for path, status, statements, budget in query_budget.check_budgets(current_app._get_current_object(), query_budget.default_budgets()):
+        over = len(statements) > budget or status >= 500
+        failures += over
+        click.echo(f"{'OVER' if over else 'ok':5} {len(statements):3}/{budget:<3} {status} {path}")
+        if over or verbose:
+            for statement, _ in statements:
+                click.echo(f"      {' '.join(statement.split())}")
+    click.echo(f"{failures} route{'' if failures == 1 else 's'} over budget")
+    if failures:
+        raise SystemExit(1)
+
+
+@bp.cli.command("export-pdfs")
+@click.argument("output", type=click.Path(dir_okay=False, writable=True))
+@click.option("--format", "fmt", type=click.Choice(["zip", "pdf"]), default="zip", show_default=True)
+@click.option("--start", help="Earliest issue date (YYYY-MM-DD).")
+@click.option("--end", help="Latest issue date (YYYY-MM-DD).")
+@click.option("--status", help="Only invoices with this status, e.g. Paid.")
+@click.option("--client", help="Only invoices for this client name.")
+@click.option("--workers", type=int, default=None, help="Render processes (default: CPU count).")
+def export_pdfs_command(output, fmt, start, end, status, client, workers):
+    """Render matching invoices into a ZIP of PDFs or one merged PDF."""
+    filters = invoice_filters_from_args({"start": start, "end": end, "status": status, "client": client})
+    stats = ExportStats()
+    workers = workers or current_app.config["PDF_EXPORT_WORKERS"]
+    with open(output, "wb") as fh:
+        if fmt == "pdf":
+            chunks = stream_merged_pdf(filters, workers=workers, stats=stats)
+        else:
+            chunks = stream_zip(filters, workers=workers, stats=stats)
+        for chunk in chunks:
+            fh.write(chunk)
+    click.echo(f"Exported {stats.count} invoices to {output} in {stats.elapsed:.2f}s "
+               f"({stats.rate:.1f} invoices/sec)")
+
+
+@bp.cli.command("import-invoices")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", "fmt", type=click.Choice(sorted(IMPORT_FORMATS)), default=None,
+              help="Input format (default: from the file extension).")
+@click.option("--batch-size", type=int, default=None, help="Invoices per INSERT batch.")
+def import_invoices_command(path, fmt, batch_size):
+    """Bulk-import invoices from a CSV or JSON-lines file."""
+    fmt = fmt or ("jsonl" if path.lower().endswith((".jsonl", ".ndjson")) else "csv")
+    with open(path, encoding="utf-8-sig", newline="") as fh:
+        result = import_invoices(fh, fmt, batch_size or current_app.config["IMPORT_BATCH_SIZE"])
+    click.echo(f"Imported {result.imported} of {result.records} records ({result.items} items) "
+               f"in {result.elapsed:.2f}s ({result.rate:.1f} rows/sec)")
+    for error in result.errors[:20]:
+        click.echo(f"  line {error['line']}: {error['error']}", err=True)
+    if result.error_count > 20:
+        click.echo(f"  ... and {result.error_count - 20} more errors", err=True)
+
+
+@bp.cli.command("generate-recurring")
+@click.option("--date", "as_of", type=click.DateTime(formats=["%Y-%m-%d"]), default=None,
+              help="Issue periods due on or before this date (default: today).")
+@click.option("--batch-size", type=int, default=None, help="Templates per transaction.")
+@click.option("--render-pdfs", is_flag=True, help="Pre-render the new invoices' PDFs into the cache.")
+@click.option("--workers", type=int, default=None, help="Render processes (default: PDF_EXPORT_WORKERS).")
+def generate_recurring_command(as_of, batch_size, render_pdfs, workers):
+    """Issue the invoices of every recurring template that is due; safe to rerun."""
+    result = recurring.generate_due(
+        as_of.date() if as_of else None,
+        batch_size=batch_size or current_app.config["RECURRING_BATCH_SIZE"],
+        render_pdfs=render_pdfs,
+        workers=workers or current_app.config["PDF_EXPORT_WORKERS"],
+    )
+    click.echo(f"Issued {result.invoices} invoices ({result.items} items) from {result.templates} templates "
+               f"in {result.elapsed:.2f}s ({result.rate:.1f} invoices/sec)")
+    if render_pdfs:
+        click.echo(f"Pre-rendered {result.rendered} PDFs")
+    if result.conflicts:
+        click.echo(f"  {result.conflicts} templates skipped: issued concurrently by another run", err=True)
+
+
+@bp.cli.command("send-invoices")
+@click.option("--start", help="Earliest issue date (YYYY-MM-DD).")
+@click.option("--end", help="Latest issue date (YYYY-MM-DD).")
+@click.option("--status", help="Only invoices with this status, e.g. Unpaid.")
+@click.option("--client", help="Only invoices for this client name.")
+@click.option("--unsent", is_flag=True, help="Skip invoices that have already been emailed successfully.")
+@click.option("--batch-size", type=int, default=None, help="Invoices per batch (default: MAIL_BATCH_SIZE).")
+@click.option("--workers", type=int, default=None, help="Render processes for uncached PDFs (default: PDF_EXPORT_WORKERS).")
+def send_invoices_command(start, end, status, client, unsent, batch_size, workers):
+    """Email matching invoices' PDFs to their clients; exits 1 if any delivery failed."""
+    filters = invoice_filters_from_args({"start": start, "end": end, "status": status, "client": client})
+    query = apply_invoice_filters(db.session.query(Invoice.id), **filters)
+    if unsent:
+        query = query.filter(~exists().where(InvoiceDelivery.invoice_id == Invoice.id, InvoiceDelivery.status == "sent"))
+    invoice_ids = [invoice_id for (invoice_id,) in query.order_by(Invoice.id)]
+    result = mailer.send_invoices(invoice_ids, batch_size=batch_size,
+                                  render_workers=workers or current_app.config["PDF_EXPORT_WORKERS"])
+    mailer.pool.close()
+    click.echo(f"Sent {result.sent} of {result.invoices} invoices over {result.connections} SMTP connections "
+               f"in {result.elapsed:.2f}s ({result.rate:.1f} emails/sec, {result.retries} retries, "
+               f"{result.rendered} PDFs rendered)")
+    if result.failed:
+        click.echo(f"  {result.failed} deliveries failed; rerun with --unsent to retry them", err=True)
+        raise SystemExit(1)
+
+
+@bp.cli.command("archive-year")
+@click.argument("year", type=int)
+@click.option("--vacuum", is_flag=True, help="Compact the live database file afterwards.")
+def archive_year_command(year, vacuum):
+    """Move a closed year's paid invoices into its read-only archive file."""
+    started = time.perf_counter()
+    try:
+        summary = archive.archive_year(year, vacuum=vacuum)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    if summary is None:
+        click.echo(f"No paid invoices from {year} to archive")
+        return
+    click.echo(f"Archived {year} in {time.perf_counter() - started:.2f}s: {summary.filename} holds "
+               f"{summary.invoice_count} invoices ({summary.item_count} items, "
+               f"{money.from_cents(summary.total_cents):.2f} total)")
+    click.echo("Reload the web workers so they attach the new archive")
+
+
+@bp.cli.command("mail-worker")
+def mail_worker_command():
+    """Send queued invoice emails in the foreground until interrupted."""
+    mailer.start()
+    click.echo("Mail sender running, press Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        mailer.stop()
+        mailer.pool.close()
+
+
+@bp.cli.command("pdf-worker")
+@click.option("--workers", type=int, default=None, help="Worker threads (default: PDF_JOB_WORKERS).")
+def pdf_worker_command(workers):
+    """Process queued PDF jobs in the foreground until interrupted."""
+    job_queue.start(workers)
+    click.echo("PDF job worker running, press Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        job_queue.stop()
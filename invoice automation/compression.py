@@ -0,0 +1,56 @@
+# compression.py
+"""
+gzip for JSON responses.
+
+A response is compressed when the client sends Accept-Encoding: gzip,
+its mimetype is in GZIP_MIMETYPES and its body is at least
+GZIP_MIN_BYTES. Smaller bodies are sent as they are, because the gzip
+header and the CPU time would cost more than they save. Streamed
+responses (exports, PDFs) are never buffered to compress them.
+"""
+import gzip
+
+from flask import request
+
+
+class Compression:
+    def __init__(self, app=None):
+        self.min_bytes = 0
+        self.level = 6
+        self.mimetypes = ()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("GZIP_MIN_BYTES", 1024)
+        app.config.setdefault("GZIP_LEVEL", 6)
+        app.config.setdefault("GZIP_MIMETYPES", ("application/json",))
+        self.min_bytes = app.config["GZIP_MIN_BYTES"]
+        self.level = app.config["GZIP_LEVEL"]
+        self.mimetypes = tuple(app.config["GZIP_MIMETYPES"])
+        app.extensions["compression"] = self
+        app.after_request(self._after_request)
+
+    def _after_request(self, response):
+        if response.mimetype not in self.mimetypes or response.is_streamed or response.direct_passthrough:
+            return response
+        response.vary.add("Accept-Encoding")
+        if (
+            response.content_encoding
+            or not 200 <= response.status_code < 300
+            or response.status_code in (204, 206)
+            or not request.accept_encodings["gzip"]
+            or (response.content_length or 0) < self.min_bytes
+        ):
+            return response
+        # mtime=0 keeps the output identical for identical bodies
+        response.set_data(gzip.compress(response.get_data(), self.level, mtime=0))
+        response.content_encoding = "gzip"
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            # the compressed bytes differ, so a strong validator no longer applies
+            response.set_etag(etag, weak=True)
+        return response
+
+
+compression = Compression()
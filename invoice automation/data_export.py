@@ -0,0 +1,88 @@
+# data_export.py
+"""
+Streaming CSV / JSON-lines export of invoices joined with their items.
+
+Rows come from one server-side cursor (yield_per) over the
+invoices LEFT JOIN invoice_items join and are written out in small
+chunks, so memory stays flat and the first bytes go out immediately. The
+CSV columns match what importer.py reads, so exports can be re-imported.
+"""
+import csv
+import io
+import json
+
+from sqlalchemy import select
+
+from filters import apply_invoice_filters
+from models import db, Invoice, InvoiceItem
+from money import format_cents, from_cents
+
+CSV_COLUMNS = [
+    "invoice_ref", "client_name", "client_email", "description", "issue_date", "due_date",
+    "status", "amount", "item_description", "quantity", "price", "tax",
+]
+ROWS_PER_CHUNK = 500
+
+
+def _rows(filters, yield_per=1000):
+    stmt = (
+        select(
+            Invoice.id, Invoice.client_name, Invoice.client_email, Invoice.description,
+            Invoice.issue_date, Invoice.due_date, Invoice.status, Invoice.amount_cents,
+            InvoiceItem.description, InvoiceItem.quantity, InvoiceItem.price_cents, InvoiceItem.tax,
+        )
+        .outerjoin(InvoiceItem, InvoiceItem.invoice_id == Invoice.id)
+        .order_by(Invoice.issue_date, Invoice.id, InvoiceItem.id)
+    )
+    stmt = apply_invoice_filters(stmt, **filters)
+    return db.session.execute(stmt, execution_options={"yield_per": yield_per})
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+def stream_csv(filters):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    for n, row in enumerate(_rows(filters), start=1):
+        writer.writerow([
+            row[0], row[1], row[2], row[3], _iso(row[4]), _iso(row[5]), row[6], format_cents(row[7]),
+            row[8], row[9], None if row[8] is None else format_cents(row[10]), row[11],
+        ])
+        if n % ROWS_PER_CHUNK == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def stream_jsonl(filters):
+    """One JSON object per invoice, with its items nested."""
+    chunk, current = [], None
+    for row in _rows(filters):
+        if current is None or current["id"] != row[0]:
+            if current is not None:
+                chunk.append(json.dumps(current))
+                if len(chunk) >= ROWS_PER_CHUNK:
+                    yield "\n".join(chunk) + "\n"
+                    chunk = []
+            current = {
+                "id": row[0], "client_name": row[1], "client_email": row[2], "description": row[3],
+                "issue_date": _iso(row[4]), "due_date": _iso(row[5]), "status": row[6],
+                "amount": from_cents(row[7]), "items": [],
+            }
+        if row[8] is not None:
+            current["items"].append({"description": row[8], "quantity": row[9],
+                                     "price": from_cents(row[10]), "tax": row[11]})
+    if current is not None:
+        chunk.append(json.dumps(current))
+    if chunk:
+        yield "\n".join(chunk) + "\n"
+
+
+FORMATS = {
+    "csv": (stream_csv, "text/csv"),
+    "jsonl": (stream_jsonl, "application/x-ndjson"),
+}
@@ -0,0 +1,82 @@
+# database.py
+"""
+Engine configuration shared by the web workers and the CLI.
+
+DATABASE_URL selects the database (default: sqlite:///invoices.db in the
+instance folder). For SQLite every new connection is switched to WAL with
+tuned pragmas, so several gunicorn workers can read while one writes and
+writers wait on a busy timeout instead of failing with "database is
+locked". Server databases (PostgreSQL, MySQL) get a pre-pinged, recycled
+connection pool instead.
+"""
+import os
+
+from sqlalchemy import event
+
+from models import db
+
+DEFAULT_URL = "sqlite:///invoices.db"
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value not in (None, "") else default
+
+
+def configure(app):
+    """Fill in database settings on app.config; call before db.init_app(app)."""
+    url = os.environ.get("DATABASE_URL", DEFAULT_URL)
+    if url.startswith("postgres://"):
+        # Heroku-style URLs; SQLAlchemy only accepts the postgresql:// scheme
+        url = "postgresql://" + url[len("postgres://"):]
+    app.config["SQLALCHEMY_DATABASE_URI"] = url
+
+    app.config.setdefault("SQLITE_TUNING", os.environ.get("SQLITE_TUNING", "1") != "0")
+    app.config.setdefault("SQLITE_JOURNAL_MODE", os.environ.get("SQLITE_JOURNAL_MODE", "WAL"))
+    app.config.setdefault("SQLITE_SYNCHRONOUS", os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL"))
+    app.config.setdefault("SQLITE_CACHE_SIZE_KB", _env_int("SQLITE_CACHE_SIZE_KB", 64 * 1024))
+    app.config.setdefault("SQLITE_MMAP_SIZE", _env_int("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+    app.config.setdefault("SQLITE_BUSY_TIMEOUT_MS", _env_int("SQLITE_BUSY_TIMEOUT_MS", 10000))
+
+    # Each gunicorn worker owns its pool; keep it small so N workers don't
+    # hold N * pool_size connections on a server database.
+    pool = {
+        "pool_size": _env_int("DB_POOL_SIZE", 5),
+        "max_overflow": _env_int("DB_MAX_OVERFLOW", 5),
+    }
+    # URI filenames let archive.py ATTACH the year archives read-only
+    if url in ("sqlite://", "sqlite:///:memory:"):
+        options = {"connect_args": {"uri": True}}  # in-memory databases use a single static connection
+    elif url.startswith("sqlite"):
+        options = dict(pool, connect_args={
+            "timeout": app.config["SQLITE_BUSY_TIMEOUT_MS"] / 1000,
+            "check_same_thread": False,
+            "uri": True,
+        })
+    else:
+        options = dict(pool, pool_pre_ping=True, pool_recycle=_env_int("DB_POOL_RECYCLE", 1800))
+    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", options)
+
+
+def install_sqlite_pragmas(app):
+    """Register the per-connection pragmas on the app's engine; call after db.init_app(app)."""
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name != "sqlite" or not app.config["SQLITE_TUNING"]:
+        return
+
+    pragmas = [
+        f"PRAGMA journal_mode={app.config['SQLITE_JOURNAL_MODE']}",
+        f"PRAGMA synchronous={app.config['SQLITE_SYNCHRONOUS']}",
+        f"PRAGMA cache_size=-{int(app.config['SQLITE_CACHE_SIZE_KB'])}",
+        f"PRAGMA mmap_size={int(app.config['SQLITE_MMAP_SIZE'])}",
+        f"PRAGMA busy_timeout={int(app.config['SQLITE_BUSY_TIMEOUT_MS'])}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
@@ -0,0 +1,40 @@
+# filters.py
+from datetime import datetime
+
+from models import Invoice
+
+
+def parse_date(value):
+    """Parse a YYYY-MM-DD string, returning None for empty or invalid input."""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        return None
+
+
+def invoice_filters_from_args(args):
+    """
+    Read the shared invoice filters (start, end, status, client) from a
+    request.args-like mapping.
+    """
+    return {
+        "start": parse_date(args.get("start")),
+        "end": parse_date(args.get("end")),
+        "status": (args.get("status") or "").strip() or None,
+        "client": (args.get("client") or "").strip() or None,
+    }
+
+
+def apply_invoice_filters(query, start=None, end=None, status=None, client=None):
+    """Restrict an Invoice query by issue date range, status and client name."""
+    if start:
+        query = query.filter(Invoice.issue_date >= start)
+    if end:
+        query = query.filter(Invoice.issue_date <= end)
+    if status:
+        query = query.filter(Invoice.status == status)
+    if client:
+        query = query.filter(Invoice.client_name == client)
+    return query
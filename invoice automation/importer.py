@@ -0,0 +1,260 @@
+# importer.py
+"""
+Streaming bulk import of invoices from CSV or JSON lines.
+
+CSV: one row per line item with the columns
+    invoice_ref, client_name, client_email, description, issue_date,
+    due_date, status, item_description, quantity, price, tax
+Consecutive rows sharing a non-empty invoice_ref form one invoice; rows
+without a ref are single-item invoices.
+
+JSON lines: one invoice object per line with the same invoice fields and
+an "items" list of {description, quantity, price, tax}.
+
+Valid invoices are inserted in batches with executemany; a bad record is
+reported with its line number and skipped without aborting the file.
+"""
+import csv
+import json
+import math
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import insert
+
+from filters import parse_date
+from models import db, Invoice, InvoiceItem
+import money
+import rollups
+import search
+
+STATUSES = {"paid": "Paid", "unpaid": "Unpaid"}
+MAX_REPORTED_ERRORS = 1000
+
+
+class ImportResult:
+    def __init__(self):
+        self.records = 0
+        self.imported = 0
+        self.items = 0
+        self.errors = []
+        self.error_count = 0
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def fail(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": message})
+
+    @property
+    def rate(self):
+        return self.records / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        return {
+            "records": self.records,
+            "imported": self.imported,
+            "items": self.items,
+            "failed": self.error_count,
+            "errors": self.errors,
+            "seconds": round(self.elapsed, 3),
+            "rows_per_sec": round(self.rate, 1),
+        }
+
+
+# --- Readers: yield (line_number, raw_record) ---
+def read_jsonl(stream):
+    for line_no, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_no, ValueError(f"invalid JSON: {e}")
+            continue
+        yield line_no, record if isinstance(record, dict) else ValueError("expected a JSON object")
+
+
+def read_csv(stream):
+    reader = csv.DictReader(stream)
+    current, current_ref, current_line = None, None, None
+    for row in reader:
+        line_no = reader.line_num
+        ref = (row.get("invoice_ref") or "").strip()
+        item = {
+            "description": row.get("item_description"),
+            "quantity": row.get("quantity"),
+            "price": row.get("price"),
+            "tax": row.get("tax"),
+        }
+        if current is not None and ref and ref == current_ref:
+            current["items"].append(item)
+            continue
+        if current is not None:
+            yield current_line, current
+        current = {k: row.get(k) for k in
+                   ("client_name", "client_email", "description", "issue_date", "due_date", "status")}
+        current["items"] = [item] if item["description"] else []
+        current_ref, current_line = ref, line_no
+    if current is not None:
+        yield current_line, current
+
+
+READERS = {"csv": read_csv, "jsonl": read_jsonl}
+
+
+# --- Validation ---
+def validate(record):
+    """Normalise one raw record into (invoice_values, item_rows) or raise ValueError."""
+    client_name = (record.get("client_name") or "").strip()
+    client_email = (record.get("client_email") or "").strip()
+    if not client_name:
+        raise ValueError("client_name is required")
+    if not client_email:
+        raise ValueError("client_email is required")
+
+    issue_date = _date_field(record, "issue_date") or date.today()
+    due_date = _date_field(record, "due_date") or (issue_date + timedelta(days=7))
+
+    status = STATUSES.get(str(record.get("status") or "unpaid").strip().lower())
+    if status is None:
+        raise ValueError(f"unknown status {record.get('status')!r}")
+
+    items = validate_items(record.get("items") or [])
+
+    invoice = {
+        "client_name": client_name[:120],
+        "client_email": client_email[:120],
+        "description": record.get("description") or None,
+        "issue_date": issue_date,
+        "due_date": due_date,
+        "status": status,
+    }
+    return invoice, items
+
+
+def validate_items(raw_items):
+    """Normalise raw {description, quantity, price, tax} items into item rows or raise ValueError."""
+    items = []
+    for n, raw in enumerate(raw_items, start=1):
+        if not isinstance(raw, dict):
+            raise ValueError(f"item {n}: expected an object")
+        description = (raw.get("description") or "").strip()
+        if not description:
+            raise ValueError(f"item {n}: description is required")
+        try:
+            quantity = float(_given(raw.get("quantity"), 1))
+            price_cents = money.to_cents(_given(raw.get("price"), 0))
+            tax = float(_given(raw.get("tax"), 0))
+            if any(isinstance(raw.get(k), bool) for k in ("quantity", "price", "tax")):
+                raise ValueError(n)
+            if not (math.isfinite(quantity) and math.isfinite(tax)):
+                raise ValueError(n)
+        except (TypeError, ValueError):
+            raise ValueError(f"item {n}: quantity, price and tax must be numbers")
+        if quantity < 0 or price_cents < 0 or tax < 0:
+            raise ValueError(f"item {n}: quantity, price and tax must not be negative")
+        items.append({"description": description[:255], "quantity": quantity,
+                      "price_cents": price_cents, "tax": tax})
+    return items
+
+
+def _given(value, default):
+    """`value` unless it was left out (None or blank), so an explicit 0 stays 0."""
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return default
+    return value
+
+
+def _date_field(record, field):
+    value = record.get(field)
+    if isinstance(value, date):
+        return value
+    if value in (None, ""):
+        return None
+    parsed = parse_date(str(value).strip())
+    if parsed is None:
+        raise ValueError(f"{field} must be YYYY-MM-DD")
+    return parsed
+
+
+# --- Batched insert ---
+def insert_invoices(rows, session=None):
+    """
+    Bulk INSERT invoice rows and return their new ids in row order.
+
+    On SQLite, sort_by_parameter_order makes SQLAlchemy fall back to one
+    INSERT per row. The invoices table is AUTOINCREMENT, so each new row
+    gets an id above every id issued before and the ids of a bulk insert
+    rise in parameter order. Sorting the RETURNING values is therefore
+    enough.
+    """
+    session = session or db.session
+    if session.get_bind().dialect.name == "sqlite":
+        return sorted(session.scalars(insert(Invoice).returning(Invoice.id), rows).all())
+    return session.scalars(insert(Invoice).returning(Invoice.id, sort_by_parameter_order=True), rows).all()
+
+
+def write_invoices(invoices, item_lists, session=None):
+    """
+    Insert validated invoices, each with its list of item rows (validate()
+    output), and add them to the rollups and the search index. Uses one
+    statement per table and leaves the commit to the caller. Returns the
+    new ids in order.
+    """
+    session = session or db.session
+    amounts = money.apply_line_totals(item_lists)
+
+    invoice_rows = [dict(invoice, amount_cents=amount) for invoice, amount in zip(invoices, amounts)]
+    ids = insert_invoices(invoice_rows, session)
+    item_rows = [dict(item, invoice_id=invoice_id) for invoice_id, items in zip(ids, item_lists) for item in items]
+    if item_rows:
+        session.execute(insert(InvoiceItem), item_rows)
+    rollups.record_many(
+        (rollups.contribution(row["issue_date"], row["status"], row["client_name"], row["amount_cents"])
+         for row in invoice_rows),
+        session,
+    )
+    search.index((search.document(invoice_id, invoice, items)
+                  for invoice_id, invoice, items in zip(ids, invoices, item_lists)), session)
+    return ids
+
+
+def _flush_batch(batch, result):
+    """Insert one batch of (line, invoice, items) in a single transaction."""
+    try:
+        write_invoices([invoice for _, invoice, _ in batch], [items for _, _, items in batch])
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        for line_no, _, _ in batch:
+            result.fail(line_no, f"batch insert failed: {e}")
+        return
+    result.imported += len(batch)
+    result.items += sum(len(items) for _, _, items in batch)
+
+
+def import_invoices(stream, fmt, batch_size=1000):
+    """Import every record from a text stream. Returns an ImportResult."""
+    reader = READERS[fmt]
+    result = ImportResult()
+    batch = []
+    for line_no, record in reader(stream):
+        result.records += 1
+        if isinstance(record, Exception):
+            result.fail(line_no, str(record))
+            continue
+        try:
+            invoice, items = validate(record)
+        except ValueError as e:
+            result.fail(line_no, str(e))
+            continue
+        batch.append((line_no, invoice, items))
+        if len(batch) >= batch_size:
+            _flush_batch(batch, result)
+            batch = []
+    if batch:
+        _flush_batch(batch, result)
+    result.elapsed = time.perf_counter() - result.started
+    return result
@@ -0,0 +1,93 @@
+# invoice_items.py
+import math
+from itertools import zip_longest
+
+from sqlalchemy import delete, insert, update
+
+from models import db, InvoiceItem
+import money
+
+ITEM_FIELDS = ("description", "quantity", "price_cents", "tax", "line_total_cents")
+
+
+def parse_item_rows(form):
+    """
+    Read the item_*[] arrays posted by the create/edit forms into dicts.
+    item_id[] is optional: rows without an id are new items. Prices are
+    converted to cents and every row gets its line_total_cents.
+    """
+    rows = []
+    for item_id, name, qty, price, tax in zip_longest(
+        form.getlist("item_id[]"),
+        form.getlist("item_name[]"),
+        form.getlist("item_qty[]"),
+        form.getlist("item_price[]"),
+        form.getlist("item_tax[]"),
+    ):
+        if not name or not name.strip():
+            continue
+        try:
+            qty_val = float(qty or 0)
+            price_cents = money.to_cents(price or 0)
+            tax_val = float(tax or 0)
+            if not (math.isfinite(qty_val) and math.isfinite(tax_val)):
+                raise ValueError(qty)
+        except ValueError:
+            qty_val = 0.0
+            price_cents = 0
+            tax_val = 0.0
+        rows.append({
+            "id": int(item_id) if item_id and item_id.isdigit() else None,
+            "description": name,
+            "quantity": qty_val,
+            "price_cents": price_cents,
+            "tax": tax_val,
+        })
+
+    money.apply_line_totals([rows])
+    return rows
+
+
+def rows_total(rows):
+    """Invoice amount in cents for parsed rows."""
+    return sum(row["line_total_cents"] for row in rows)
+
+
+def sync_items(invoice, rows):
+    """
+    Make the invoice's items match `rows`, issuing only the needed INSERTs,
+    UPDATEs and DELETEs as one bulk statement each. Rows whose id isn't one
+    of this invoice's items are inserted as new. Returns True if anything
+    changed.
+    """
+    existing = {item.id: item for item in invoice.items}
+    inserts, updates, kept = [], [], set()
+
+    for row in rows:
+        values = {field: row[field] for field in ITEM_FIELDS}
+        item = existing.get(row.get("id"))
+        if item is None or item.id in kept:
+            inserts.append(dict(values, invoice_id=invoice.id))
+            continue
+        kept.add(item.id)
+        if any(getattr(item, field) != value for field, value in values.items()):
+            updates.append(dict(values, id=item.id))
+
+    deletes = [item_id for item_id in existing if item_id not in kept]
+    if not (inserts or updates or deletes):
+        return False
+
+    if deletes:
+        db.session.execute(
+            delete(InvoiceItem).where(InvoiceItem.id.in_(deletes)),
+            execution_options={"synchronize_session": False},
+        )
+    if updates:
+        db.session.execute(update(InvoiceItem), updates)  # bulk UPDATE by primary key
+    if inserts:
+        db.session.execute(insert(InvoiceItem), inserts)
+    # bulk statements bypass the relationship; reload it on next access
+    db.session.expire(invoice, ["items"])
+    for item in existing.values():
+        db.session.expire(item)
+    return True
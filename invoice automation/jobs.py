@@ -0,0 +1,176 @@
+# jobs.py
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+from sqlalchemy.orm import joinedload
+
+from models import db, Invoice, PdfJob
+from pdf_cache import pdf_cache
+
+MAINTENANCE_INTERVAL = 60
+
+
+class JobQueue:
+    """
+    Local PDF render queue backed by the pdf_jobs table.
+
+    Any process can enqueue; worker threads in any process claim queued rows
+    with a conditional UPDATE, so several gunicorn workers (or a dedicated
+    'flask pdf-worker' process) share the queue without an external broker.
+    Threads in web workers start lazily on the first enqueue.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._threads = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._last_maintenance = float("-inf")
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("PDF_JOB_WORKERS", 2)
+        app.config.setdefault("PDF_JOB_POLL_INTERVAL", 1.0)
+        # running jobs older than this are assumed orphaned by a dead worker
+        app.config.setdefault("PDF_JOB_STALE_SECONDS", 300)
+        app.config.setdefault("PDF_JOB_RETENTION_SECONDS", 24 * 3600)
+        self.app = app
+        app.extensions["pdf_jobs"] = self
+
+    # --- Producer side ---
+    def enqueue(self, invoice_id):
+        job = PdfJob(invoice_id=invoice_id, status="queued", progress=0.0)
+        db.session.add(job)
+        db.session.commit()
+        self.start()
+        self._wakeup.set()
+        return job
+
+    # --- Worker side ---
+    def start(self, workers=None):
+        """Start worker threads in this process (idempotent)."""
+        with self._lock:
+            if self._threads:
+                return
+            for n in range(workers or self.app.config["PDF_JOB_WORKERS"]):
+                t = threading.Thread(target=self.run_forever, name=f"pdf-job-{n}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def stop(self):
+        self._stopping.set()
+        self._wakeup.set()
+
+    def run_forever(self):
+        interval = self.app.config["PDF_JOB_POLL_INTERVAL"]
+        while not self._stopping.is_set():
+            try:
+                with self.app.app_context():
+                    worked = self.run_once()
+            except Exception:
+                self.app.logger.exception("PDF job worker crashed; retrying")
+                worked = False
+            if not worked:
+                self._wakeup.wait(interval)
+                self._wakeup.clear()
+
+    def run_once(self):
+        """Claim and process one job. Returns False when the queue is empty."""
+        self._maintenance()
+        job = self._claim()
+        if job is None:
+            return False
+        self._process(job)
+        return True
+
+    def _maintenance(self):
+        # requeue orphans and purge old results at most once a minute, so
+        # idle pollers don't take the SQLite write lock every interval
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_maintenance < MAINTENANCE_INTERVAL:
+                return
+            self._last_maintenance = now
+        self._requeue_stale()
+        self._purge_finished()
+
+    def _claim(self):
+        candidate = (
+            db.session.query(PdfJob.id)
+            .filter(PdfJob.status == "queued")
+            .order_by(PdfJob.id)
+            .limit(1)
+            .scalar()
+        )
+        if candidate is None:
+            return None
+        # only one worker wins the queued -> running transition
+        claimed = db.session.execute(
+            update(PdfJob)
+            .where(PdfJob.id == candidate, PdfJob.status == "queued")
+            .values(status="running", started_at=datetime.utcnow())
+        ).rowcount
+        db.session.commit()
+        if not claimed:
+            return None
+        return db.session.get(PdfJob, candidate)
+
+    def _process(self, job):
+        from utils import render_invoice_pdf  # keep ReportLab out of web worker startup
+
+        invoice = db.session.get(Invoice, job.invoice_id, options=[joinedload(Invoice.items)])
+        if invoice is None:
+            self._finish(job, "failed", error="Invoice no longer exists")
+            return
+
+        last = {"value": 0.0}
+
+        def report(fraction):
+            # persist in 10% steps so progress polling doesn't hammer the DB
+            if fraction - last["value"] >= 0.1 and fraction < 1.0:
+                last["value"] = fraction
+                db.session.execute(
+                    update(PdfJob).where(PdfJob.id == job.id).values(progress=fraction)
+                )
+                db.session.commit()
+
+        try:
+            cached = pdf_cache.fetch(invoice, lambda inv: render_invoice_pdf(inv, progress=report))
+        except Exception as e:
+            db.session.rollback()
+            self.app.logger.exception("PDF job %s failed", job.id)
+            self._finish(job, "failed", error=str(e))
+            return
+        self._finish(job, "done", fingerprint=cached.key[1])
+
+    def _finish(self, job, status, fingerprint=None, error=None):
+        job.status = status
+        job.progress = 1.0 if status == "done" else job.progress
+        job.fingerprint = fingerprint
+        job.error = error
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+
+    def _requeue_stale(self):
+        cutoff = datetime.utcnow() - timedelta(seconds=self.app.config["PDF_JOB_STALE_SECONDS"])
+        db.session.execute(
+            update(PdfJob)
+            .where(PdfJob.status == "running", PdfJob.started_at < cutoff)
+            .values(status="queued", progress=0.0)
+        )
+        db.session.commit()
+
+    def _purge_finished(self):
+        cutoff = datetime.utcnow() - timedelta(seconds=self.app.config["PDF_JOB_RETENTION_SECONDS"])
+        PdfJob.query.filter(
+            PdfJob.status.in_(("done", "failed")), PdfJob.finished_at < cutoff
+        ).delete(synchronize_session=False)
+        db.session.commit()
+
+
+job_queue = JobQueue()
+
@@ -0,0 +1,434 @@
+# mailer.py
+"""
+Emailing invoice PDFs to clients over SMTP.
+
+send_invoices() works through the invoices in batches of MAIL_BATCH_SIZE.
+Each batch goes through these steps:
+- PDFs come from the PDF cache. Misses are rendered on a process pool,
+  as in a bulk export, and cached.
+- The messages are sent from one thread per pooled SMTP connection.
+- The outcome is recorded with one bulk INSERT of InvoiceDelivery rows,
+  one per invoice.
+
+Each process keeps up to MAIL_POOL_SIZE connections open and reuses them
+for up to MAIL_MAX_MESSAGES_PER_CONNECTION messages each. Temporary
+failures (4xx replies, dropped connections, timeouts) are retried on a
+fresh connection. The retries back off exponentially, up to
+MAIL_MAX_ATTEMPTS tries in total. A 5xx reply fails the delivery at once.
+Point MAIL_SERVER / MAIL_PORT at a local stand-in to try it out, e.g.
+`python -m benchmarks.smtp_sink`.
+
+The invoice page's Send button only calls enqueue(), which adds a
+queued InvoiceDelivery row. A sender thread sends it in the background.
+As with the PDF jobs in jobs.py, the sender starts in the web worker on
+the first enqueue, or runs on its own under `flask mail-worker`. Every
+sender claims rows with a conditional UPDATE, so each email goes out
+once. A delivery left in "sending" for MAIL_QUEUE_STALE_SECONDS, e.g.
+by a worker that died mid-send, goes back to the queue.
+"""
+import os
+import queue
+import smtplib
+import ssl
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.utils import make_msgid
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.orm import selectinload
+
+from models import db, Invoice, InvoiceDelivery
+from money import format_cents
+from pdf_cache import pdf_cache
+
+# idle connections older than this are checked with NOOP before reuse
+IDLE_CHECK_SECONDS = 30
+# how often a sender looks for abandoned claims
+MAINTENANCE_INTERVAL = 60
+
+
+def is_temporary(error):
+    """Whether a failed send is worth retrying: 4xx replies and connection trouble, not 5xx."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(error, smtplib.SMTPException):
+        return False
+    return isinstance(error, OSError)  # refused, reset, timed out
+
+
+def _quit(smtp):
+    try:
+        smtp.quit()
+    except (smtplib.SMTPException, OSError):
+        smtp.close()
+
+
+class SMTPPool:
+    """
+    Up to `size` SMTP connections, opened by connect() when needed and
+    shared by the sending threads. A connection is retired after
+    max_messages messages, and is dropped rather than returned when a
+    send on it fails.
+    """
+
+    def __init__(self, connect, size, max_messages):
+        self._connect = connect
+        self.max_messages = max_messages
+        self.opened = 0
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self):
+        with self._slots:
+            smtp, uses = self._checkout()
+            try:
+                yield smtp
+            except BaseException:
+                smtp.close()
+                raise
+            if uses + 1 >= self.max_messages:
+                _quit(smtp)
+            else:
+                self._idle.put((smtp, uses + 1, time.monotonic()))
+
+    def _checkout(self):
+        while True:
+            try:
+                smtp, uses, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if time.monotonic() - last_used < IDLE_CHECK_SECONDS:
+                return smtp, uses
+            try:
+                smtp.noop()  # the server may have timed the idle connection out
+                return smtp, uses
+            except (smtplib.SMTPException, OSError):
+                smtp.close()
+        smtp = self._connect()
+        with self._lock:
+            self.opened += 1
+        return smtp, 0
+
+    def close(self):
+        """QUIT every idle connection."""
+        while True:
+            try:
+                smtp, _, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            _quit(smtp)
+
+
+class DeliveryResult:
+    def __init__(self):
+        self.invoices = 0
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.rendered = 0
+        self.connections = 0
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    @property
+    def rate(self):
+        return self.sent / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        return {
+            "invoices": self.invoices,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retries": self.retries,
+            "rendered": self.rendered,
+            "connections": self.connections,
+            "seconds": round(self.elapsed, 3),
+            "sent_per_sec": round(self.rate, 1),
+        }
+
+
+class Mailer:
+    """Sends invoice PDFs by email; the SMTP pool is per process and opened on first use."""
+
+    def __init__(self, app=None):
+        self.app = None
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._sender = None
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._last_maintenance = float("-inf")
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        env = os.environ.get
+        app.config.setdefault("MAIL_SERVER", env("MAIL_SERVER", "localhost"))
+        app.config.setdefault("MAIL_PORT", int(env("MAIL_PORT", 25)))
+        app.config.setdefault("MAIL_USE_TLS", env("MAIL_USE_TLS", "0") == "1")  # STARTTLS
+        app.config.setdefault("MAIL_USE_SSL", env("MAIL_USE_SSL", "0") == "1")  # implicit TLS, port 465
+        app.config.setdefault("MAIL_USERNAME", env("MAIL_USERNAME"))
+        app.config.setdefault("MAIL_PASSWORD", env("MAIL_PASSWORD"))
+        app.config.setdefault("MAIL_SENDER", env("MAIL_SENDER", "invoices@localhost"))
+        app.config.setdefault("MAIL_TIMEOUT", 30)
+        app.config.setdefault("MAIL_POOL_SIZE", 4)
+        app.config.setdefault("MAIL_MAX_MESSAGES_PER_CONNECTION", 100)
+        app.config.setdefault("MAIL_MAX_ATTEMPTS", 4)
+        app.config.setdefault("MAIL_RETRY_BACKOFF", 0.5)  # seconds before the first retry, doubled after each
+        app.config.setdefault("MAIL_BATCH_SIZE", 200)
+        app.config.setdefault("MAIL_QUEUE_POLL_INTERVAL", 5.0)
+        # "sending" rows older than this are assumed abandoned; keep it above
+        # MAIL_MAX_ATTEMPTS * MAIL_TIMEOUT plus the retry backoff
+        app.config.setdefault("MAIL_QUEUE_STALE_SECONDS", 300)
+        self.app = app
+        app.extensions["mailer"] = self
+
+    @property
+    def pool(self):
+        # opened lazily, so gunicorn workers never share sockets from before the fork
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = SMTPPool(self._connect, self.app.config["MAIL_POOL_SIZE"],
+                                      self.app.config["MAIL_MAX_MESSAGES_PER_CONNECTION"])
+            return self._pool
+
+    def _connect(self):
+        config = self.app.config
+        if config["MAIL_USE_SSL"]:
+            smtp = smtplib.SMTP_SSL(config["MAIL_SERVER"], config["MAIL_PORT"], timeout=config["MAIL_TIMEOUT"],
+                                    context=ssl.create_default_context())
+        else:
+            smtp = smtplib.SMTP(config["MAIL_SERVER"], config["MAIL_PORT"], timeout=config["MAIL_TIMEOUT"])
+        try:
+            if config["MAIL_USE_TLS"] and not config["MAIL_USE_SSL"]:
+                smtp.starttls(context=ssl.create_default_context())
+            if config["MAIL_USERNAME"]:
+                smtp.login(config["MAIL_USERNAME"], config["MAIL_PASSWORD"] or "")
+        except BaseException:
+            smtp.close()
+            raise
+        return smtp
+
+    # --- Messages ---
+    def message(self, invoice, pdf):
+        # the compat32 MIME classes: EmailMessage's header parsing took 3x as long as the SMTP send
+        sender = self.app.config["MAIL_SENDER"]
+        msg = MIMEMultipart()
+        msg["From"] = sender
+        msg["To"] = invoice.client_email
+        msg["Subject"] = f"Invoice #{invoice.id}"
+        # an explicit domain: make_msgid() would otherwise look up this host's FQDN for every message
+        msg["Message-ID"] = make_msgid(domain=sender.rpartition("@")[2] or "localhost")
+        due = f", due {invoice.due_date.isoformat()}" if invoice.due_date else ""
+        msg.attach(MIMEText(
+            f"Dear {invoice.client_name},\n\n"
+            f"Please find attached invoice #{invoice.id} for {format_cents(invoice.amount_cents, '$')}{due}.\n\n"
+            f"Thank you for your business.\n",
+            "plain", "utf-8",
+        ))
+        attachment = MIMEApplication(pdf, "pdf")
+        attachment.add_header("Content-Disposition", "attachment", filename=f"invoice_{invoice.id}.pdf")
+        msg.attach(attachment)
+        return msg
+
+    def deliver(self, message, max_attempts=None):
+        """
+        Send one message over the pool, retrying temporary failures.
+        Returns (attempts, error), with error None once the message is sent.
+        """
+        max_attempts = max_attempts or self.app.config["MAIL_MAX_ATTEMPTS"]
+        data = message.as_bytes()  # once, not per attempt
+        for attempt in range(1, max_attempts + 1):
+            try:
+                with self.pool.connection() as smtp:
+                    smtp.sendmail(message["From"], [message["To"]], data)
+                return attempt, None
+            except (smtplib.SMTPException, OSError) as e:
+                if attempt == max_attempts or not is_temporary(e):
+                    return attempt, f"{type(e).__name__}: {e}"
+                time.sleep(self.app.config["MAIL_RETRY_BACKOFF"] * 2 ** (attempt - 1))
+
+    # --- Sending ---
+    def send_invoices(self, invoice_ids, batch_size=None, render_workers=None, max_attempts=None):
+        """
+        Email each invoice's PDF to its client_email and record an
+        InvoiceDelivery for it. render_workers is the number of processes
+        for PDFs not in the cache. Returns a DeliveryResult.
+        """
+        result = DeliveryResult()
+        batch_size = batch_size or self.app.config["MAIL_BATCH_SIZE"]
+        opened = self.pool.opened
+        with ThreadPoolExecutor(max_workers=self.app.config["MAIL_POOL_SIZE"], thread_name_prefix="mail") as senders:
+            for start in range(0, len(invoice_ids), batch_size):
+                self._send_batch(invoice_ids[start:start + batch_size], senders, render_workers, max_attempts, result)
+                db.session.expunge_all()
+        result.connections = self.pool.opened - opened
+        result.elapsed = time.perf_counter() - result.started
+        return result
+
+    def _send_batch(self, invoice_ids, senders, render_workers, max_attempts, result):
+        invoices = (
+            Invoice.query.options(selectinload(Invoice.items))
+            .filter(Invoice.id.in_(invoice_ids))
+            .order_by(Invoice.id)
+            .all()
+        )
+        pdfs = _pdfs(invoices, render_workers, result)
+        messages = [self.message(invoice, pdf) if invoice.client_email else None
+                    for invoice, pdf in zip(invoices, pdfs)]
+        outcomes = senders.map(
+            lambda message: self.deliver(message, max_attempts) if message else (0, "Invoice has no client email"),
+            messages,
+        )
+
+        now = datetime.utcnow()
+        rows = []
+        for invoice, message, (attempts, error) in zip(invoices, messages, outcomes):
+            rows.append({
+                "invoice_id": invoice.id,
+                "recipient": invoice.client_email or "",
+                "status": "failed" if error else "sent",
+                "attempts": attempts,
+                "error": error,
+                "message_id": message["Message-ID"] if message else None,
+                "created_at": now,
+                "sent_at": None if error else now,
+            })
+            result.invoices += 1
+            result.retries += max(0, attempts - 1)
+            if error:
+                result.failed += 1
+            else:
+                result.sent += 1
+        if rows:
+            db.session.execute(insert(InvoiceDelivery), rows)
+        db.session.commit()
+
+    # --- Queue ---
+    def enqueue(self, invoice):
+        """Queue an email of the invoice for the background sender; returns the queued InvoiceDelivery."""
+        delivery = InvoiceDelivery(invoice_id=invoice.id, recipient=invoice.client_email or "", status="queued",
+                                   attempts=0, created_at=datetime.utcnow())
+        db.session.add(delivery)
+        db.session.commit()
+        self.start()
+        self._wakeup.set()
+        return delivery
+
+    def start(self):
+        """Start the sender thread in this process (idempotent)."""
+        with self._pool_lock:
+            if self._sender is None:
+                self._sender = threading.Thread(target=self.run_forever, name="mail-queue", daemon=True)
+                self._sender.start()
+
+    def stop(self):
+        self._stopping.set()
+        self._wakeup.set()
+
+    def run_forever(self):
+        interval = self.app.config["MAIL_QUEUE_POLL_INTERVAL"]
+        while not self._stopping.is_set():
+            try:
+                with self.app.app_context():
+                    worked = self.run_once()
+            except Exception:
+                self.app.logger.exception("Mail sender crashed; retrying")
+                worked = False
+            if not worked:
+                self._wakeup.wait(interval)
+                self._wakeup.clear()
+
+    def run_once(self):
+        """Claim and send one queued delivery. Returns False when the queue is empty."""
+        self._requeue_stale()
+        candidate = db.session.scalar(
+            select(InvoiceDelivery.id).where(InvoiceDelivery.status == "queued").order_by(InvoiceDelivery.id).limit(1)
+        )
+        if candidate is None:
+            return False
+        # only one sender wins the queued -> sending transition
+        claimed = db.session.execute(
+            update(InvoiceDelivery)
+            .where(InvoiceDelivery.id == candidate, InvoiceDelivery.status == "queued")
+            .values(status="sending", claimed_at=datetime.utcnow())
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            self._send_queued(db.session.get(InvoiceDelivery, candidate))
+        return True
+
+    def _requeue_stale(self):
+        # at most once a minute, so idle pollers don't take the SQLite write lock every interval
+        now = time.monotonic()
+        with self._pool_lock:
+            if now - self._last_maintenance < MAINTENANCE_INTERVAL:
+                return
+            self._last_maintenance = now
+        cutoff = datetime.utcnow() - timedelta(seconds=self.app.config["MAIL_QUEUE_STALE_SECONDS"])
+        requeued = db.session.execute(
+            update(InvoiceDelivery)
+            .where(InvoiceDelivery.status == "sending", InvoiceDelivery.claimed_at < cutoff)
+            .values(status="queued", claimed_at=None)
+        ).rowcount
+        db.session.commit()
+        if requeued:
+            self.app.logger.warning("Requeued %d abandoned email deliveries", requeued)
+
+    def _send_queued(self, delivery):
+        invoice = db.session.get(Invoice, delivery.invoice_id, options=[selectinload(Invoice.items)])
+        message, attempts = None, 0
+        if invoice is None:
+            error = "Invoice no longer exists"
+        elif not invoice.client_email:
+            error = "Invoice has no client email"
+        else:
+            try:
+                message = self.message(invoice, _pdfs([invoice], 1, DeliveryResult())[0])
+                attempts, error = self.deliver(message)
+            except Exception as e:
+                db.session.rollback()
+                self.app.logger.exception("Sending delivery %s failed", delivery.id)
+                error = f"{type(e).__name__}: {e}"
+            delivery.recipient = invoice.client_email or ""
+        delivery.status = "failed" if error else "sent"
+        delivery.attempts = attempts
+        delivery.error = error
+        delivery.message_id = message["Message-ID"] if message else None
+        delivery.sent_at = None if error else datetime.utcnow()
+        db.session.commit()
+
+
+def _pdfs(invoices, workers, result):
+    """Each invoice's PDF bytes: cached renders, with the misses rendered on a process pool and cached."""
+    pdfs, misses = {}, []
+    for invoice in invoices:
+        cached = pdf_cache.get(invoice)
+        if cached is not None:
+            pdfs[invoice.id] = cached.data
+        else:
+            misses.append(invoice)
+    if misses:
+        from bulk_export import render_parallel
+        from utils import invoice_snapshot
+
+        rendered = render_parallel((invoice_snapshot(invoice) for invoice in misses), workers)
+        for invoice, (_, data) in zip(misses, rendered):
+            pdfs[invoice.id] = pdf_cache.fetch(invoice, lambda _, data=data: data).data
+        result.rendered += len(misses)
+    return [pdfs[invoice.id] for invoice in invoices]
+
+
+mailer = Mailer()
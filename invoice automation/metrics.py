@@ -0,0 +1,240 @@
+# metrics.py
+"""
+In-process request metrics and slow-request profiling.
+
+Per-route latency, SQL statement count and time per request, commit time
+and PDF render time/size are kept in histograms and served on /metrics
+in the Prometheus text format. Every gunicorn worker keeps its own
+registry, so each scrape sees one process; PDFs rendered in the bulk
+export process pool are not counted.
+
+Profiling is opt-in: with PROFILE_SLOW_MS set, a PROFILE_SAMPLE_RATE
+fraction of requests runs under cProfile, and the stats of those slower
+than the threshold are written to PROFILE_DIR (read them with
+`python -m pstats <file>`).
+"""
+import cProfile
+import os
+import random
+import re
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+PDF_SIZE_BUCKETS = (4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def _label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_label_value(value)}"' for name, value in pairs) + "}"
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.buckets = tuple(float(b) for b in buckets)
+        self._series = {}  # label values -> [per-bucket counts (+Inf last), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)  # first bucket with value <= bound
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((k, [list(v[0]), v[1]]) for k, v in self._series.items())
+        for label_values, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, label_values, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, label_values)} {total!r}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, label_values)} {cumulative}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def expose(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter", f"{self.name} {self.value}"]
+
+
+class Metrics:
+    def __init__(self, app=None):
+        self.request_latency = Histogram(
+            "invoice_http_request_duration_seconds", "Time to handle a request.",
+            ("method", "route", "status"))
+        self.query_count = Histogram(
+            "invoice_db_queries_per_request", "SQL statements issued per request.",
+            ("route",), QUERY_COUNT_BUCKETS)
+        self.query_time = Histogram(
+            "invoice_db_query_seconds_per_request", "Time spent executing SQL per request.", ("route",))
+        self.commit_time = Histogram(
+            "invoice_db_commit_duration_seconds", "Session flush + commit time.", ("route",))
+        self.pdf_render_time = Histogram(
+            "invoice_pdf_render_duration_seconds", "Time to render one invoice PDF.")
+        self.pdf_size = Histogram(
+            "invoice_pdf_render_bytes", "Size of rendered invoice PDFs.", buckets=PDF_SIZE_BUCKETS)
+        self.profiles_written = Counter(
+            "invoice_slow_request_profiles_total", "cProfile dumps written for slow requests.")
+        self.app = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("METRICS_ENABLED", os.environ.get("METRICS_ENABLED", "1") != "0")
+        app.config.setdefault("PROFILE_SLOW_MS", float(os.environ.get("PROFILE_SLOW_MS") or 0))
+        app.config.setdefault("PROFILE_SAMPLE_RATE", float(os.environ.get("PROFILE_SAMPLE_RATE") or 1.0))
+        app.config.setdefault("PROFILE_DIR", os.path.join(app.instance_path, "profiles"))
+        app.config.setdefault("PROFILE_MAX_FILES", 200)
+        self.app = app
+        app.extensions["metrics"] = self
+        if not app.config["METRICS_ENABLED"]:
+            return
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        app.add_url_rule("/metrics", "metrics", self.metrics_view)
+
+        with app.app_context():
+            engine = app.extensions["sqlalchemy"].engine
+            session_class = app.extensions["sqlalchemy"].session.session_factory.class_
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+        event.listen(engine, "handle_error", self._handle_error)
+        event.listen(session_class, "before_commit", self._before_commit)
+        event.listen(session_class, "after_commit", self._after_commit)
+
+    # --- Hot-path hooks ---
+    def pdf_rendered(self, seconds, size):
+        self.pdf_render_time.observe(seconds)
+        self.pdf_size.observe(size)
+
+    # --- Request lifecycle ---
+    def _before_request(self):
+        g._metrics = {"started": time.perf_counter(), "queries": 0, "query_seconds": 0.0, "status": 500}
+        slow_ms = self.app.config["PROFILE_SLOW_MS"]
+        if slow_ms and random.random() < self.app.config["PROFILE_SAMPLE_RATE"]:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:  # another profiler is already active in this process
+                return
+            g._metrics["profiler"] = profiler
+
+    def _after_request(self, response):
+        state = g.get("_metrics")
+        if state is not None:
+            state["status"] = response.status_code
+        return response
+
+    def _teardown_request(self, exc):
+        state = g.pop("_metrics", None)
+        if state is None:
+            return
+        elapsed = time.perf_counter() - state["started"]
+        profiler = state.get("profiler")
+        if profiler is not None:
+            profiler.disable()
+
+        route = request.url_rule.rule if request.url_rule else "<unmatched>"
+        self.request_latency.observe(elapsed, request.method, route, str(state["status"]))
+        self.query_count.observe(state["queries"], route)
+        self.query_time.observe(state["query_seconds"], route)
+
+        if profiler is not None and elapsed * 1000 >= self.app.config["PROFILE_SLOW_MS"]:
+            self._dump_profile(profiler, elapsed)
+
+    def _dump_profile(self, profiler, elapsed):
+        directory = self.app.config["PROFILE_DIR"]
+        endpoint = re.sub(r"[^A-Za-z0-9_.-]", "_", request.endpoint or "unmatched")
+        name = f"{time.strftime('%Y%m%dT%H%M%S')}-{endpoint}-{int(elapsed * 1000)}ms-{os.getpid()}.prof"
+        try:
+            os.makedirs(directory, exist_ok=True)
+            profiler.dump_stats(os.path.join(directory, name))
+            self._prune_profiles(directory)
+        except OSError as e:
+            self.app.logger.warning("Could not write profile for slow request: %s", e)
+            return
+        self.profiles_written.inc()
+        self.app.logger.warning("Slow request %s %s took %.0f ms; profile saved as %s",
+                                request.method, request.path, elapsed * 1000, name)
+
+    def _prune_profiles(self, directory):
+        keep = self.app.config["PROFILE_MAX_FILES"]
+        dumps = sorted((e for e in os.scandir(directory) if e.name.endswith(".prof")),
+                       key=lambda e: e.stat().st_mtime)
+        for entry in dumps[:max(len(dumps) - keep, 0)]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+    # --- SQL and commit timing ---
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if has_request_context() and "_metrics" in g:
+            conn.info.setdefault("metrics_query_started", []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get("metrics_query_started")
+        if started and has_request_context() and "_metrics" in g:
+            g._metrics["queries"] += 1
+            g._metrics["query_seconds"] += time.perf_counter() - started.pop()
+
+    def _handle_error(self, context):
+        started = context.connection.info.get("metrics_query_started") if context.connection else None
+        if started:
+            started.pop()
+
+    def _before_commit(self, session):
+        session.info["metrics_commit_started"] = time.perf_counter()
+
+    def _after_commit(self, session):
+        started = session.info.pop("metrics_commit_started", None)
+        if started is not None and has_request_context():
+            route = request.url_rule.rule if request.url_rule else "<unmatched>"
+            self.commit_time.observe(time.perf_counter() - started, route)
+
+    # --- Exposition ---
+    def render(self):
+        lines = []
+        for metric in (self.request_latency, self.query_count, self.query_time, self.commit_time,
+                       self.pdf_render_time, self.pdf_size, self.profiles_written):
+            lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+    def metrics_view(self):
+        return Response(self.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+metrics = Metrics()
@@ -0,0 +1,200 @@
+# migrations.py
+"""
+Minimal schema migrations.
+
+db.create_all() creates missing tables (with their indexes) but never
+touches tables that already exist, so anything added to an existing table
+is registered here as a numbered step. Applied versions are recorded in
+schema_migrations; every step must also be safe on a freshly created
+schema, where create_all() has already done the work.
+"""
+from datetime import datetime
+
+from sqlalchemy import MetaData, inspect, insert, select, text
+from sqlalchemy.schema import CreateTable
+
+from models import db, MonthlyRevenue, ClientRevenue
+import archive
+import money
+import rollups
+import search
+
+MIGRATIONS = []
+
+
+def migration(version, description):
+    def register(func):
+        MIGRATIONS.append((version, description, func))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return func
+    return register
+
+
+def _columns(conn, table_name):
+    return {column["name"] for column in inspect(conn).get_columns(table_name)}
+
+
+def _create_indexes(conn, table):
+    # indexes over columns that a later migration adds are created by that migration
+    columns = _columns(conn, table.name)
+    for index in table.indexes:
+        if all(column.name in columns for column in index.columns):
+            index.create(conn, checkfirst=True)
+
+
+@migration(1, "keyset pagination indexes on invoices")
+def _pagination_indexes(conn):
+    _create_indexes(conn, db.metadata.tables["invoices"])
+
+
+@migration(2, "indexes for dashboard, reports and item lookups")
+def _hot_path_indexes(conn):
+    _create_indexes(conn, db.metadata.tables["invoices"])
+    _create_indexes(conn, db.metadata.tables["invoice_items"])
+
+
+@migration(3, "backfill revenue rollups")
+def _revenue_rollups(conn):
+    if "amount_cents" in _columns(conn, "invoices"):  # otherwise migration 4 builds them
+        rollups.rebuild(conn)
+
+
+@migration(4, "integer cents for amounts, prices, line totals and rollups")
+def _integer_cents(conn):
+    if "amount" in _columns(conn, "invoices"):
+        for name in ("ix_invoices_status_issue_date_amount", "ix_invoices_status_client_amount",
+                     "ix_invoices_issue_date_status_amount"):
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        conn.execute(text("ALTER TABLE invoices ADD COLUMN amount_cents INTEGER NOT NULL DEFAULT 0"))
+        rows = conn.execute(text("SELECT id, amount FROM invoices")).all()
+        if rows:
+            conn.execute(text("UPDATE invoices SET amount_cents = :cents WHERE id = :id"),
+                         [{"id": id_, "cents": money.to_cents(amount)} for id_, amount in rows])
+        conn.execute(text("ALTER TABLE invoices DROP COLUMN amount"))
+
+    if "price" in _columns(conn, "invoice_items"):
+        conn.execute(text("ALTER TABLE invoice_items ADD COLUMN price_cents INTEGER NOT NULL DEFAULT 0"))
+        conn.execute(text("ALTER TABLE invoice_items ADD COLUMN line_total_cents INTEGER NOT NULL DEFAULT 0"))
+        rows = conn.execute(text("SELECT id, quantity, price, tax FROM invoice_items")).all()
+        if rows:
+            prices = [money.to_cents(price) for _, _, price, _ in rows]
+            totals = money.line_totals([quantity for _, quantity, _, _ in rows], prices,
+                                       [tax for _, _, _, tax in rows])
+            conn.execute(
+                text("UPDATE invoice_items SET price_cents = :price, line_total_cents = :total WHERE id = :id"),
+                [{"id": row[0], "price": price, "total": total} for row, price, total in zip(rows, prices, totals)],
+            )
+        conn.execute(text("ALTER TABLE invoice_items DROP COLUMN price"))
+        # from now on an amount is exactly the sum of its stored line totals
+        conn.execute(text(
+            "UPDATE invoices SET amount_cents = "
+            "(SELECT SUM(line_total_cents) FROM invoice_items WHERE invoice_items.invoice_id = invoices.id) "
+            "WHERE EXISTS (SELECT 1 FROM invoice_items WHERE invoice_items.invoice_id = invoices.id)"
+        ))
+
+    _create_indexes(conn, db.metadata.tables["invoices"])
+    for model in (MonthlyRevenue, ClientRevenue):
+        model.__table__.drop(conn, checkfirst=True)
+        model.__table__.create(conn)
+    rollups.rebuild(conn)
+
+
+@migration(5, "full-text search index")
+def _search_index(conn):
+    search.create_index(conn)
+    search.rebuild(conn)
+
+
+@migration(6, "receivables aging index")
+def _aging_index(conn):
+    _create_indexes(conn, db.metadata.tables["invoices"])
+
+
+@migration(7, "AUTOINCREMENT ids for invoices and items, above the archived ones")
+def _autoincrement_ids(conn):
+    if conn.dialect.name != "sqlite":
+        return  # server databases take ids from sequences, which never go back
+    # pysqlite would autocommit the DDL on its own; one transaction keeps the rebuild all or nothing
+    conn.exec_driver_sql("BEGIN IMMEDIATE")
+    for table in (db.metadata.tables["invoices"], db.metadata.tables["invoice_items"]):
+        sql = conn.scalar(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                          {"name": table.name})
+        if "AUTOINCREMENT" not in sql.upper():
+            _rebuild_table(conn, table)
+        # ids archived before this migration must not be issued again either
+        floor = archive.max_id(table, conn)
+        seq = conn.scalar(text("SELECT seq FROM sqlite_sequence WHERE name = :name"), {"name": table.name})
+        if seq is None:
+            conn.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES (:name, :seq)"),
+                         {"name": table.name, "seq": floor})
+        elif seq < floor:
+            conn.execute(text("UPDATE sqlite_sequence SET seq = :seq WHERE name = :name"),
+                         {"name": table.name, "seq": floor})
+
+
+def _rebuild_table(conn, table):
+    # SQLite can't add AUTOINCREMENT to an existing table: copy the rows
+    # into a new one, swap it in by name and recreate the indexes. The app
+    # leaves PRAGMA foreign_keys off, so dropping the old table cascades
+    # nothing.
+    scratch = MetaData()
+    for key in table.foreign_keys:  # the copy's foreign keys need their tables alongside
+        key.column.table.to_metadata(scratch)
+    rebuilt = table.to_metadata(scratch, name=f"{table.name}_rebuild")
+    conn.execute(text(f"DROP TABLE IF EXISTS {rebuilt.name}"))
+    conn.execute(CreateTable(rebuilt))
+    columns = [column.name for column in table.columns]
+    conn.execute(insert(rebuilt).from_select(columns, select(*(table.c[name] for name in columns))))
+    conn.execute(text(f"DROP TABLE {table.name}"))
+    conn.execute(text(f"ALTER TABLE {rebuilt.name} RENAME TO {table.name}"))
+    _create_indexes(conn, table)
+
+
+@migration(8, "mail queue index on invoice deliveries")
+def _mail_queue_index(conn):
+    _create_indexes(conn, db.metadata.tables["invoice_deliveries"])
+
+
+@migration(9, "claim time on invoice deliveries")
+def _delivery_claimed_at(conn):
+    if "claimed_at" not in _columns(conn, "invoice_deliveries"):
+        conn.execute(text("ALTER TABLE invoice_deliveries ADD COLUMN claimed_at TIMESTAMP"))
+
+
+@migration(10, "PDF jobs point at the PDF cache instead of storing the PDF")
+def _pdf_job_fingerprint(conn):
+    columns = _columns(conn, "pdf_jobs")
+    if "fingerprint" not in columns:
+        conn.execute(text("ALTER TABLE pdf_jobs ADD COLUMN fingerprint VARCHAR(64)"))
+    if "result" in columns:
+        conn.execute(text("ALTER TABLE pdf_jobs DROP COLUMN result"))
+
+
+def applied_versions(conn):
+    return {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+
+def upgrade(engine=None):
+    """Create missing tables, then apply pending migrations. Returns applied versions."""
+    engine = engine or db.engine
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "version INTEGER PRIMARY KEY, description VARCHAR(255), applied_at TIMESTAMP)"
+        ))
+        done = applied_versions(conn)
+
+    applied = []
+    for version, description, func in MIGRATIONS:
+        if version in done:
+            continue
+        with engine.begin() as conn:
+            func(conn)
+            conn.execute(
+                text("INSERT INTO schema_migrations (version, description, applied_at) VALUES (:v, :d, :t)"),
+                {"v": version, "d": description, "t": datetime.utcnow()},
+            )
+        applied.append(version)
+    return applied
+
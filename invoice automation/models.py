@@ -1,12 +1,30 @@
 # models.py
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.ext.hybrid import hybrid_property
 from datetime import datetime
 
+import money
+
 db = SQLAlchemy()
 
 
 class Invoice(db.Model):
     __tablename__ = "invoices"
+    __table_args__ = (
+        # keyset pagination of /invoices, optionally filtered by status or client
+        db.Index("ix_invoices_issue_date_id", "issue_date", "id"),
+        db.Index("ix_invoices_status_issue_date_id", "status", "issue_date", "id"),
+        db.Index("ix_invoices_client_issue_date_id", "client_name", "issue_date", "id"),
+        # covering indexes for the paid/unpaid aggregates on dashboard and reports
+        db.Index("ix_invoices_status_issue_date_amount", "status", "issue_date", "amount_cents"),
+        db.Index("ix_invoices_status_client_amount", "status", "client_name", "amount_cents"),
+        db.Index("ix_invoices_issue_date_status_amount", "issue_date", "status", "amount_cents"),
+        # covering index for the receivables aging report
+        db.Index("ix_invoices_status_due_date_client_amount", "status", "due_date", "client_name", "amount_cents"),
+        # never reissue an id, including those of invoices moved to a year archive
+        {"sqlite_autoincrement": True},
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     client_name = db.Column(db.String(120), nullable=False)
@@ -16,33 +34,272 @@ class Invoice(db.Model):
     issue_date = db.Column(db.Date, default=datetime.utcnow)
     due_date = db.Column(db.Date, nullable=False)
 
-    amount = db.Column(db.Float, default=0.0)
+    amount_cents = db.Column(db.Integer, nullable=False, default=0)  # sum of the items' line totals
     status = db.Column(db.String(20), default="Unpaid")
 
     items = db.relationship("InvoiceItem", backref="invoice", cascade="all, delete-orphan")
 
+    @hybrid_property
+    def amount(self):
+        return money.from_cents(self.amount_cents)
+
+    @amount.setter
+    def amount(self, value):
+        self.amount_cents = money.to_cents(value)
+
+    @amount.expression
+    def amount(cls):
+        return cls.amount_cents / 100.0
+
     def total_amount(self):
-        """Recalculate invoice total from items"""
-        total = 0.0
-        for item in self.items:
-            subtotal = item.quantity * item.price
-            subtotal += subtotal * (item.tax or 0) / 100
-            total += subtotal
-        return total
+        """Invoice total from the items' stored line totals"""
+        return money.from_cents(sum(item.total_cents() for item in self.items))
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "client_name": self.client_name,
+            "client_email": self.client_email,
+            "description": self.description,
+            "issue_date": self.issue_date.isoformat() if self.issue_date else None,
+            "due_date": self.due_date.isoformat() if self.due_date else None,
+            "amount": self.amount,
+            "status": self.status,
+        }
 
 
 class InvoiceItem(db.Model):
     __tablename__ = "invoice_items"
+    __table_args__ = {"sqlite_autoincrement": True}  # archived item ids stay unique, as for invoices
 
     id = db.Column(db.Integer, primary_key=True)
-    invoice_id = db.Column(db.Integer, db.ForeignKey("invoices.id"), nullable=False)
+    invoice_id = db.Column(db.Integer, db.ForeignKey("invoices.id"), nullable=False, index=True)
 
     description = db.Column(db.String(255), nullable=False)
     quantity = db.Column(db.Float, default=1)
-    price = db.Column(db.Float, default=0.0)
+    price_cents = db.Column(db.Integer, nullable=False, default=0)
     tax = db.Column(db.Float, default=0.0)  # in percent (e.g., 15 = 15%)
+    line_total_cents = db.Column(db.Integer, nullable=False, default=0)  # quantity * price + tax, rounded
+
+    @hybrid_property
+    def price(self):
+        return money.from_cents(self.price_cents)
+
+    @price.setter
+    def price(self, value):
+        self.price_cents = money.to_cents(value)
+
+    @price.expression
+    def price(cls):
+        return cls.price_cents / 100.0
+
+    def total_cents(self):
+        if self.line_total_cents is None:
+            return money.line_total(self.quantity, self.price_cents or 0, self.tax)
+        return self.line_total_cents
 
     def subtotal(self):
-        subtotal = self.quantity * self.price
-        subtotal += subtotal * (self.tax or 0) / 100
-        return subtotal
+        return money.from_cents(self.total_cents())
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "description": self.description,
+            "quantity": self.quantity,
+            "price": self.price,
+            "tax": self.tax,
+            "line_total": self.subtotal(),
+        }
+
+
+@event.listens_for(InvoiceItem, "before_insert")
+@event.listens_for(InvoiceItem, "before_update")
+def _store_line_total(mapper, connection, item):
+    # ORM writes keep the stored line total in step; bulk paths compute it with money.line_totals()
+    item.line_total_cents = money.line_total(item.quantity if item.quantity is not None else 1,
+                                             item.price_cents or 0, item.tax)
+
+
+class MonthlyRevenue(db.Model):
+    """
+    Rollup of invoice totals per (year, month, status), maintained by
+    rollups.py. Invoices without an issue date are kept under year/month 0.
+    """
+    __tablename__ = "revenue_monthly"
+
+    year = db.Column(db.Integer, primary_key=True)
+    month = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)
+    total_cents = db.Column(db.Integer, nullable=False, default=0)
+    invoice_count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class ClientRevenue(db.Model):
+    """Rollup of invoice totals per (client, year, status), maintained by rollups.py."""
+    __tablename__ = "revenue_by_client"
+
+    client_name = db.Column(db.String(120), primary_key=True)
+    year = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)
+    total_cents = db.Column(db.Integer, nullable=False, default=0)
+    invoice_count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class InvoiceDelivery(db.Model):
+    """One emailing of an invoice's PDF to its client, sent by mailer.py."""
+    __tablename__ = "invoice_deliveries"
+    __table_args__ = (
+        # latest delivery per invoice, and "never sent" filters
+        db.Index("ix_invoice_deliveries_invoice_status", "invoice_id", "status"),
+        # the mail sender's poll for the oldest queued delivery
+        db.Index("ix_invoice_deliveries_status_id", "status", "id"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    invoice_id = db.Column(db.Integer, db.ForeignKey("invoices.id", ondelete="CASCADE"), nullable=False)
+    recipient = db.Column(db.String(120), nullable=False)
+
+    status = db.Column(db.String(20), default="queued", nullable=False)  # queued, sending, sent, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text, nullable=True)
+    message_id = db.Column(db.String(255), nullable=True)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    claimed_at = db.Column(db.DateTime, nullable=True)  # when a sender took it; stale claims are requeued
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "invoice_id": self.invoice_id,
+            "recipient": self.recipient,
+            "status": self.status,
+            "attempts": self.attempts,
+            "error": self.error,
+            "message_id": self.message_id,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "sent_at": self.sent_at.isoformat() if self.sent_at else None,
+        }
+
+
+class ArchivedYear(db.Model):
+    """
+    Summary of the paid invoices archive.py moved out of the live database
+    for one closed year. The revenue rollups keep those invoices' totals.
+    """
+    __tablename__ = "archived_years"
+
+    year = db.Column(db.Integer, primary_key=True)
+    filename = db.Column(db.String(255), nullable=False)
+    invoice_count = db.Column(db.Integer, nullable=False, default=0)
+    item_count = db.Column(db.Integer, nullable=False, default=0)
+    total_cents = db.Column(db.Integer, nullable=False, default=0)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            "year": self.year,
+            "filename": self.filename,
+            "invoice_count": self.invoice_count,
+            "item_count": self.item_count,
+            "total": money.from_cents(self.total_cents),
+            "archived_at": self.archived_at.isoformat() if self.archived_at else None,
+        }
+
+
+class RecurringInvoice(db.Model):
+    """
+    An invoice issued every `interval_months` months from start_date.
+    recurring.py generates the due periods; next_run is the issue date of
+    the next one and periods_generated how many have been issued so far.
+    """
+    __tablename__ = "recurring_invoices"
+    __table_args__ = (
+        db.Index("ix_recurring_invoices_active_next_run", "active", "next_run"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    client_name = db.Column(db.String(120), nullable=False)
+    client_email = db.Column(db.String(120), nullable=False)
+    description = db.Column(db.Text, nullable=True)
+
+    interval_months = db.Column(db.Integer, nullable=False, default=1)
+    days_due = db.Column(db.Integer, nullable=False, default=14)
+    start_date = db.Column(db.Date, nullable=False)
+    next_run = db.Column(db.Date, nullable=False)
+    periods_generated = db.Column(db.Integer, nullable=False, default=0)
+    active = db.Column(db.Boolean, nullable=False, default=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    items = db.relationship("RecurringItem", cascade="all, delete-orphan", order_by="RecurringItem.id")
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "client_name": self.client_name,
+            "client_email": self.client_email,
+            "description": self.description,
+            "interval_months": self.interval_months,
+            "days_due": self.days_due,
+            "start_date": self.start_date.isoformat(),
+            "next_run": self.next_run.isoformat(),
+            "periods_generated": self.periods_generated,
+            "active": self.active,
+            "items": [
+                {"description": i.description, "quantity": i.quantity, "price": i.price, "tax": i.tax}
+                for i in self.items
+            ],
+        }
+
+
+class RecurringItem(db.Model):
+    __tablename__ = "recurring_items"
+
+    id = db.Column(db.Integer, primary_key=True)
+    recurring_id = db.Column(db.Integer, db.ForeignKey("recurring_invoices.id"), nullable=False, index=True)
+
+    description = db.Column(db.String(255), nullable=False)
+    quantity = db.Column(db.Float, default=1)
+    price_cents = db.Column(db.Integer, nullable=False, default=0)
+    tax = db.Column(db.Float, default=0.0)
+
+    @hybrid_property
+    def price(self):
+        return money.from_cents(self.price_cents)
+
+
+class RecurringRun(db.Model):
+    """One generated period of a RecurringInvoice; the primary key makes generation idempotent."""
+    __tablename__ = "recurring_runs"
+
+    recurring_id = db.Column(db.Integer, db.ForeignKey("recurring_invoices.id"), primary_key=True)
+    period = db.Column(db.Date, primary_key=True)
+    invoice_id = db.Column(db.Integer, nullable=False)
+
+
+class PdfJob(db.Model):
+    """A queued PDF render, claimed and processed by a background worker."""
+    __tablename__ = "pdf_jobs"
+
+    id = db.Column(db.Integer, primary_key=True)
+    invoice_id = db.Column(db.Integer, db.ForeignKey("invoices.id", ondelete="CASCADE"), nullable=False)
+
+    status = db.Column(db.String(20), default="queued", nullable=False)  # queued, running, done, failed
+    progress = db.Column(db.Float, default=0.0)
+    error = db.Column(db.Text, nullable=True)
+    fingerprint = db.Column(db.String(64), nullable=True)  # the render's pdf_cache key; the bytes live there
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "invoice_id": self.invoice_id,
+            "status": self.status,
+            "progress": round(self.progress or 0.0, 3),
+            "error": self.error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
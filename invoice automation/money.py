@@ -0,0 +1,104 @@
+# money.py
+"""
+Money arithmetic in integer minor units (cents).
+
+Prices, line totals, invoice amounts and rollups are stored as integer
+cents. Quantities and tax rates (in percent) stay plain numbers and are
+read through their decimal text, so 0.1 means exactly one tenth. Each
+line is rounded once, half-up, to whole cents:
+
+    net   = quantity * unit price
+    total = net * (1 + tax / 100)
+
+An invoice's amount is the integer sum of its line totals, so stored
+totals never drift and every aggregate is a plain integer SUM.
+"""
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+HUNDRED = Decimal(100)
+ONE = Decimal(1)
+
+
+def _decimal(value):
+    if value is None or value == "":
+        return Decimal(0)
+    if not isinstance(value, Decimal):
+        try:
+            value = Decimal(str(value).strip())  # floats via repr, so 0.1 stays 0.1
+        except InvalidOperation:
+            raise ValueError(f"not a number: {value!r}")
+    if not value.is_finite():
+        raise ValueError(f"not a finite number: {value!r}")
+    return value
+
+
+def _round(value):
+    return int(value.to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def to_cents(amount):
+    """Major units (number or numeric string) -> integer cents, rounded half-up."""
+    return _round(_decimal(amount) * HUNDRED)
+
+
+def from_cents(cents):
+    """Integer cents -> float major units, for templates, charts and JSON."""
+    return (cents or 0) / 100
+
+
+def format_cents(cents, symbol=""):
+    """Exact two-decimal text for integer cents, e.g. format_cents(-1205, "$") -> "-$12.05"."""
+    cents = int(cents or 0)
+    whole, part = divmod(abs(cents), 100)
+    return f"{'-' if cents < 0 else ''}{symbol}{whole}.{part:02d}"
+
+
+def line_net(quantity, price_cents):
+    """Pre-tax amount of one line in cents."""
+    return _round(_decimal(quantity) * price_cents)
+
+
+def line_total(quantity, price_cents, tax):
+    """Amount of one line including tax, in cents."""
+    return _round(_decimal(quantity) * price_cents * (ONE + _decimal(tax) / HUNDRED))
+
+
+def line_totals(quantities, prices_cents, taxes):
+    """
+    line_total() over parallel columns of many items at once. Quantities
+    and tax factors are converted once per distinct value, which is what
+    makes batches of imported or generated items cheap.
+    """
+    quantity_cache, factor_cache = {}, {}
+    totals = []
+    for quantity, price_cents, tax in zip(quantities, prices_cents, taxes):
+        q = quantity_cache.get(quantity)
+        if q is None:
+            q = quantity_cache[quantity] = _decimal(quantity)
+        factor = factor_cache.get(tax)
+        if factor is None:
+            factor = factor_cache[tax] = ONE + _decimal(tax) / HUNDRED
+        totals.append(_round(q * price_cents * factor))
+    return totals
+
+
+def invoice_totals(owners, totals, count):
+    """Sum line totals into `count` invoice amounts; owners[i] is the index of line i's invoice."""
+    amounts = [0] * count
+    for owner, total in zip(owners, totals):
+        amounts[owner] += total
+    return amounts
+
+
+def apply_line_totals(item_lists):
+    """
+    Set "line_total_cents" on every item row of every invoice's list, in
+    one line_totals() pass over the flattened columns, and return each
+    invoice's amount in cents.
+    """
+    flat = [item for items in item_lists for item in items]
+    owners = [n for n, items in enumerate(item_lists) for _ in items]
+    totals = line_totals([i["quantity"] for i in flat], [i["price_cents"] for i in flat], [i["tax"] for i in flat])
+    for item, total in zip(flat, totals):
+        item["line_total_cents"] = total
+    return invoice_totals(owners, totals, len(item_lists))
@@ -0,0 +1,52 @@
+# pagination.py
+import base64
+from datetime import date
+
+from sqlalchemy import and_, or_, tuple_
+
+from models import Invoice
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(invoice):
+    """Opaque token for the (issue_date, id) position just after this invoice."""
+    issued = invoice.issue_date.isoformat() if invoice.issue_date else ""
+    raw = f"{issued}|{invoice.id}".encode("ascii")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token):
+    """Return (issue_date or None, id) for a cursor token."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        issued, _, invoice_id = base64.urlsafe_b64decode(padded).decode("ascii").partition("|")
+        return (date.fromisoformat(issued) if issued else None), int(invoice_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(token) from e
+
+
+def keyset_page(query, cursor=None, limit=50):
+    """
+    Return (invoices, next_cursor) for the page after `cursor`, ordered by
+    (issue_date, id). Each page is an index range scan on
+    ix_invoices_issue_date_id, so latency doesn't grow with the offset.
+    """
+    if cursor:
+        issued, last_id = decode_cursor(cursor)
+        if issued is None:
+            # SQLite sorts NULL dates first; finish those, then everything dated
+            query = query.filter(or_(
+                Invoice.issue_date.isnot(None),
+                and_(Invoice.issue_date.is_(None), Invoice.id > last_id),
+            ))
+        else:
+            query = query.filter(tuple_(Invoice.issue_date, Invoice.id) > (issued, last_id))
+
+    rows = query.order_by(Invoice.issue_date, Invoice.id).limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1])
+    return rows, None
@@ -0,0 +1,275 @@
+# pdf_cache.py
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+# Bump when the PDF layout changes so stale renders are never served.
+CACHE_VERSION = "2"
+
+CachedPDF = namedtuple("CachedPDF", ["key", "data", "created"])
+
+
+def invoice_fingerprint(invoice):
+    """
+    Stable hash of everything that ends up on the rendered PDF:
+    the invoice fields plus its InvoiceItem rows (ordered by id).
+    """
+    h = hashlib.sha256()
+    fields = (
+        CACHE_VERSION,
+        invoice.id,
+        invoice.client_name,
+        invoice.client_email,
+        invoice.description,
+        invoice.issue_date.isoformat() if invoice.issue_date else None,
+        invoice.due_date.isoformat() if invoice.due_date else None,
+        invoice.status,
+        invoice.amount_cents,
+    )
+    h.update(repr(fields).encode("utf-8"))
+    for item in sorted(invoice.items, key=lambda i: i.id or 0):
+        h.update(repr((item.id, item.description, item.quantity, item.price_cents, item.tax,
+                       item.line_total_cents)).encode("utf-8"))
+    return h.hexdigest()
+
+
+class PDFCache:
+    """
+    Content-addressed cache for rendered invoice PDFs.
+
+    Entries are keyed by (invoice id, fingerprint) and kept in two tiers:
+    a small in-memory LRU bounded by PDF_CACHE_MEMORY_BYTES and an optional
+    on-disk LRU directory bounded by PDF_CACHE_MAX_BYTES. Set PDF_CACHE_DIR
+    to None (e.g. on a read-only container filesystem) to keep memory only.
+    Because keys are derived from content, an edited invoice simply misses;
+    invalidate() only frees the space held by older renders.
+
+    The disk tier keeps an in-memory index of its files (size and last use),
+    filled by one directory scan, so reads, writes and invalidate() never
+    list the directory. Only when the index goes over budget is the directory
+    rescanned (picking up other workers' files) and trimmed to 90% of it.
+    """
+
+    def __init__(self, app=None):
+        self.directory = None
+        self.max_bytes = 0
+        self.memory_max_bytes = 0
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._disk = {}  # key -> (size, last use) for files in self.directory
+        self._disk_bytes = 0
+        self._disk_dir = None  # the directory self._disk was scanned from
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("PDF_CACHE_DIR", os.path.join(app.instance_path, "pdf_cache"))
+        app.config.setdefault("PDF_CACHE_MAX_BYTES", 256 * 1024 * 1024)
+        app.config.setdefault("PDF_CACHE_MEMORY_BYTES", 16 * 1024 * 1024)
+
+        self.directory = app.config["PDF_CACHE_DIR"]
+        self.max_bytes = app.config["PDF_CACHE_MAX_BYTES"]
+        self.memory_max_bytes = app.config["PDF_CACHE_MEMORY_BYTES"]
+        if self.directory:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+            except OSError as e:
+                app.logger.warning("PDF disk cache disabled (%s): %s", self.directory, e)
+                self.directory = None
+        if self.directory:
+            with self._lock:
+                self._scan_disk()
+        app.extensions["pdf_cache"] = self
+
+    # --- Lookup ---
+    def fetch(self, invoice, render):
+        """
+        Return a CachedPDF for the invoice, calling render(invoice) -> bytes
+        on a miss in both tiers.
+        """
+        key = (invoice.id, invoice_fingerprint(invoice))
+
+        entry = self._memory_get(key)
+        if entry is not None:
+            return entry
+
+        entry = self._disk_get(key)
+        if entry is None:
+            entry = CachedPDF(key, render(invoice), time.time())
+            self._disk_put(entry)
+        self._memory_put(entry)
+        return entry
+
+    def get(self, invoice):
+        """The cached CachedPDF for the invoice's current content, or None; never renders."""
+        return self.lookup((invoice.id, invoice_fingerprint(invoice)))
+
+    def lookup(self, key):
+        """The CachedPDF stored under (invoice id, fingerprint), or None; never renders."""
+        entry = self._memory_get(key) or self._disk_get(key)
+        if entry is not None:
+            self._memory_put(entry)
+        return entry
+
+    def invalidate(self, invoice_id):
+        """Drop every cached render of the given invoice from both tiers."""
+        with self._lock:
+            for key in [k for k in self._memory if k[0] == invoice_id]:
+                self._memory_bytes -= len(self._memory.pop(key).data)
+
+            if not self.directory:
+                return
+            self._disk_index()
+            keys = [k for k in self._disk if k[0] == invoice_id]
+            for key in keys:
+                self._disk_bytes -= self._disk.pop(key)[0]
+        self._remove(keys)
+
+    def clear(self):
+        """Drop every cached render from both tiers."""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            if not self.directory:
+                return
+            self._scan_disk()
+            keys = list(self._disk)
+            self._disk.clear()
+            self._disk_bytes = 0
+        self._remove(keys)
+
+    # --- Internals ---
+    def _path(self, key):
+        invoice_id, fingerprint = key
+        return os.path.join(self.directory, f"{invoice_id}-{fingerprint}.pdf")
+
+    def _parse_name(self, name):
+        """(invoice id, fingerprint) for a cache file name, or None for anything else."""
+        if not name.endswith(".pdf"):
+            return None
+        invoice_id, _, fingerprint = name[:-4].partition("-")
+        if not invoice_id.isdigit() or not fingerprint:
+            return None
+        return int(invoice_id), fingerprint
+
+    def _scan_disk(self):
+        """Rebuild the disk index from the directory; call with the lock held."""
+        self._disk = {}
+        self._disk_bytes = 0
+        self._disk_dir = self.directory
+        for entry in os.scandir(self.directory):
+            key = self._parse_name(entry.name)
+            if key is None:
+                continue
+            try:
+                st = entry.stat()
+            except FileNotFoundError:
+                continue
+            self._disk[key] = (st.st_size, st.st_mtime)
+            self._disk_bytes += st.st_size
+
+    def _disk_index(self):
+        """Scan once per directory (it may be swapped after init_app); call with the lock held."""
+        if self._disk_dir != self.directory:
+            self._scan_disk()
+
+    def _remove(self, keys):
+        for key in keys:
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def _disk_get(self, key):
+        if not self.directory:
+            return None
+        path = self._path(key)
+        try:
+            os.utime(path)  # mark as recently used for the disk LRU
+            with open(path, "rb") as fh:
+                data = fh.read()
+        except OSError:
+            # missing, or evicted by another worker meanwhile
+            with self._lock:
+                self._disk_index()
+                if key in self._disk:
+                    self._disk_bytes -= self._disk.pop(key)[0]
+            return None
+
+        now = time.time()
+        with self._lock:
+            self._disk_index()
+            old = self._disk.get(key)
+            # a file written by another worker joins the index on first read
+            self._disk_bytes += len(data) - (old[0] if old else 0)
+            self._disk[key] = (len(data), now)
+        return CachedPDF(key, data, now)
+
+    def _disk_put(self, entry):
+        if not self.directory:
+            return
+        # Write to a private temp file and rename it into place, so
+        # concurrent workers never read a half-written PDF.
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(entry.data)
+            os.replace(tmp_path, self._path(entry.key))
+        except OSError:
+            # e.g. disk full or read-only; the memory tier still holds the render
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+
+        with self._lock:
+            self._disk_index()
+            old = self._disk.get(entry.key)
+            self._disk_bytes += len(entry.data) - (old[0] if old else 0)
+            self._disk[entry.key] = (len(entry.data), time.time())
+            if self._disk_bytes <= self.max_bytes:
+                return
+            victims = self._evict_disk()
+        self._remove(victims)
+
+    def _memory_get(self, key):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+            return entry
+
+    def _memory_put(self, entry):
+        if len(entry.data) > self.memory_max_bytes:
+            return
+        with self._lock:
+            old = self._memory.pop(entry.key, None)
+            if old is not None:
+                self._memory_bytes -= len(old.data)
+            self._memory[entry.key] = entry
+            self._memory_bytes += len(entry.data)
+            while self._memory_bytes > self.memory_max_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted.data)
+
+    def _evict_disk(self):
+        """
+        Drop least recently used entries from the index until it is under 90%
+        of the budget and return their keys for deletion; call with the lock held.
+        """
+        self._scan_disk()  # other workers share the directory
+        target = self.max_bytes * 0.9
+        victims = []
+        for key, (size, _) in sorted(self._disk.items(), key=lambda kv: kv[1][1]):
+            if self._disk_bytes <= target:
+                break
+            del self._disk[key]
+            self._disk_bytes -= size
+            victims.append(key)
+        return victims
+
+pdf_cache = PDFCache()
@@ -0,0 +1,85 @@
+# query_budget.py
+"""
+Query budgets for the routes.
+
+Each route is requested through the Flask test client while every
+statement sent to the database is counted. A route that issues more than
+its budget fails the check. This is how an N+1 shows up: one lazy
+relationship load per row turns a constant count into one that grows
+with the data. assert_max_queries() applies the same check to any block
+of code.
+
+The result and PDF caches are cleared before each route, so a route is
+always measured cold and not helped by the routes before it.
+tests/test_query_budgets.py runs every route against a freshly seeded
+database.
+"""
+from contextlib import contextmanager
+
+from sqlalchemy import text
+
+from models import db
+from pdf_cache import pdf_cache
+from query_plans import capture_statements
+from result_cache import result_cache
+
+# "{id}" is replaced with an existing invoice id
+ROUTE_BUDGETS = {
+    "/dashboard": 3,
+    "/invoices": 1,
+    "/invoices?status=Paid": 1,
+    "/api/invoices": 1,
+    "/api/invoices?fields=id,amount,items": 2,  # the page, then its items
+    "/api/invoices/{id}": 2,
+    "/api/search?q=alpha": 1,
+    "/reports": 4,
+    "/reports/aging": 1,
+    "/api/aging": 1,
+    "/api/monthly-revenue-status": 1,
+    "/invoice/{id}": 2,  # the invoice with its items, then its latest email delivery
+    "/invoice/{id}/pdf": 1,
+    "/invoice/{id}/edit": 1,
+}
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@contextmanager
+def assert_max_queries(budget, engine=None):
+    """Raise QueryBudgetExceeded if the block sends more than `budget` statements."""
+    with capture_statements(engine or db.engine, selects_only=False) as statements:
+        yield statements
+    if len(statements) > budget:
+        listing = "\n".join("  " + " ".join(statement.split()) for statement, _ in statements)
+        raise QueryBudgetExceeded(f"{len(statements)} queries, budget {budget}:\n{listing}")
+
+
+def route_path(route):
+    """The route with "{id}" replaced by the lowest live invoice id."""
+    first = db.session.execute(text("SELECT MIN(id) FROM invoices")).scalar() or 1
+    return route.format(id=first)
+
+
+def default_budgets():
+    """ROUTE_BUDGETS with the invoice placeholders filled in."""
+    return {route_path(path): budget for path, budget in ROUTE_BUDGETS.items()}
+
+
+def check_budgets(app, budgets):
+    """
+    Request each path and count its queries.
+    Returns a list of (path, status_code, statements, budget) tuples.
+    """
+    client = app.test_client()
+    report = []
+    for path, budget in budgets.items():
+        result_cache.clear()
+        pdf_cache.clear()
+        with app.app_context():
+            with capture_statements(db.engine, selects_only=False) as statements:
+                response = client.get(path)
+                response.get_data()  # drain streamed bodies inside the capture
+        report.append((path, response.status_code, statements, budget))
+    return report
@@ -0,0 +1,89 @@
+# query_plans.py
+"""
+EXPLAIN QUERY PLAN check for the SQL each route actually runs.
+
+Routes are requested through the Flask test client while every statement
+is captured from the engine; each captured SELECT is then explained and
+flagged if SQLite plans a full table scan (a bare "SCAN <table>" without
+an index). A LIMITed scan in rowid or index order stops early and is not
+flagged. One that sorts into a temp B-tree first still reads every row,
+so it is flagged. Scans of the rollup tables are never flagged, because
+those tables are small by design.
+"""
+import re
+from contextlib import contextmanager
+
+from sqlalchemy import event, text
+
+from models import db
+
+FULL_SCAN = re.compile(r"^SCAN (\w+)$")
+SMALL_TABLES = {"revenue_monthly", "revenue_by_client"}
+
+
+@contextmanager
+def capture_statements(engine, selects_only=True):
+    """Collect (statement, parameters) for everything sent to the database inside the block."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if not selects_only or statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def explain(statement, parameters):
+    """Return the plan detail lines for one statement."""
+    rows = db.session.connection().exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+    return [row[-1] for row in rows]
+
+
+def full_scans(statement, plan):
+    sorted_first = any(line.startswith("USE TEMP B-TREE") for line in plan)
+    if re.search(r"\bLIMIT\b", statement, re.IGNORECASE) and not sorted_first:
+        return []
+    scans = []
+    for line in plan:
+        match = FULL_SCAN.match(line)
+        if match and match.group(1) not in SMALL_TABLES:
+            scans.append(line)
+    return scans
+
+
+def check_routes(app, paths):
+    """
+    Request each path and explain its queries.
+    Returns a list of (path, statement, plan, scans) tuples.
+    """
+    client = app.test_client()
+    report = []
+    for path in paths:
+        with app.app_context():
+            with capture_statements(db.engine) as statements:
+                client.get(path)
+        with app.app_context():
+            for statement, parameters in statements:
+                plan = explain(statement, parameters)
+                report.append((path, statement, plan, full_scans(statement, plan)))
+    return report
+
+
+def default_paths():
+    """The hot read routes, parameterised with an existing invoice id."""
+    first = db.session.execute(text("SELECT MIN(id) FROM invoices")).scalar() or 1
+    return [
+        "/dashboard",
+        "/invoices",
+        "/invoices?status=Paid",
+        "/reports",
+        "/api/monthly-revenue-status",
+        "/api/invoices?client=Alpha%20Corp",
+        "/api/search?q=alpha",
+        "/api/aging",
+        f"/invoice/{first}",
+    ]
@@ -0,0 +1,191 @@
+# recurring.py
+"""
+Recurring invoices: templates (RecurringInvoice + RecurringItem) that
+are issued again every interval_months months.
+
+generate_due() issues every period whose date has arrived. Templates are
+processed in batches, one transaction each. A batch takes one bulk
+INSERT for the invoices, one for the items and one for the
+recurring_runs rows, then a bulk UPDATE that advances next_run. The
+rollups and the search index are updated in the same transaction.
+Re-running is a no-op, because next_run has moved past the date. If two
+runners race, the (recurring_id, period) primary key of recurring_runs
+rejects the second batch.
+"""
+import calendar
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
+
+from models import db, Invoice, InvoiceItem, RecurringInvoice, RecurringItem, RecurringRun
+from importer import insert_invoices
+from pdf_cache import pdf_cache
+import money
+import rollups
+import search
+
+
+def add_months(day, months):
+    """Same day of the month `months` later, clamped to the month's last day."""
+    month0 = day.month - 1 + months
+    year, month = day.year + month0 // 12, month0 % 12 + 1
+    return date(year, month, min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def period_date(template, n):
+    """Issue date of the template's n-th period (0 = start_date); anchored so the 31st never drifts."""
+    return add_months(template.start_date, template.interval_months * n)
+
+
+def from_invoice(invoice, interval_months=1, days_due=None):
+    """A template repeating this invoice, first issued one interval after it."""
+    issued = invoice.issue_date or date.today()
+    if days_due is None:
+        days_due = (invoice.due_date - issued).days if invoice.due_date else 14
+    start = add_months(issued, interval_months)
+    return RecurringInvoice(
+        client_name=invoice.client_name,
+        client_email=invoice.client_email,
+        description=invoice.description,
+        interval_months=interval_months,
+        days_due=max(0, days_due),
+        start_date=start,
+        next_run=start,
+        periods_generated=0,
+        active=True,
+        items=[
+            RecurringItem(description=i.description, quantity=i.quantity, price_cents=i.price_cents, tax=i.tax)
+            for i in invoice.items
+        ],
+    )
+
+
+class RecurringResult:
+    def __init__(self):
+        self.templates = 0
+        self.invoices = 0
+        self.items = 0
+        self.rendered = 0
+        self.conflicts = 0
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    @property
+    def rate(self):
+        return self.invoices / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        return {
+            "templates": self.templates,
+            "invoices": self.invoices,
+            "items": self.items,
+            "rendered": self.rendered,
+            "conflicts": self.conflicts,
+            "seconds": round(self.elapsed, 3),
+            "invoices_per_sec": round(self.rate, 1),
+        }
+
+
+def generate_due(as_of=None, batch_size=500, render_pdfs=False, workers=None):
+    """
+    Issue every period due on or before `as_of` (default today), including
+    periods missed while the scheduler wasn't running. With render_pdfs
+    the new invoices' PDFs are rendered on a process pool (`workers`
+    processes) into the PDF cache after each batch commits.
+    Returns a RecurringResult.
+    """
+    as_of = as_of or date.today()
+    result = RecurringResult()
+    last_id = 0
+    while True:
+        templates = (
+            RecurringInvoice.query.options(selectinload(RecurringInvoice.items))
+            .filter(RecurringInvoice.active.is_(True), RecurringInvoice.next_run <= as_of,
+                    RecurringInvoice.id > last_id)
+            .order_by(RecurringInvoice.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not templates:
+            break
+        last_id = templates[-1].id
+        invoice_ids = _generate_batch(templates, as_of, result)
+        if render_pdfs and invoice_ids:
+            _prerender(invoice_ids, workers, result)
+        db.session.expunge_all()
+    result.elapsed = time.perf_counter() - result.started
+    return result
+
+
+def _generate_batch(templates, as_of, result):
+    """Insert one batch of templates' due periods in a single transaction; returns the new invoice ids."""
+    invoice_rows, item_lists, periods, advances = [], [], [], []
+    for template in templates:
+        n, issued = template.periods_generated, template.next_run
+        while issued <= as_of:
+            invoice_rows.append({
+                "client_name": template.client_name,
+                "client_email": template.client_email,
+                "description": template.description,
+                "issue_date": issued,
+                "due_date": issued + timedelta(days=template.days_due),
+                "status": "Unpaid",
+            })
+            item_lists.append([
+                {"description": i.description, "quantity": i.quantity, "price_cents": i.price_cents, "tax": i.tax}
+                for i in template.items
+            ])
+            periods.append((template.id, issued))
+            n += 1
+            issued = period_date(template, n)
+        advances.append({"id": template.id, "periods_generated": n, "next_run": issued})
+
+    for row, amount in zip(invoice_rows, money.apply_line_totals(item_lists)):
+        row["amount_cents"] = amount
+
+    try:
+        ids = insert_invoices(invoice_rows)
+        item_rows = [dict(item, invoice_id=invoice_id) for invoice_id, items in zip(ids, item_lists) for item in items]
+        if item_rows:
+            db.session.execute(insert(InvoiceItem), item_rows)
+        db.session.execute(insert(RecurringRun), [
+            {"recurring_id": recurring_id, "period": period, "invoice_id": invoice_id}
+            for (recurring_id, period), invoice_id in zip(periods, ids)
+        ])
+        db.session.execute(update(RecurringInvoice), advances)  # bulk UPDATE by primary key
+        rollups.record_many(
+            rollups.contribution(row["issue_date"], row["status"], row["client_name"], row["amount_cents"])
+            for row in invoice_rows
+        )
+        search.index(search.document(invoice_id, row, items)
+                     for invoice_id, row, items in zip(ids, invoice_rows, item_lists))
+        db.session.commit()
+    except IntegrityError:
+        # another runner issued some of these periods first; it owns this batch
+        db.session.rollback()
+        result.conflicts += len(templates)
+        return []
+    result.templates += len(templates)
+    result.invoices += len(ids)
+    result.items += len(item_rows)
+    return ids
+
+
+def _prerender(invoice_ids, workers, result):
+    """Render the invoices' PDFs on a process pool and store them in the PDF cache."""
+    from bulk_export import render_parallel
+    from utils import invoice_snapshot
+
+    invoices = (
+        Invoice.query.options(selectinload(Invoice.items))
+        .filter(Invoice.id.in_(invoice_ids))
+        .order_by(Invoice.id)
+        .all()
+    )
+    rendered = render_parallel((invoice_snapshot(invoice) for invoice in invoices), workers)
+    for invoice, (_, data) in zip(invoices, rendered):
+        pdf_cache.fetch(invoice, lambda _, data=data: data)
+        result.rendered += 1
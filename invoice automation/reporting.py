@@ -0,0 +1,179 @@
+# reporting.py
+"""
+Numbers behind /reports, computed in SQL so only the aggregated rows are
+ever loaded: rollup reads for a whole year (or all time), grouped queries
+over the covering (status, issue_date, amount_cents) index for a date
+range (plus any year archives it overlaps), and the receivables aging as
+due_date ranges of the covering (status, due_date, client_name,
+amount_cents) index.
+"""
+import calendar
+from datetime import date, timedelta
+
+from sqlalchemy import extract, func, literal, select, union_all
+
+from models import db, Invoice
+from money import from_cents
+import archive
+import rollups
+
+TOP_CLIENTS = 8
+# (name, first day overdue, last day overdue); "current" is not yet due
+AGING_BUCKETS = [("current", None, -1), ("0-30", 0, 30), ("31-60", 31, 60), ("61-90", 61, 90), ("90+", 91, None)]
+
+
+def year_report(year=None):
+    """Jan..Dec revenue, status counts and top clients for one year or all years."""
+    totals = rollups.status_totals(year=year)
+    return {
+        "labels": [calendar.month_abbr[m] for m in range(1, 13)],
+        "monthly_revenue": rollups.monthly_totals(status="Paid", year=year),
+        "paid_count": totals.get("Paid", (0, 0.0))[0],
+        "unpaid_count": totals.get("Unpaid", (0, 0.0))[0],
+        "top_clients": rollups.top_clients(status="Paid", limit=TOP_CLIENTS, year=year),
+    }
+
+
+def range_report(start=None, end=None):
+    """
+    Month-by-month revenue, status counts and top clients for issue dates
+    in [start, end], including the archives of years in that range.
+    """
+    end = end or date.today()
+    start = start or date(end.year, 1, 1)
+    sources = archive.invoice_tables(start.year, end.year)
+
+    def in_range(invoices):
+        return invoices.c.issue_date >= start, invoices.c.issue_date <= end
+
+    # --- monthly paid revenue ---
+    def monthly(invoices):
+        year = extract("year", invoices.c.issue_date)
+        month = extract("month", invoices.c.issue_date)
+        return (select(year, month, func.sum(invoices.c.amount_cents))
+                .where(invoices.c.status == "Paid", *in_range(invoices))
+                .group_by(year, month))
+
+    by_month = {(int(y), int(m)): from_cents(total) for y, m, total in _across(sources, monthly)}
+
+    labels, monthly_revenue = [], []
+    y, m = start.year, start.month
+    while (y, m) <= (end.year, end.month):
+        labels.append(f"{calendar.month_abbr[m]} {y}")
+        monthly_revenue.append(by_month.get((y, m), 0.0))
+        y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+
+    # --- counts by status ---
+    def by_status(invoices):
+        return select(invoices.c.status, func.count()).where(*in_range(invoices)).group_by(invoices.c.status)
+
+    counts = dict(_across(sources, by_status))
+
+    # --- top clients ---
+    def by_client(invoices):
+        return (select(invoices.c.client_name, func.sum(invoices.c.amount_cents))
+                .where(invoices.c.status == "Paid", *in_range(invoices))
+                .group_by(invoices.c.client_name))
+
+    top = _across(sources, by_client, limit=TOP_CLIENTS)
+
+    return {
+        "labels": labels,
+        "monthly_revenue": monthly_revenue,
+        "paid_count": counts.get("Paid", 0),
+        "unpaid_count": counts.get("Unpaid", 0),
+        "top_clients": [(name or "Unknown", from_cents(total)) for name, total in top],
+    }
+
+
+def _across(sources, grouped, limit=None):
+    """
+    Rows of grouped(invoices), a SELECT of group keys and one SUM or COUNT,
+    over every table in `sources` with the values of equal keys added up.
+    Each table is grouped on its own indexes before the UNION ALL. With
+    `limit`, only the rows with the largest values.
+    """
+    if len(sources) == 1:
+        stmt = grouped(sources[0])
+    else:
+        combined = union_all(*(grouped(invoices) for invoices in sources)).subquery()
+        *keys, value = combined.c
+        stmt = select(*keys, func.sum(value)).group_by(*keys)
+    if limit:
+        stmt = stmt.order_by(list(stmt.selected_columns)[-1].desc()).limit(limit)
+    return db.session.execute(stmt).all()
+
+
+def _aging_selects(as_of, *columns):
+    """
+    One SELECT per aging bucket over the unpaid invoices whose due_date is
+    in the bucket's range, so each reads one range of the covering
+    (status, due_date, client_name, amount_cents) index.
+    """
+    selects = []
+    for name, first, last in AGING_BUCKETS:
+        # n days overdue means due_date == as_of - n. The open-ended buckets
+        # get date.min / date.max bounds: SQLite plans a one-sided range
+        # over the (status, client_name) index instead, with a table lookup
+        # per row.
+        earliest = as_of - timedelta(days=last) if last is not None else date.min
+        latest = as_of - timedelta(days=first) if first is not None else date.max
+        selects.append(
+            select(literal(name).label("bucket"), *columns,
+                   func.count().label("count"), func.sum(Invoice.amount_cents).label("cents"))
+            .where(Invoice.status == "Unpaid", Invoice.due_date.between(earliest, latest))
+        )
+    return selects
+
+
+def aging_totals(as_of=None):
+    """{bucket: {count, amount}} of unpaid invoices by days past due on `as_of` (default today)."""
+    as_of = as_of or date.today()
+    rows = {bucket: (count, cents) for bucket, count, cents in db.session.execute(union_all(*_aging_selects(as_of)))}
+    return {name: {"count": rows[name][0], "amount": from_cents(rows[name][1] or 0)} for name, _, _ in AGING_BUCKETS}
+
+
+def aging_report(as_of=None):
+    """
+    Unpaid invoices per client in the AGING_BUCKETS by days past due on
+    `as_of` (default today), from one UNION ALL of per-bucket grouped
+    queries; no Invoice objects are loaded.
+    Returns {"as_of", "buckets", "totals": {bucket: {count, amount}},
+             "clients": [{client_name, count, total, overdue, buckets}]} with clients
+    ordered by overdue amount, largest first.
+    """
+    as_of = as_of or date.today()
+    selects = [stmt.group_by(Invoice.client_name) for stmt in _aging_selects(as_of, Invoice.client_name)]
+    rows = db.session.execute(union_all(*selects)).all()
+
+    names = [name for name, _, _ in AGING_BUCKETS]
+    totals = {name: [0, 0] for name in names}
+    by_client = {}
+    for bucket, client_name, count, cents in rows:
+        by_client.setdefault(client_name, {name: [0, 0] for name in names})[bucket] = [count, cents]
+        totals[bucket][0] += count
+        totals[bucket][1] += cents
+
+    clients = []
+    for client_name, buckets in by_client.items():
+        overdue = sum(cents for name, (_, cents) in buckets.items() if name != "current")
+        clients.append((overdue, {
+            "client_name": client_name,
+            "count": sum(count for count, _ in buckets.values()),
+            "total": from_cents(sum(cents for _, cents in buckets.values())),
+            "overdue": from_cents(overdue),
+            "buckets": {name: {"count": count, "amount": from_cents(cents)} for name, (count, cents) in buckets.items()},
+        }))
+    clients.sort(key=lambda entry: (-entry[0], entry[1]["client_name"]))
+
+    return {
+        "as_of": as_of.isoformat(),
+        "buckets": names,
+        "totals": {name: {"count": count, "amount": from_cents(cents)} for name, (count, cents) in totals.items()},
+        "clients": [client for _, client in clients],
+    }
+
+
+def available_years():
+    """Years that have any invoices, newest first (read from the rollups)."""
+    return rollups.years()
@@ -0,0 +1,63 @@
+# result_cache.py
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+CachedResult = namedtuple("CachedResult", ["value", "created"])
+
+
+class ResultCache:
+    """
+    In-process LRU of computed page data (dashboard counters, revenue
+    series) whose entries also expire after RESULT_CACHE_TTL seconds.
+
+    Write routes call clear() after committing, so this worker never serves
+    stale numbers; the TTL bounds how long another gunicorn worker, or a
+    CLI import in a separate process, can leave a worker's copy behind.
+    Set RESULT_CACHE_TTL to 0 to disable caching.
+    """
+
+    def __init__(self, app=None):
+        self.ttl = 0
+        self.max_entries = 0
+        self._entries = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("RESULT_CACHE_TTL", 30)
+        app.config.setdefault("RESULT_CACHE_MAX_ENTRIES", 256)
+        self.ttl = app.config["RESULT_CACHE_TTL"]
+        self.max_entries = app.config["RESULT_CACHE_MAX_ENTRIES"]
+        app.extensions["result_cache"] = self
+
+    def fetch(self, key, compute):
+        """Return a CachedResult for key, calling compute() -> value when missing or expired."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry.created < self.ttl:
+                self._entries.move_to_end(key)
+                return entry
+            generation = self._generation
+
+        entry = CachedResult(compute(), now)
+        with self._lock:
+            # a clear() while computing means the value may predate a write
+            if self.ttl > 0 and generation == self._generation:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        """Drop everything; call after committing a write that changes invoices."""
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+
+
+result_cache = ResultCache()
@@ -0,0 +1,238 @@
+# rollups.py
+"""
+Incrementally maintained revenue rollups (MonthlyRevenue, ClientRevenue).
+
+Write paths take a snapshot() of an invoice before and after changing it
+and call record(before, after) in the same transaction, so the rollups
+commit or roll back together with the invoice. rebuild() recomputes both
+tables from scratch, from the live invoices plus the attached year
+archives (archive.py). Archiving leaves the rollups as they are.
+
+Totals are integer cents; the read helpers return major units.
+"""
+from collections import namedtuple
+
+from sqlalchemy import delete, extract, func, insert, literal, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import db, MonthlyRevenue, ClientRevenue
+from money import from_cents
+import archive
+
+Contribution = namedtuple("Contribution", ["year", "month", "status", "client_name", "amount_cents"])
+
+
+def snapshot(invoice):
+    """What this invoice currently contributes to the rollups (None if nothing)."""
+    if invoice is None:
+        return None
+    return contribution(invoice.issue_date, invoice.status, invoice.client_name, invoice.amount_cents)
+
+
+def contribution(issue_date, status, client_name, amount_cents):
+    """Same as snapshot(), from plain column values (e.g. rows being bulk inserted)."""
+    return Contribution(
+        year=issue_date.year if issue_date else 0,
+        month=issue_date.month if issue_date else 0,
+        status=status or "Unpaid",
+        client_name=client_name or "Unknown",
+        amount_cents=int(amount_cents or 0),
+    )
+
+
+def record(before, after, session=None):
+    """Move an invoice's contribution from `before` to `after` (either may be None)."""
+    if before == after:
+        return
+    session = session or db.session
+    for contrib, sign in ((before, -1), (after, 1)):
+        if contrib is None:
+            continue
+        _bump(session, MonthlyRevenue,
+              {"year": contrib.year, "month": contrib.month, "status": contrib.status},
+              sign * contrib.amount_cents, sign)
+        _bump(session, ClientRevenue,
+              {"client_name": contrib.client_name, "year": contrib.year, "status": contrib.status},
+              sign * contrib.amount_cents, sign)
+
+
+def record_many(contributions, session=None):
+    """
+    Add many new invoices' contributions at once, aggregating them per
+    rollup row first so a batch costs one executemany upsert per table.
+    """
+    _record_signed(((c, 1) for c in contributions), session)
+
+
+def record_changes(changes, session=None):
+    """record() for many (before, after) pairs, aggregated like record_many()."""
+    _record_signed(((contrib, sign) for before, after in changes if before != after
+                    for contrib, sign in ((before, -1), (after, 1)) if contrib is not None), session)
+
+
+def _record_signed(signed, session):
+    session = session or db.session
+    monthly, by_client = {}, {}
+    for c, sign in signed:
+        for bucket, key in ((monthly, (c.year, c.month, c.status)),
+                            (by_client, (c.client_name, c.year, c.status))):
+            total, count = bucket.get(key, (0, 0))
+            bucket[key] = (total + sign * c.amount_cents, count + sign)
+
+    _bump_many(session, MonthlyRevenue, [
+        {"year": year, "month": month, "status": status, "total_cents": total, "invoice_count": count}
+        for (year, month, status), (total, count) in monthly.items() if total or count
+    ])
+    _bump_many(session, ClientRevenue, [
+        {"client_name": client_name, "year": year, "status": status, "total_cents": total, "invoice_count": count}
+        for (client_name, year, status), (total, count) in by_client.items() if total or count
+    ])
+
+
+def _bump(session, model, key, cents, count):
+    table = model.__table__
+    dialect = session.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        dialect_insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+        stmt = dialect_insert(table).values(total_cents=cents, invoice_count=count, **key)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(key),
+            set_={
+                "total_cents": table.c.total_cents + cents,
+                "invoice_count": table.c.invoice_count + count,
+            },
+        )
+        session.execute(stmt)
+        return
+
+    # portable fallback: update, insert when the row doesn't exist yet
+    result = session.execute(
+        update(table)
+        .where(*(table.c[k] == v for k, v in key.items()))
+        .values(total_cents=table.c.total_cents + cents, invoice_count=table.c.invoice_count + count)
+    )
+    if result.rowcount == 0:
+        session.execute(insert(table).values(total_cents=cents, invoice_count=count, **key))
+
+
+def _bump_many(session, model, rows):
+    """_bump() for many rows (primary key columns plus total_cents and invoice_count)."""
+    if not rows:
+        return
+    table = model.__table__
+    dialect = session.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        stmt = (sqlite.insert if dialect == "sqlite" else postgresql.insert)(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[column.name for column in table.primary_key],
+            set_={
+                "total_cents": table.c.total_cents + stmt.excluded.total_cents,
+                "invoice_count": table.c.invoice_count + stmt.excluded.invoice_count,
+            },
+        )
+        session.execute(stmt, rows)
+        return
+
+    for row in rows:
+        key = {column.name: row[column.name] for column in table.primary_key}
+        _bump(session, model, key, row["total_cents"], row["invoice_count"])
+
+
+def rebuild(connection=None):
+    """Recompute both rollup tables from the live and archived invoices."""
+    conn = connection or db.session
+    invoices = archive.invoices(conn=conn)
+    year = func.coalesce(extract("year", invoices.c.issue_date), literal(0))
+    month = func.coalesce(extract("month", invoices.c.issue_date), literal(0))
+    # the same fallbacks as contribution(), so both paths write the same rows
+    status = func.coalesce(func.nullif(invoices.c.status, ""), literal("Unpaid"))
+    client_name = func.coalesce(func.nullif(invoices.c.client_name, ""), literal("Unknown"))
+    total = func.coalesce(func.sum(invoices.c.amount_cents), 0)
+
+    conn.execute(delete(MonthlyRevenue.__table__))
+    conn.execute(delete(ClientRevenue.__table__))
+    conn.execute(
+        insert(MonthlyRevenue.__table__).from_select(
+            ["year", "month", "status", "total_cents", "invoice_count"],
+            select(year, month, status, total, func.count()).group_by(year, month, status),
+        )
+    )
+    conn.execute(
+        insert(ClientRevenue.__table__).from_select(
+            ["client_name", "year", "status", "total_cents", "invoice_count"],
+            select(client_name, year, status, total, func.count())
+            .group_by(client_name, year, status),
+        )
+    )
+
+
+# --- Reads ---
+def status_totals(year=None):
+    """{status: (invoice_count, total)} over all invoices, or one year's."""
+    query = db.session.query(MonthlyRevenue.status,
+                             func.sum(MonthlyRevenue.invoice_count),
+                             func.sum(MonthlyRevenue.total_cents))
+    if year:
+        query = query.filter(MonthlyRevenue.year == year)
+    rows = query.group_by(MonthlyRevenue.status).all()
+    return {status: (int(count or 0), from_cents(total)) for status, count, total in rows}
+
+
+def overview(year):
+    """
+    Everything the dashboard shows, from one pass over the monthly rollup:
+    status_totals {status: (invoice_count, total)} over all years,
+    paid_monthly [12 floats] summed over all years, and
+    year_monthly {status: [12 floats]} for `year`.
+    """
+    rows = db.session.query(MonthlyRevenue.year, MonthlyRevenue.month, MonthlyRevenue.status,
+                            MonthlyRevenue.invoice_count, MonthlyRevenue.total_cents).all()
+    counts, totals, paid, by_status = {}, {}, [0] * 12, {}
+    for row_year, month, status, count, cents in rows:
+        counts[status] = counts.get(status, 0) + count
+        totals[status] = totals.get(status, 0) + cents
+        if month > 0:
+            if status == "Paid":
+                paid[month - 1] += cents
+            if row_year == year:
+                by_status.setdefault(status, [0] * 12)[month - 1] += cents
+    return {
+        "status_totals": {status: (counts[status], from_cents(totals[status])) for status in counts},
+        "paid_monthly": [from_cents(cents) for cents in paid],
+        "year_monthly": {status: [from_cents(c) for c in values] for status, values in by_status.items()},
+    }
+
+
+def monthly_totals(status=None, year=None):
+    """[12 floats] Jan..Dec, optionally for one status and/or year (else summed over years)."""
+    query = db.session.query(MonthlyRevenue.month, func.sum(MonthlyRevenue.total_cents)).filter(MonthlyRevenue.month > 0)
+    if status:
+        query = query.filter(MonthlyRevenue.status == status)
+    if year:
+        query = query.filter(MonthlyRevenue.year == year)
+    values = [0.0] * 12
+    for month, total in query.group_by(MonthlyRevenue.month):
+        values[int(month) - 1] = from_cents(total)
+    return values
+
+
+def top_clients(status="Paid", limit=8, year=None):
+    """[(client_name, total)] for the highest-revenue clients."""
+    total = func.sum(ClientRevenue.total_cents)
+    query = db.session.query(ClientRevenue.client_name, total).filter(ClientRevenue.status == status)
+    if year:
+        query = query.filter(ClientRevenue.year == year)
+    rows = query.group_by(ClientRevenue.client_name).order_by(total.desc()).limit(limit).all()
+    return [(name, from_cents(value)) for name, value in rows]
+
+
+def years():
+    """Years with any invoices, newest first."""
+    rows = (
+        db.session.query(MonthlyRevenue.year)
+        .filter(MonthlyRevenue.year > 0, MonthlyRevenue.invoice_count > 0)
+        .distinct()
+        .order_by(MonthlyRevenue.year.desc())
+        .all()
+    )
+    return [row[0] for row in rows]
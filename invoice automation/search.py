@@ -0,0 +1,145 @@
+# search.py
+"""
+Full-text search over invoices with an SQLite FTS5 index.
+
+invoice_search holds one row per invoice (rowid = invoice id) with the
+client name, client email, description and the concatenated line item
+descriptions. Like the revenue rollups it is kept in sync by the write
+paths, in the same transaction: reindex() after creating or editing an
+invoice, index() for rows being bulk inserted and remove() when deleting.
+rebuild() recomputes it from the invoices and items tables.
+
+Every search term is matched as a prefix ("alp corp" finds "Alpha Corp")
+and results are ranked with BM25, client name weighted highest. On other
+databases search() falls back to a case-insensitive LIKE and the index
+functions do nothing.
+"""
+import re
+
+from sqlalchemy import bindparam, exists, literal_column, or_, select, text
+from sqlalchemy.sql import column, table
+
+from models import db, Invoice, InvoiceItem
+
+FIELDS = ("client_name", "client_email", "description", "items")
+# BM25 weights, in FIELDS order
+WEIGHTS = (10.0, 4.0, 2.0, 1.0)
+
+search_table = table("invoice_search", column("rowid"), *(column(name) for name in FIELDS))
+TERM = re.compile(r"\w+")
+
+_DOCUMENT_SQL = (
+    "SELECT invoices.id, invoices.client_name, invoices.client_email, invoices.description, "
+    "(SELECT group_concat(invoice_items.description, ' ') FROM invoice_items "
+    "WHERE invoice_items.invoice_id = invoices.id) FROM invoices"
+)
+
+
+def enabled(conn=None):
+    """FTS5 is SQLite only; conn is a Connection or a Session (default db.session)."""
+    conn = conn or db.session
+    dialect = conn.dialect if hasattr(conn, "dialect") else conn.get_bind().dialect
+    return dialect.name == "sqlite"
+
+
+def create_index(conn):
+    """Create the FTS5 table (SQLite only); called from the migrations."""
+    if not enabled(conn):
+        return
+    conn.execute(text(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS invoice_search USING fts5("
+        f"{', '.join(FIELDS)}, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    ))
+    weights = ", ".join(str(w) for w in WEIGHTS)
+    conn.execute(text(f"INSERT INTO invoice_search(invoice_search, rank) VALUES ('rank', 'bm25({weights})')"))
+
+
+def rebuild(connection=None):
+    """Recompute the whole index from the invoices and items tables."""
+    conn = connection or db.session
+    if not enabled(conn):
+        return
+    conn.execute(text("DELETE FROM invoice_search"))
+    conn.execute(text(f"INSERT INTO invoice_search (rowid, {', '.join(FIELDS)}) {_DOCUMENT_SQL}"))
+
+
+# --- Write paths ---
+def document(invoice_id, invoice, items):
+    """The index row for plain invoice and item dicts (e.g. rows being bulk inserted)."""
+    return {
+        "rowid": invoice_id,
+        "client_name": invoice.get("client_name"),
+        "client_email": invoice.get("client_email"),
+        "description": invoice.get("description"),
+        "items": " ".join(item.get("description") or "" for item in items),
+    }
+
+
+def index(documents, session=None):
+    """Insert or replace the index rows for these document() dicts."""
+    session = session or db.session
+    documents = list(documents)
+    if not documents or not enabled(session):
+        return
+    remove([doc["rowid"] for doc in documents], session)
+    session.execute(text(
+        f"INSERT INTO invoice_search (rowid, {', '.join(FIELDS)}) "
+        f"VALUES (:rowid, {', '.join(':' + name for name in FIELDS)})"
+    ), documents)
+
+
+def reindex(invoice_ids, session=None):
+    """Refresh the index rows of these invoices from the database; flushes pending changes first."""
+    session = session or db.session
+    if not invoice_ids or not enabled(session):
+        return
+    session.flush()
+    remove(invoice_ids, session)
+    session.execute(
+        text(f"INSERT INTO invoice_search (rowid, {', '.join(FIELDS)}) {_DOCUMENT_SQL} "
+             f"WHERE invoices.id IN :ids").bindparams(bindparam("ids", expanding=True)),
+        {"ids": list(invoice_ids)},
+    )
+
+
+def remove(invoice_ids, session=None):
+    session = session or db.session
+    if not invoice_ids or not enabled(session):
+        return
+    session.execute(text("DELETE FROM invoice_search WHERE rowid = :id"), [{"id": i} for i in invoice_ids])
+
+
+# --- Reads ---
+def match_expression(query):
+    """FTS5 query: every word as a quoted prefix term, all required."""
+    return " ".join(f'"{term}"*' for term in TERM.findall(query.lower()))
+
+
+def search(query, limit=50, offset=0):
+    """
+    Rank invoices against a free-text query.
+    Returns ([(invoice, snippet)], next_offset); next_offset is None on the last page.
+    """
+    expression = match_expression(query or "")
+    if not expression:
+        return [], None
+    if enabled():
+        snippet = literal_column("snippet(invoice_search, -1, '[', ']', '...', 8)")
+        stmt = (
+            select(Invoice, snippet)
+            .select_from(search_table)
+            .join(Invoice, Invoice.id == search_table.c.rowid)
+            .where(literal_column("invoice_search").op("MATCH")(expression))
+            .order_by(literal_column("invoice_search.rank"))
+        )
+    else:
+        stmt = select(Invoice, literal_column("NULL")).where(*(
+            or_(*(getattr(Invoice, name).ilike(f"%{term}%") for name in FIELDS[:3]),
+                exists().where(InvoiceItem.invoice_id == Invoice.id,
+                               InvoiceItem.description.ilike(f"%{term}%")))
+            for term in TERM.findall(query)
+        )).order_by(Invoice.id.desc())
+
+    rows = db.session.execute(stmt.limit(limit + 1).offset(offset)).all()
+    next_offset = offset + limit if len(rows) > limit else None
+    return [(invoice, snippet) for invoice, snippet in rows[:limit]], next_offset
@@ -88,6 +88,7 @@ document.addEventListener("DOMContentLoaded", () => {
   // ===== REPORTS PAGE =====
   const reportData = window.reportData || {};
   const monthlyRevenue = Array.isArray(reportData.monthly_revenue) ? reportData.monthly_revenue : [];
+  const monthlyLabels = Array.isArray(reportData.monthly_labels) ? reportData.monthly_labels : null;
   const paidVsUnpaid = reportData.paid_vs_unpaid || {};
   const topClients = reportData.top_clients || {};
 
@@ -101,7 +102,7 @@ document.addEventListener("DOMContentLoaded", () => {
   // --- Monthly Revenue Line Chart (Reports) ---
   const revenueEl = document.getElementById("reportRevenueChart");
   if (revenueEl) {
-    const labels = ["Jan","Feb","Mar","Apr","May","Jun","Jul","Aug","Sep","Oct","Nov","Dec"];
+    const labels = monthlyLabels || ["Jan","Feb","Mar","Apr","May","Jun","Jul","Aug","Sep","Oct","Nov","Dec"];
     const ctx = revenueEl.getContext("2d");
     new Chart(ctx, {
       type: "line",
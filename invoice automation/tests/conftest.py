@@ -0,0 +1,35 @@
+# tests/conftest.py
+import os
+import sys
+
+import pytest
+
+# the app's modules are imported flat, as when running from this directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """A new app on its own SQLite file, migrated and seeded with the demo invoices."""
+    monkeypatch.setenv("DATABASE_URL", "sqlite:///" + str(tmp_path / "invoices.db"))
+    monkeypatch.setenv("ARCHIVE_DIR", str(tmp_path / "archive"))
+
+    from app import create_app
+    from commands import seed_demo_data
+    from pdf_cache import pdf_cache
+    from result_cache import result_cache
+    import migrations
+
+    app = create_app()
+    app.config["TESTING"] = True
+    pdf_cache.directory = str(tmp_path / "pdf_cache")
+    os.makedirs(pdf_cache.directory)
+    with app.app_context():
+        migrations.upgrade()
+        seed_demo_data()
+    result_cache.clear()
+    pdf_cache.clear()
+    yield app
+    from models import db
+    with app.app_context():
+        db.engine.dispose()
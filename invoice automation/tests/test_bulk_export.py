@@ -0,0 +1,62 @@
+# tests/test_bulk_export.py
+"""Merged exports keep each page's inherited attributes and reuse one render pool."""
+import io
+
+from pypdf import PdfReader
+
+import bulk_export
+from bulk_export import PdfConcatenator
+
+
+def _pdf_with_inherited_attributes():
+    """Two pages that take /MediaBox, /Rotate and /Resources from their page tree."""
+    stream = b"BT /F1 12 Tf 10 10 Td (Hi) Tj ET"
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R 4 0 R] /Count 2 /MediaBox [0 0 200 300] /Rotate 90"
+        b" /Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Type /Page /Parent 2 0 R /Contents 6 0 R >>",
+        b"<< /Type /Page /Parent 2 0 R /Contents 6 0 R /MediaBox [0 0 50 50] >>",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+        b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream),
+    ]
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    out.write(b"".join(b"%010d 00000 n \n" % offset for offset in offsets))
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    return out.getvalue()
+
+
+def test_concatenator_copies_inherited_page_attributes():
+    out = io.BytesIO()
+    merged = PdfConcatenator(out)
+    merged.append(_pdf_with_inherited_attributes())
+    merged.append(_pdf_with_inherited_attributes())
+    merged.close()
+
+    pages = PdfReader(io.BytesIO(out.getvalue())).pages
+    assert [list(page.mediabox) for page in pages] == [[0, 0, 200, 300], [0, 0, 50, 50]] * 2
+    for page in pages:
+        assert page["/Rotate"] == 90
+        assert page["/Resources"]["/Font"]["/F1"]["/BaseFont"] == "/Helvetica"
+        assert page.extract_text() == "Hi"
+
+
+def test_render_parallel_reuses_the_pool(app):
+    with app.app_context():
+        snapshots = list(bulk_export.iter_invoice_snapshots({}))[:3]
+    try:
+        first = [snap.id for snap, _ in bulk_export.render_parallel(snapshots, workers=2)]
+        pool = bulk_export._pools[2]
+        second = [snap.id for snap, data in bulk_export.render_parallel(snapshots, workers=2)
+                  if data.startswith(b"%PDF")]
+        assert first == second == [snap.id for snap in snapshots]
+        assert bulk_export._pools[2] is pool
+    finally:
+        bulk_export.shutdown_pools()
@@ -0,0 +1,57 @@
+# tests/test_invoice_items.py
+"""sync_items updates, inserts and deletes an invoice's items by item id."""
+from datetime import date
+
+from models import db, Invoice, InvoiceItem
+from invoice_items import sync_items
+import money
+
+
+def _row(description, quantity, price_cents, tax=0, item_id=None):
+    row = {"id": item_id, "description": description, "quantity": quantity,
+           "price_cents": price_cents, "tax": tax}
+    money.apply_line_totals([[row]])
+    return row
+
+
+def _items(invoice_id):
+    return db.session.execute(
+        db.select(InvoiceItem.id, InvoiceItem.description, InvoiceItem.quantity,
+                  InvoiceItem.price_cents, InvoiceItem.line_total_cents)
+        .where(InvoiceItem.invoice_id == invoice_id).order_by(InvoiceItem.id)
+    ).all()
+
+
+def test_sync_items_updates_inserts_and_deletes_by_id(app):
+    with app.app_context():
+        invoice = Invoice(client_name="Acme", client_email="a@example.com",
+                          issue_date=date(2024, 5, 1), due_date=date(2024, 5, 31))
+        invoice.items = [InvoiceItem(description=name, quantity=1, price_cents=1000, tax=0, line_total_cents=1000)
+                         for name in ("Keep", "Change", "Drop")]
+        other = db.session.scalars(db.select(InvoiceItem).order_by(InvoiceItem.id)).first()  # a demo item
+        db.session.add(invoice)
+        db.session.commit()
+        keep, change, drop = (item.id for item in invoice.items)
+
+        rows = [
+            _row("Keep", 1, 1000, item_id=keep),
+            _row("Changed", 2, 1250, tax=10, item_id=change),
+            _row("New", 1, 500),
+            _row("Not ours", 1, 700, item_id=other.id),  # another invoice's item id: inserted as new
+        ]
+        assert sync_items(invoice, rows)
+        db.session.commit()
+
+        items = _items(invoice.id)
+        assert items[:2] == [(keep, "Keep", 1, 1000, 1000), (change, "Changed", 2, 1250, 2750)]
+        assert [(description, total) for _, description, _, _, total in items[2:]] == [
+            ("New", 500), ("Not ours", 700)]
+        assert drop not in [item_id for item_id, *_ in items]
+        assert db.session.get(InvoiceItem, other.id).invoice_id != invoice.id
+        assert [item.id for item in invoice.items] == [item_id for item_id, *_ in items]
+
+        # posting the same rows again changes nothing
+        rows = [_row(description, quantity, price, item_id=item_id)
+                for item_id, description, quantity, price, _ in items]
+        rows[1]["tax"], rows[1]["line_total_cents"] = 10, 2750
+        assert not sync_items(invoice, rows)
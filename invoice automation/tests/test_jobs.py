@@ -0,0 +1,30 @@
+# tests/test_jobs.py
+"""Finished PDF jobs keep only the cache fingerprint and are served from the PDF cache."""
+from jobs import job_queue
+from models import db, Invoice, PdfJob
+from pdf_cache import pdf_cache
+
+
+def test_job_download_is_served_from_the_pdf_cache(app):
+    with app.app_context():
+        invoice = db.session.scalars(db.select(Invoice).order_by(Invoice.id)).first()
+        job = PdfJob(invoice_id=invoice.id, status="queued", progress=0.0)
+        db.session.add(job)
+        db.session.commit()
+        assert job_queue.run_once()
+        db.session.refresh(job)
+        assert job.status == "done"
+        cached = pdf_cache.get(invoice)
+        assert job.fingerprint == cached.key[1]
+        job_id, invoice_id = job.id, invoice.id
+
+    client = app.test_client()
+    response = client.get(f"/api/jobs/{job_id}/download")
+    assert response.status_code == 200
+    assert response.data == cached.data
+
+    # an edit drops the cached render; the download falls back to the current one
+    pdf_cache.invalidate(invoice_id)
+    response = client.get(f"/api/jobs/{job_id}/download")
+    assert response.status_code == 200
+    assert response.data.startswith(b"%PDF")
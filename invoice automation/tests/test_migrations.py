@@ -0,0 +1,48 @@
+# tests/test_migrations.py
+"""Migration 4 converts a float-era database to integer cents."""
+from sqlalchemy import create_engine, text
+
+from models import ClientRevenue, MonthlyRevenue
+import migrations
+
+
+def test_integer_cents_converts_float_amounts_and_prices(app, tmp_path):
+    engine = create_engine("sqlite:///" + str(tmp_path / "float_era.db"))
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE invoices (id INTEGER PRIMARY KEY, client_name VARCHAR(120) NOT NULL, "
+            "client_email VARCHAR(120) NOT NULL, description TEXT, issue_date DATE, "
+            "due_date DATE NOT NULL, status VARCHAR(20), amount FLOAT NOT NULL)"
+        ))
+        conn.execute(text(
+            "CREATE TABLE invoice_items (id INTEGER PRIMARY KEY, invoice_id INTEGER NOT NULL, "
+            "description VARCHAR(255) NOT NULL, quantity FLOAT, price FLOAT, tax FLOAT)"
+        ))
+        conn.execute(text(
+            "INSERT INTO invoices VALUES "
+            "(1, 'Acme', 'a@example.com', NULL, '2024-01-10', '2024-02-10', 'Paid', 60.12), "
+            "(2, 'Beta', 'b@example.com', NULL, '2024-01-20', '2024-02-20', 'Unpaid', 12.345)"
+        ))
+        conn.execute(text(
+            "INSERT INTO invoice_items VALUES "
+            "(1, 1, 'Widgets', 3, 19.995, 0), "   # 20.00 each after rounding, 60.00
+            "(2, 1, 'Fee', 1, 0.105, 10)"         # 0.11, plus tax 0.121 -> 0.12
+        ))
+
+    with app.app_context(), engine.begin() as conn:
+        migrations._integer_cents(conn)
+
+        assert "amount" not in migrations._columns(conn, "invoices")
+        assert "price" not in migrations._columns(conn, "invoice_items")
+        assert conn.execute(text(
+            "SELECT id, price_cents, line_total_cents FROM invoice_items ORDER BY id"
+        )).all() == [(1, 2000, 6000), (2, 11, 12)]
+        # with items the amount is their sum; without, the float amount rounded half-up
+        assert conn.execute(text("SELECT id, amount_cents FROM invoices ORDER BY id")).all() == [
+            (1, 6012), (2, 1235)]
+        assert conn.execute(text(
+            f"SELECT SUM(total_cents) FROM {MonthlyRevenue.__tablename__}")).scalar() == 7247
+        assert conn.execute(text(
+            f"SELECT client_name, total_cents FROM {ClientRevenue.__tablename__} ORDER BY client_name"
+        )).all() == [("Acme", 6012), ("Beta", 1235)]
+    engine.dispose()
@@ -0,0 +1,38 @@
+# tests/test_money.py
+"""Cents are rounded once per line, half-up, from the exact decimal text of each number."""
+import pytest
+
+import money
+
+
+@pytest.mark.parametrize("amount, cents", [
+    (0.125, 13),      # a float half-cent rounds up, not to even
+    ("0.135", 14),
+    (19.995, 2000),   # repr is "19.995", not 19.99499...
+    (2.675, 268),
+    (-0.125, -13),    # half-up is away from zero
+    (0.1 + 0.2, 30),
+    ("", 0),
+    (None, 0),
+])
+def test_to_cents_rounds_half_cents_up(amount, cents):
+    assert money.to_cents(amount) == cents
+
+
+@pytest.mark.parametrize("quantity, price_cents, tax, total", [
+    (0.5, 1, 0, 1),       # 0.5 cent
+    (1.5, 3, 0, 5),       # 4.5 cents
+    (1, 5, 10, 6),        # 5.5 cents with tax
+    (3, 333, 15, 1149),   # 1148.85 cents
+    (0.1, 5, 0, 1),       # 0.5 cent: 0.1 is read as exactly one tenth
+    (2, 1045, 0, 2090),
+])
+def test_line_total_rounds_half_cents_up(quantity, price_cents, tax, total):
+    assert money.line_total(quantity, price_cents, tax) == total
+    assert money.line_totals([quantity], [price_cents], [tax]) == [total]
+
+
+def test_invalid_amounts_are_rejected():
+    for value in ("abc", float("nan"), float("inf")):
+        with pytest.raises(ValueError):
+            money.to_cents(value)
@@ -0,0 +1,47 @@
+# tests/test_pdf_cache.py
+"""The disk tier tracks its files in memory instead of listing the directory."""
+import os
+from types import SimpleNamespace
+
+from pdf_cache import PDFCache
+
+
+def _cache(tmp_path, max_bytes):
+    cache = PDFCache()
+    cache.directory = str(tmp_path)
+    cache.max_bytes = max_bytes
+    cache.memory_max_bytes = 0  # disk tier only
+    return cache
+
+
+def _invoice(invoice_id, description):
+    return SimpleNamespace(id=invoice_id, client_name="Acme", client_email="a@example.com",
+                           description=description, issue_date=None, due_date=None,
+                           status="Unpaid", amount_cents=100, items=[])
+
+
+def test_disk_index_evicts_only_over_budget_and_invalidates_by_id(tmp_path, monkeypatch):
+    (tmp_path / "7-stale.pdf").write_bytes(b"x" * 100)  # left by an earlier run
+    cache = _cache(tmp_path, max_bytes=1000)
+    for i in range(1, 5):
+        cache.fetch(_invoice(i, "first"), lambda inv: b"p" * 200)
+    assert cache._disk_bytes == 900
+    assert len(os.listdir(tmp_path)) == 5
+
+    # once indexed, reads, writes under budget and invalidate never list the directory
+    def no_scan(path):
+        raise AssertionError("directory was scanned")
+    monkeypatch.setattr(os, "scandir", no_scan)
+    cache.invalidate(7)
+    assert not (tmp_path / "7-stale.pdf").exists()
+    assert cache.get(_invoice(1, "first")).data == b"p" * 200
+    cache.fetch(_invoice(1, "edited"), lambda inv: b"q" * 200)
+    monkeypatch.undo()
+
+    # going over budget trims the least recently used files to 90% of it
+    cache.fetch(_invoice(5, "first"), lambda inv: b"p" * 200)
+    assert cache._disk_bytes <= 900
+    assert sorted(os.listdir(tmp_path)) == sorted(
+        f"{i}-{fp}.pdf" for i, fp in cache._disk)
+    assert cache.get(_invoice(1, "first")) is not None  # recently read, so kept
+    assert cache.get(_invoice(2, "first")) is None
@@ -0,0 +1,17 @@
+# tests/test_query_budgets.py
+"""Each route in ROUTE_BUDGETS, alone on a fresh database and cold caches, stays within its budget."""
+import pytest
+
+from query_budget import ROUTE_BUDGETS, assert_max_queries, route_path
+
+
+@pytest.mark.parametrize("route", list(ROUTE_BUDGETS))
+def test_route_within_budget(app, route):
+    client = app.test_client()
+    with app.app_context():
+        path = route_path(route)
+        with assert_max_queries(ROUTE_BUDGETS[route]) as statements:
+            response = client.get(path)
+            response.get_data()  # drain streamed bodies inside the count
+    assert response.status_code == 200, path
+    assert statements, f"{path} sent no queries; was it served from a cache?"
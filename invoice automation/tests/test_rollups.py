@@ -0,0 +1,30 @@
+# tests/test_rollups.py
+"""The incrementally maintained rollups match what rebuild() computes from the invoices."""
+from datetime import date
+
+from models import db, ClientRevenue, Invoice, MonthlyRevenue
+import rollups
+
+
+def _rollup_rows():
+    return (
+        sorted(db.session.query(MonthlyRevenue.year, MonthlyRevenue.month, MonthlyRevenue.status,
+                                MonthlyRevenue.total_cents, MonthlyRevenue.invoice_count).all()),
+        sorted(db.session.query(ClientRevenue.client_name, ClientRevenue.year, ClientRevenue.status,
+                                ClientRevenue.total_cents, ClientRevenue.invoice_count).all()),
+    )
+
+
+def test_rebuild_matches_incremental_for_blank_client_and_status(app):
+    with app.app_context():
+        invoice = Invoice(client_name="", client_email="nobody@example.com", status="",
+                          issue_date=date(2024, 3, 5), due_date=date(2024, 3, 19), amount_cents=1250)
+        db.session.add(invoice)
+        rollups.record(None, rollups.snapshot(invoice))
+        db.session.commit()
+        incremental = _rollup_rows()
+        assert ("Unknown", 2024, "Unpaid", 1250, 1) in incremental[1]
+
+        rollups.rebuild()
+        db.session.commit()
+        assert _rollup_rows() == incremental
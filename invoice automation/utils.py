@@ -6,154 +6,313 @@ from reportlab.platypus import (
 from reportlab.lib import colors
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from datetime import datetime
+from types import SimpleNamespace
+import copy
+import io
+import threading
+import time
 
-def generate_invoice_pdf(invoice, filename):
+from metrics import metrics
+from money import format_cents, line_net
+
+
+def render_invoice_pdf(invoice, progress=None):
+    """
+    Build the invoice PDF entirely in memory and return its bytes.
+    progress: optional callable receiving the completed fraction (0..1)
+    """
+    started = time.perf_counter()
+    buffer = io.BytesIO()
+    generate_invoice_pdf(invoice, buffer, progress=progress)
+    data = buffer.getvalue()
+    metrics.pdf_rendered(time.perf_counter() - started, len(data))
+    return data
+
+
+def invoice_snapshot(invoice):
+    """
+    Detached, picklable copy of an invoice and its items, so it can be
+    rendered in another process without an app context or DB session.
+    """
+    return SimpleNamespace(
+        id=invoice.id,
+        client_name=invoice.client_name,
+        client_email=invoice.client_email,
+        description=invoice.description,
+        issue_date=invoice.issue_date,
+        due_date=invoice.due_date,
+        status=invoice.status,
+        amount_cents=invoice.amount_cents,
+        items=[
+            SimpleNamespace(description=i.description, quantity=i.quantity, price_cents=i.price_cents,
+                            tax=i.tax, line_total_cents=i.total_cents())
+            for i in invoice.items
+        ],
+    )
+
+
+def _new_document(filename):
+    return SimpleDocTemplate(filename, pagesize=A4,
+                             rightMargin=36, leftMargin=36,
+                             topMargin=36, bottomMargin=36)
+
+
+def generate_invoice_pdf(invoice, filename, progress=None):
     """
     invoice: SQLAlchemy Invoice object with .items relationship
+    filename: filesystem path or writable binary file object (e.g. BytesIO)
+    progress: optional callable receiving the completed fraction (0..1)
     """
-    brand_color = colors.HexColor("#2E86C1")
-
-    doc = SimpleDocTemplate(filename, pagesize=A4,
-                            rightMargin=36, leftMargin=36,
-                            topMargin=36, bottomMargin=36)
-    elements = []
-    styles = getSampleStyleSheet()
-    styles.add(ParagraphStyle(name="Right", alignment=2))
-    styles.add(ParagraphStyle(name="Center", alignment=1))
-    styles.add(ParagraphStyle(name="SmallGrey", fontSize=9, textColor=colors.grey))
-
-    # --- Header ---
-    header_data = []
-    if getattr(invoice, "company_logo", None):
-        try:
-            logo = Image(invoice.company_logo, width=80, height=40)
-            header_data.append([logo,
-                Paragraph("<b style='font-size:20px;color:#2E86C1;'>INVOICE</b>", styles["Right"])
-            ])
-        except:
-            header_data.append([
-                Paragraph("<b style='font-size:16px;'>InvoicePro</b>", styles["Normal"]),
-                Paragraph("<b style='font-size:20px;color:#2E86C1;'>INVOICE</b>", styles["Right"])
-            ])
-    else:
-        header_data.append([
-            Paragraph("<b style='font-size:16px;'>InvoicePro</b>", styles["Normal"]),
-            Paragraph("<b style='font-size:20px;color:#2E86C1;'>INVOICE</b>", styles["Right"])
+    doc = _new_document(filename)
+    if progress is not None:
+        doc.setProgressCallBack(_progress_adapter(progress))
+    doc.build(build_invoice_elements(invoice))
+
+
+def _progress_adapter(progress):
+    # ReportLab reports ("SIZE_EST", n_flowables) then ("PROGRESS", n_done)
+    state = {"total": 0}
+
+    def on_progress(kind, value):
+        if kind == "SIZE_EST":
+            state["total"] = value or 0
+        elif kind == "PROGRESS" and state["total"]:
+            progress(min(value / state["total"], 1.0))
+        elif kind == "FINISHED":
+            progress(1.0)
+
+    return on_progress
+
+
+def render_notice_pdf(text):
+    """A one-page PDF with just `text`, e.g. for an export that matched nothing."""
+    buffer = io.BytesIO()
+    _new_document(buffer).build([Paragraph(text, get_invoice_template().styles["Normal"])])
+    return buffer.getvalue()
+
+
+def build_invoice_elements(invoice):
+    """
+    Return the list of flowables making up one invoice.
+    """
+    return get_invoice_template().elements(invoice)
+
+
+_local = threading.local()
+
+
+def get_invoice_template():
+    """
+    Return this thread's InvoiceTemplate, building it on first use.
+    Templates are kept per thread, so threads never share the styles and
+    prebuilt blocks ReportLab reads during layout.
+    """
+    template = getattr(_local, "template", None)
+    if template is None:
+        template = _local.template = InvoiceTemplate()
+    return template
+
+
+def _fresh(flowable):
+    """
+    A copy of a never-laid-out flowable for one document. Layout state
+    lands on the copy. Parsed paragraph text and styles stay shared. A
+    table also gets its own cell rows, since laying it out writes into
+    them.
+    """
+    clone = copy.copy(flowable)
+    if isinstance(flowable, Table):
+        clone._cellvalues = [[_fresh(cell) if hasattr(cell, "wrap") else cell for cell in row]
+                             for row in flowable._cellvalues]
+    return clone
+
+
+class InvoiceTemplate:
+    """
+    Styles, table styles and the static blocks (header, company block,
+    headings, payment instructions, footer) built once and reused for
+    every invoice. ReportLab flowables keep layout state after wrap/split,
+    so each invoice lays out _fresh() copies of the prebuilt blocks and
+    never the originals.
+    """
+
+    def __init__(self):
+        brand_color = colors.HexColor("#2E86C1")
+
+        styles = getSampleStyleSheet()
+        styles.add(ParagraphStyle(name="Right", alignment=2))
+        styles.add(ParagraphStyle(name="Center", alignment=1))
+        styles.add(ParagraphStyle(name="SmallGrey", fontSize=9, textColor=colors.grey))
+        self.styles = styles
+
+        # --- Table styles ---
+        self.header_style = TableStyle([("VALIGN", (0,0), (-1,-1), "MIDDLE")])
+        self.meta_style = TableStyle([
+            ("FONTNAME", (0,0), (-1,-1), "Helvetica"),
+            ("FONTSIZE", (0,0), (-1,-1), 10),
+            ("TEXTCOLOR", (0,0), (0,-1), brand_color),
+            ("BOTTOMPADDING", (0,0), (-1,-1), 4),
         ])
+        self.items_style = TableStyle([
+            ("BACKGROUND", (0, 0), (-1, 0), brand_color),
+            ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
+            ("ALIGN", (1, 1), (-1, -1), "CENTER"),
+            ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+            ("BOTTOMPADDING", (0, 0), (-1, 0), 8),
+            ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
+            ("ROWBACKGROUNDS", (0,1), (-1,-1), [colors.whitesmoke, colors.lightgrey])
+        ])
+        self.totals_style = TableStyle([
+            ("ALIGN", (1, 0), (1, -1), "RIGHT"),
+            ("FONTNAME", (0, 0), (-1, -2), "Helvetica"),
+            ("FONTNAME", (0, -1), (-1, -1), "Helvetica-Bold"),
+            ("FONTSIZE", (0, -1), (-1, -1), 12),
+            ("LINEABOVE", (0, -1), (-1, -1), 1, brand_color),
+            ("TEXTCOLOR", (0, -1), (-1, -1), brand_color),
+        ])
+        self.footer_style = TableStyle([
+            ("BACKGROUND", (0,0), (-1,-1), brand_color),
+            ("TEXTCOLOR", (0,0), (-1,-1), colors.white),
+            ("VALIGN", (0,0), (-1,-1), "MIDDLE")
+        ])
+
+        # --- Static blocks, never laid out themselves ---
+        self.blocks = {
+            "header": [self._header()],
+            "company_info": self._company_info(),
+            "bill_to": [self._heading("Bill To:")],
+            "payment_instructions": self._payment_instructions(),
+            "notes": [self._heading("Notes")],
+            "footer": self._footer(),
+        }
+
+    def block(self, name):
+        """New copies of a prebuilt static block's flowables."""
+        return [_fresh(flowable) for flowable in self.blocks[name]]
+
+    # --- Static block builders ---
+    def _header(self, left=None):
+        if left is None:
+            left = Paragraph("<b style='font-size:16px;'>InvoicePro</b>", self.styles["Normal"])
+        title = Paragraph("<b style='font-size:20px;color:#2E86C1;'>INVOICE</b>", self.styles["Right"])
+        header_table = Table([[left, title]], colWidths=[300, 220])
+        header_table.setStyle(self.header_style)
+        return header_table
+
+    def _company_info(self):
+        return [
+            Paragraph("123 Business Street, City, Country", self.styles["Normal"]),
+            Paragraph("Email: you@company.com | Phone: +123456789", self.styles["Normal"]),
+            Spacer(1, 20),
+        ]
+
+    def _heading(self, text):
+        return Paragraph(f"<b style='color:#2E86C1;'>{text}</b>", self.styles["Normal"])
 
-    header_table = Table(header_data, colWidths=[300, 220])
-    header_table.setStyle(TableStyle([("VALIGN", (0,0), (-1,-1), "MIDDLE")]))
-    elements.append(header_table)
-    elements.append(Spacer(1, 12))
-
-    # --- Company Info ---
-    elements.append(Paragraph("123 Business Street, City, Country", styles["Normal"]))
-    elements.append(Paragraph("Email: you@company.com | Phone: +123456789", styles["Normal"]))
-    elements.append(Spacer(1, 20))
-
-    # --- Invoice Metadata ---
-    meta = [
-        ["Date:", invoice.issue_date.strftime("%Y-%m-%d") if invoice.issue_date else ""],
-        ["Due:", invoice.due_date.strftime("%Y-%m-%d") if invoice.due_date else ""],
-        ["Status:", invoice.status],
-    ]
-    meta_table = Table(meta, colWidths=[80, 200])
-    meta_table.setStyle(TableStyle([
-        ("FONTNAME", (0,0), (-1,-1), "Helvetica"),
-        ("FONTSIZE", (0,0), (-1,-1), 10),
-        ("TEXTCOLOR", (0,0), (0,-1), brand_color),
-        ("BOTTOMPADDING", (0,0), (-1,-1), 4),
-    ]))
-    elements.append(meta_table)
-    elements.append(Spacer(1, 16))
-
-    # --- Bill To ---
-    elements.append(Paragraph("<b style='color:#2E86C1;'>Bill To:</b>", styles["Normal"]))
-    elements.append(Paragraph(invoice.client_name or "", styles["Normal"]))
-    if getattr(invoice, "client_email", None):
-        elements.append(Paragraph(f"Email: {invoice.client_email}", styles["Normal"]))
-    elements.append(Spacer(1, 16))
-
-    # --- Items Table ---
-    data = [["Description", "Qty", "Unit Price", "Line Total"]]
-    subtotal = 0
-
-    if hasattr(invoice, "items") and invoice.items:
-        for i, item in enumerate(invoice.items, start=1):
-            line_total = (item.quantity or 0) * (item.price or 0)
-            subtotal += line_total
+    def _payment_instructions(self):
+        return [
+            self._heading("Payment Instructions"),
+            Paragraph("Bank: Bank Name, Account #: 123456789, IBAN: PK00BANK000000", self.styles["Normal"]),
+            Spacer(1, 16),
+        ]
+
+    def _footer(self):
+        footer_bar = Table([[Paragraph("Thank you for your business!", self.styles["Center"])]],
+                           colWidths=[540], rowHeights=[20])
+        footer_bar.setStyle(self.footer_style)
+        return [Spacer(1, 30), footer_bar]
+
+    def elements(self, invoice):
+        styles = self.styles
+        elements = []
+
+        # --- Header ---
+        header = None
+        if getattr(invoice, "company_logo", None):
+            try:
+                header = self._header(Image(invoice.company_logo, width=80, height=40))
+            except Exception:
+                pass
+        elements.extend([header] if header else self.block("header"))
+        elements.append(Spacer(1, 12))
+
+        # --- Company Info ---
+        elements.extend(self.block("company_info"))
+
+        # --- Invoice Metadata ---
+        meta = [
+            ["Date:", invoice.issue_date.strftime("%Y-%m-%d") if invoice.issue_date else ""],
+            ["Due:", invoice.due_date.strftime("%Y-%m-%d") if invoice.due_date else ""],
+            ["Status:", invoice.status],
+        ]
+        meta_table = Table(meta, colWidths=[80, 200])
+        meta_table.setStyle(self.meta_style)
+        elements.append(meta_table)
+        elements.append(Spacer(1, 16))
+
+        # --- Bill To ---
+        elements.extend(self.block("bill_to"))
+        elements.append(Paragraph(invoice.client_name or "", styles["Normal"]))
+        if getattr(invoice, "client_email", None):
+            elements.append(Paragraph(f"Email: {invoice.client_email}", styles["Normal"]))
+        elements.append(Spacer(1, 16))
+
+        # --- Items Table ---
+        # amounts are integer cents; tax is what the stored line totals add on top of the net lines
+        data = [["Description", "Qty", "Unit Price", "Line Total"]]
+        subtotal = 0
+        total = 0
+
+        if hasattr(invoice, "items") and invoice.items:
+            for item in invoice.items:
+                net = line_net(item.quantity or 0, item.price_cents or 0)
+                subtotal += net
+                total += item.line_total_cents or 0
+                data.append([
+                    item.description,
+                    f"{item.quantity or 0:g}",
+                    format_cents(item.price_cents, "$"),
+                    format_cents(net, "$"),
+                ])
+        else:
+            subtotal = total = invoice.amount_cents or 0
             data.append([
-                item.description,
-                str(item.quantity),
-                f"${item.price:.2f}",
-                f"${line_total:.2f}",
+                getattr(invoice, "description", "Services Rendered"),
+                "1",
+                format_cents(subtotal, "$"),
+                format_cents(subtotal, "$"),
             ])
-    else:
-        subtotal = float(invoice.amount or 0)
-        data.append([
-            getattr(invoice, "description", "Services Rendered"),
-            "1",
-            f"${subtotal:.2f}",
-            f"${subtotal:.2f}",
-        ])
 
-    table = Table(data, colWidths=[260, 60, 80, 80])
-    table.setStyle(TableStyle([
-        ("BACKGROUND", (0, 0), (-1, 0), brand_color),
-        ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
-        ("ALIGN", (1, 1), (-1, -1), "CENTER"),
-        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-        ("BOTTOMPADDING", (0, 0), (-1, 0), 8),
-        ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
-        ("ROWBACKGROUNDS", (0,1), (-1,-1), [colors.whitesmoke, colors.lightgrey])
-    ]))
-    elements.append(table)
-    elements.append(Spacer(1, 20))
-
-    # --- Totals ---
-    tax = subtotal * 0.1
-    total = subtotal + tax
-    totals = [
-        ["Subtotal", f"${subtotal:.2f}"],
-        ["Tax (10%)", f"${tax:.2f}"],
-        ["Total", f"${total:.2f}"],
-    ]
-    totals_table = Table(totals, colWidths=[360, 120])
-    totals_table.setStyle(TableStyle([
-        ("ALIGN", (1, 0), (1, -1), "RIGHT"),
-        ("FONTNAME", (0, 0), (-1, -2), "Helvetica"),
-        ("FONTNAME", (0, -1), (-1, -1), "Helvetica-Bold"),
-        ("FONTSIZE", (0, -1), (-1, -1), 12),
-        ("LINEABOVE", (0, -1), (-1, -1), 1, brand_color),
-        ("TEXTCOLOR", (0, -1), (-1, -1), brand_color),
-    ]))
-    elements.append(totals_table)
-    elements.append(Spacer(1, 20))
-
-    # --- Payment Instructions ---
-    elements.append(Paragraph("<b style='color:#2E86C1;'>Payment Instructions</b>", styles["Normal"]))
-    elements.append(Paragraph("Bank: Bank Name, Account #: 123456789, IBAN: PK00BANK000000", styles["Normal"]))
-    elements.append(Spacer(1, 16))
-
-    # --- Notes ---
-    if getattr(invoice, "description", None):
-        elements.append(Paragraph("<b style='color:#2E86C1;'>Notes</b>", styles["Normal"]))
-        elements.append(Paragraph(invoice.description, styles["Normal"]))
-        elements.append(Spacer(1, 16))
+        table = Table(data, colWidths=[260, 60, 80, 80])
+        table.setStyle(self.items_style)
+        elements.append(table)
+        elements.append(Spacer(1, 20))
+
+        # --- Totals ---
+        totals = [
+            ["Subtotal", format_cents(subtotal, "$")],
+            ["Tax", format_cents(total - subtotal, "$")],
+            ["Total", format_cents(total, "$")],
+        ]
+        totals_table = Table(totals, colWidths=[360, 120])
+        totals_table.setStyle(self.totals_style)
+        elements.append(totals_table)
+        elements.append(Spacer(1, 20))
+
+        # --- Payment Instructions ---
+        elements.extend(self.block("payment_instructions"))
+
+        # --- Notes ---
+        if getattr(invoice, "description", None):
+            elements.extend(self.block("notes"))
+            elements.append(Paragraph(invoice.description, styles["Normal"]))
+            elements.append(Spacer(1, 16))
+
+        # --- Footer ---
+        elements.extend(self.block("footer"))
+        elements.append(Paragraph(
+            f"Generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
+            styles["SmallGrey"]
+        ))
 
-    # --- Footer ---
-    footer_bar = Table([[Paragraph("Thank you for your business!", styles["Center"])]],
-                       colWidths=[540], rowHeights=[20])
-    footer_bar.setStyle(TableStyle([
-        ("BACKGROUND", (0,0), (-1,-1), brand_color),
-        ("TEXTCOLOR", (0,0), (-1,-1), colors.white),
-        ("VALIGN", (0,0), (-1,-1), "MIDDLE")
-    ]))
-    elements.append(Spacer(1, 30))
-    elements.append(footer_bar)
-    elements.append(Paragraph(
-        f"Generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", 
-        styles["SmallGrey"]
-    ))
-
-    doc.build(elements)
+        return elements
@@ -0,0 +1,549 @@
+# views.py
+from flask import (
+    Blueprint, current_app, render_template, request, redirect, url_for, send_file, jsonify, abort,
+    Response, stream_with_context, flash,
+)
+from datetime import date, datetime, timedelta
+import io
+import calendar
+import hashlib
+
+from sqlalchemy.orm import joinedload, selectinload
+from models import db, ArchivedYear, Invoice, InvoiceDelivery, InvoiceItem, PdfJob, RecurringInvoice
+from pdf_cache import pdf_cache
+from jobs import job_queue
+from mailer import mailer
+from result_cache import result_cache
+from filters import invoice_filters_from_args, apply_invoice_filters, parse_date
+from pagination import keyset_page, InvalidCursor
+from invoice_items import ITEM_FIELDS, parse_item_rows, rows_total, sync_items
+import api
+import archive
+import rollups
+import reporting
+import recurring
+import search
+from bulk_export import ExportStats, stream_zip, stream_merged_pdf
+from importer import import_invoices, READERS as IMPORT_FORMATS
+import data_export
+
+bp = Blueprint("main", __name__)
+
+
+# --- Dashboard ---
+def _revenue_overview(year):
+    """Dashboard counters and series: one rollup query, cached until the next write."""
+    return result_cache.fetch(("overview", year), lambda: rollups.overview(year))
+
+
+def _aging_totals(as_of):
+    """Dashboard receivables aging, cached like the overview (the key changes at midnight)."""
+    return result_cache.fetch(("aging_totals", as_of), lambda: reporting.aging_totals(as_of))
+
+
+def _aging_report(as_of):
+    return result_cache.fetch(("aging", as_of), lambda: reporting.aging_report(as_of))
+
+
+@bp.route("/dashboard")
+def dashboard():
+    invoices = result_cache.fetch(("latest_invoices",), lambda: [
+        inv.to_dict() for inv in Invoice.query.order_by(Invoice.id.desc()).limit(5)
+    ]).value
+
+    # counters and the monthly series come from the revenue rollups
+    overview = _revenue_overview(datetime.now().year).value
+    totals = overview["status_totals"]
+    total_invoices = sum(count for count, _ in totals.values())
+    paid_invoices = totals.get("Paid", (0, 0.0))[0]
+    unpaid_invoices = totals.get("Unpaid", (0, 0.0))[0]
+    total_revenue = round(sum(total for _, total in totals.values()), 2)
+
+    # Monthly revenue (for paid invoices)
+    monthly_revenue = overview["paid_monthly"]
+
+    labels = [calendar.month_abbr[i] for i in range(1, 13)]
+    values = monthly_revenue
+
+    aging_totals = _aging_totals(date.today()).value
+
+    return render_template(
+        "dashboard.html",
+        invoices=invoices,
+        total_invoices=total_invoices,
+        paid_invoices=paid_invoices,
+        unpaid_invoices=unpaid_invoices,
+        total_revenue=total_revenue,
+        revenue_labels=labels,
+        revenue_values=values,
+        aging_totals=aging_totals,
+    )
+
+# --- Invoice list ---
+def _invoice_page(query=None):
+    """Shared by the HTML list and the JSON API: one keyset page plus its inputs."""
+    filters = invoice_filters_from_args(request.args)
+    limit = request.args.get("limit", type=int) or current_app.config["INVOICES_PAGE_SIZE"]
+    limit = max(1, min(limit, current_app.config["INVOICES_MAX_PAGE_SIZE"]))
+    cursor = request.args.get("cursor") or None
+    query = apply_invoice_filters(query if query is not None else Invoice.query, **filters)
+    try:
+        rows, next_cursor = keyset_page(query, cursor, limit)
+    except InvalidCursor:
+        abort(400)
+    return rows, next_cursor, filters, limit
+
+
+@bp.route("/invoices")
+def invoices():
+    rows, next_cursor, filters, limit = _invoice_page()
+    return render_template(
+        "invoices.html",
+        invoices=rows,
+        next_cursor=next_cursor,
+        filters=filters,
+        limit=limit,
+        page_sizes=current_app.config["INVOICES_PAGE_SIZES"],
+    )
+
+
+@bp.route("/api/invoices")
+def api_invoices():
+    """One keyset page of invoices; ?fields= as in api.py (with "items", they're loaded in one more query)."""
+    fields = api.selected_fields(request.args)
+    query = Invoice.query.options(selectinload(Invoice.items)) if "items" in fields else None
+    rows, next_cursor, _, limit = _invoice_page(query)
+    return jsonify({
+        "invoices": [api.serialize(inv, fields) for inv in rows],
+        "next_cursor": next_cursor,
+        "limit": limit,
+    })
+
+
+# --- Search ---
+@bp.route("/api/search")
+def api_search():
+    """
+    Ranked full-text search over client name, email, description and line
+    items: ?q=alp corp&limit=&offset=. Every word is matched as a prefix.
+    """
+    query = request.args.get("q", "")
+    limit = request.args.get("limit", type=int) or current_app.config["INVOICES_PAGE_SIZE"]
+    limit = max(1, min(limit, current_app.config["INVOICES_MAX_PAGE_SIZE"]))
+    offset = max(0, request.args.get("offset", type=int) or 0)
+    matches, next_offset = search.search(query, limit, offset)
+    return jsonify({
+        "query": query,
+        "results": [dict(inv.to_dict(), match=snippet) for inv, snippet in matches],
+        "next_offset": next_offset,
+        "limit": limit,
+    })
+
+
+# --- Reports ---
+@bp.route("/reports")
+def reports():
+    # ?year=2024 reads the rollups; ?start=&end= aggregates that date range in SQL
+    year = request.args.get("year", type=int)
+    start = parse_date(request.args.get("start"))
+    end = parse_date(request.args.get("end"))
+    if start or end:
+        report = reporting.range_report(start, end)
+    else:
+        report = reporting.year_report(year)
+
+    monthly_revenue = report["monthly_revenue"]
+    paid_count = report["paid_count"]
+    unpaid_count = report["unpaid_count"]
+    top_clients = dict(report["top_clients"])
+
+    # Safe defaults if DB somehow empty
+    if paid_count is None:
+        paid_count = 0
+    if unpaid_count is None:
+        unpaid_count = 0
+    if not top_clients:
+        top_clients = {"No Data": 0.0}
+
+    return render_template(
+        "reports.html",
+        monthly_revenue=monthly_revenue,
+        monthly_labels=report["labels"],
+        paid_vs_unpaid={"Paid": paid_count, "Unpaid": unpaid_count},
+        top_clients=top_clients,
+        years=reporting.available_years(),
+        selected_year=year,
+        start=start,
+        end=end,
+    )
+
+
+# --- Receivables Aging ---
+@bp.route("/reports/aging")
+def aging_report():
+    # largest overdue balances first; the JSON API has every client
+    return render_template("aging.html", report=_aging_report(date.today()).value, max_clients=100)
+
+
+@bp.route("/api/aging")
+def api_aging():
+    """Unpaid totals and counts per client in current / 0-30 / 31-60 / 61-90 / 90+ days past due."""
+    return jsonify(_aging_report(date.today()).value)
+
+
+# --- Create Invoice ---
+@bp.route("/create", methods=["GET", "POST"])
+def create_invoice():
+    if request.method == "POST":
+        client_name = request.form.get("client_name")
+        client_email = request.form.get("client_email")
+        due_date_str = request.form.get("due_date")
+        status = request.form.get("status") or "Unpaid"
+
+        # parse due_date safely
+        due_date = None
+        if due_date_str:
+            try:
+                due_date = datetime.strptime(due_date_str, "%Y-%m-%d").date()
+            except ValueError:
+                # accept empty or different format by leaving None
+                due_date = None
+
+        # set issue_date to today (so dashboard grouping works)
+        issue_date = datetime.now().date()
+
+        invoice = Invoice(
+            client_name=client_name,
+            client_email=client_email,
+            due_date=due_date or (issue_date + timedelta(days=7)),
+            issue_date=issue_date,
+            status=status,
+        )
+        rows = parse_item_rows(request.form)
+        invoice.items = [InvoiceItem(**{field: row[field] for field in ITEM_FIELDS}) for row in rows]
+        invoice.amount_cents = rows_total(rows)
+        db.session.add(invoice)
+        db.session.flush()  # assigns invoice.id for the search index
+        rollups.record(None, rollups.snapshot(invoice))
+        search.reindex([invoice.id])
+        db.session.commit()
+        result_cache.clear()
+        return redirect(url_for(".dashboard"))
+
+    return render_template("create_invoice.html")
+
+
+# --- Invoice Detail ---
+def get_invoice_with_items(invoice_id):
+    """Load an invoice and its items in one query, for routes that use both."""
+    return db.get_or_404(Invoice, invoice_id, options=[joinedload(Invoice.items)])
+
+
+def get_invoice_or_archived(invoice_id):
+    """(invoice, archived): a live invoice, else a read-only one from the year archives."""
+    invoice = db.session.get(Invoice, invoice_id, options=[joinedload(Invoice.items)])
+    if invoice is not None:
+        return invoice, False
+    invoice = archive.find_invoice(invoice_id)
+    if invoice is None:
+        abort(404)
+    return invoice, True
+
+
+@bp.route("/invoice/<int:invoice_id>")
+def invoice_detail(invoice_id):
+    invoice, archived = get_invoice_or_archived(invoice_id)
+    delivery = None
+    if not archived:
+        delivery = (InvoiceDelivery.query.filter_by(invoice_id=invoice_id)
+                    .order_by(InvoiceDelivery.id.desc()).first())
+    return render_template("invoice_detail.html", invoice=invoice, items_list=invoice.items, archived=archived,
+                           delivery=delivery)
+
+
+# --- Download PDF ---
+@bp.route("/invoice/<int:invoice_id>/pdf")
+def download_invoice(invoice_id):
+    invoice, _ = get_invoice_or_archived(invoice_id)
+    # rendered in memory (only on a cache miss) and streamed from a buffer;
+    # the fingerprint doubles as a strong ETag for conditional requests
+    from utils import render_invoice_pdf  # ReportLab loads on the first PDF request
+
+    cached = pdf_cache.fetch(invoice, render_invoice_pdf)
+    return send_file(
+        io.BytesIO(cached.data),
+        mimetype="application/pdf",
+        as_attachment=True,
+        download_name=f"invoice_{invoice_id}.pdf",
+        etag=cached.key[1],
+        last_modified=cached.created,
+        max_age=0,
+        conditional=True,
+    )
+
+
+# --- Background PDF Jobs ---
+@bp.route("/invoice/<int:invoice_id>/pdf/jobs", methods=["POST"])
+def enqueue_pdf_job(invoice_id):
+    db.get_or_404(Invoice, invoice_id)
+    job = job_queue.enqueue(invoice_id)
+    return jsonify({
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": url_for(".api_job_status", job_id=job.id),
+    }), 202, {"Location": url_for(".api_job_status", job_id=job.id)}
+
+
+@bp.route("/api/jobs/<int:job_id>")
+def api_job_status(job_id):
+    job = db.get_or_404(PdfJob, job_id)
+    data = job.to_dict()
+    if job.status == "done":
+        data["download_url"] = url_for(".api_job_download", job_id=job.id)
+    return jsonify(data)
+
+
+@bp.route("/api/jobs/<int:job_id>/download")
+def api_job_download(job_id):
+    job = db.get_or_404(PdfJob, job_id)
+    if job.status != "done":
+        return jsonify({"error": "job not finished", "status": job.status}), 409
+    cached = pdf_cache.lookup((job.invoice_id, job.fingerprint)) if job.fingerprint else None
+    if cached is None:
+        # evicted, or dropped when the invoice was edited: serve its current render
+        from utils import render_invoice_pdf
+
+        cached = pdf_cache.fetch(get_invoice_with_items(job.invoice_id), render_invoice_pdf)
+    return send_file(
+        io.BytesIO(cached.data),
+        mimetype="application/pdf",
+        as_attachment=True,
+        download_name=f"invoice_{job.invoice_id}.pdf",
+    )
+
+
+# --- Email Delivery ---
+@bp.route("/invoice/<int:invoice_id>/send", methods=["POST"])
+def send_invoice(invoice_id):
+    """Queue an email of the PDF to the client; the background sender delivers it, with retries."""
+    invoice = db.get_or_404(Invoice, invoice_id)
+    mailer.enqueue(invoice)
+    flash(f"Invoice #{invoice.id} is queued to be emailed to {invoice.client_email}.", "info")
+    return redirect(url_for(".invoice_detail", invoice_id=invoice_id))
+
+
+@bp.route("/api/invoices/<int:invoice_id>/deliveries")
+def api_invoice_deliveries(invoice_id):
+    deliveries = (InvoiceDelivery.query.filter_by(invoice_id=invoice_id)
+                  .order_by(InvoiceDelivery.id.desc()).all())
+    return jsonify({"deliveries": [delivery.to_dict() for delivery in deliveries]})
+
+
+# --- Bulk PDF Export ---
+@bp.route("/export/pdfs")
+def export_pdfs():
+    """
+    Stream every invoice matching ?start=&end=&status=&client= as a ZIP of
+    PDFs (default) or, with ?format=pdf, as one merged PDF.
+    """
+    filters = invoice_filters_from_args(request.args)
+    fmt = request.args.get("format", "zip")
+    if fmt not in ("zip", "pdf"):
+        abort(400)
+
+    stats = ExportStats()
+
+    def generate():
+        workers = current_app.config["PDF_EXPORT_WORKERS"]
+        if fmt == "pdf":
+            yield from stream_merged_pdf(filters, workers=workers, stats=stats)
+        else:
+            yield from stream_zip(filters, workers=workers, stats=stats)
+        current_app.logger.info("PDF export: %d invoices in %.2fs (%.1f invoices/sec)",
+                                stats.count, stats.elapsed, stats.rate)
+
+    mimetype = "application/pdf" if fmt == "pdf" else "application/zip"
+    return Response(
+        stream_with_context(generate()),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename=invoices.{fmt}"},
+    )
+
+
+# --- Data Export ---
+@bp.route("/export/invoices.<fmt>")
+def export_invoices(fmt):
+    """Stream invoices and their items as CSV or JSON lines, with the list view's filters."""
+    if fmt not in data_export.FORMATS:
+        abort(404)
+    generate, mimetype = data_export.FORMATS[fmt]
+    filters = invoice_filters_from_args(request.args)
+    return Response(
+        stream_with_context(generate(filters)),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename=invoices.{fmt}"},
+    )
+
+
+# --- Bulk Import ---
+@bp.route("/import/invoices", methods=["POST"])
+def import_invoices_api():
+    """
+    Import a CSV or JSON-lines file, sent either as the multipart field
+    'file' or as the raw request body. ?format=csv|jsonl (default: guessed
+    from the file name, else csv); ?batch_size= overrides IMPORT_BATCH_SIZE.
+    """
+    upload = request.files.get("file")
+    fmt = request.args.get("format")
+    if not fmt and upload and upload.filename:
+        fmt = "jsonl" if upload.filename.lower().endswith((".jsonl", ".ndjson")) else "csv"
+    fmt = fmt or "csv"
+    if fmt not in IMPORT_FORMATS:
+        return jsonify({"error": f"unsupported format {fmt!r}"}), 400
+
+    raw = upload.stream if upload else request.stream
+    batch_size = request.args.get("batch_size", type=int) or current_app.config["IMPORT_BATCH_SIZE"]
+    result = import_invoices(io.TextIOWrapper(raw, encoding="utf-8-sig", newline=""), fmt, batch_size)
+    current_app.logger.info("Imported %d/%d records in %.2fs (%.1f rows/sec)",
+                            result.imported, result.records, result.elapsed, result.rate)
+    if result.imported:
+        result_cache.clear()
+    return jsonify(result.as_dict()), 200 if not result.error_count else 207
+
+
+# --- Delete Invoice ---
+@bp.route("/invoice/<int:invoice_id>/delete", methods=["POST"])
+def delete_invoice(invoice_id):
+    invoice = get_invoice_with_items(invoice_id)  # the cascade deletes the items
+    PdfJob.query.filter_by(invoice_id=invoice_id).delete()
+    InvoiceDelivery.query.filter_by(invoice_id=invoice_id).delete()
+    rollups.record(rollups.snapshot(invoice), None)
+    search.remove([invoice_id])
+    db.session.delete(invoice)
+    db.session.commit()
+    result_cache.clear()
+    pdf_cache.invalidate(invoice_id)
+    return redirect(url_for(".dashboard"))
+
+
+# --- Mark Paid ---
+@bp.route("/invoice/<int:invoice_id>/mark_paid", methods=["POST"])
+def mark_paid(invoice_id):
+    invoice = db.get_or_404(Invoice, invoice_id)
+    before = rollups.snapshot(invoice)
+    invoice.status = "Paid"
+    # optionally set issue_date if missing
+    if not getattr(invoice, "issue_date", None):
+        invoice.issue_date = datetime.now().date()
+    rollups.record(before, rollups.snapshot(invoice))
+    db.session.commit()
+    result_cache.clear()
+    pdf_cache.invalidate(invoice_id)
+    return redirect(url_for(".dashboard"))
+
+
+# --- Recurring Invoices ---
+@bp.route("/invoice/<int:invoice_id>/recurring", methods=["POST"])
+def make_recurring(invoice_id):
+    """Repeat this invoice every interval_months (form field, default 1); flask generate-recurring issues them."""
+    invoice = get_invoice_with_items(invoice_id)
+    interval = request.form.get("interval_months", type=int) or 1
+    if not 1 <= interval <= 12:
+        abort(400)
+    db.session.add(recurring.from_invoice(invoice, interval_months=interval))
+    db.session.commit()
+    return redirect(url_for(".invoice_detail", invoice_id=invoice_id))
+
+
+@bp.route("/api/recurring")
+def api_recurring():
+    templates = (
+        RecurringInvoice.query.options(selectinload(RecurringInvoice.items))
+        .order_by(RecurringInvoice.next_run, RecurringInvoice.id)
+        .all()
+    )
+    return jsonify({"recurring": [template.to_dict() for template in templates]})
+
+
+# --- Archive ---
+@bp.route("/api/archive")
+def api_archive():
+    """What each archived year holds; flask archive-year moves a closed year's paid invoices there."""
+    years = ArchivedYear.query.order_by(ArchivedYear.year.desc()).all()
+    return jsonify({"years": [year.to_dict() for year in years]})
+
+
+# --- API: Monthly Revenue (status) ---
+@bp.route("/api/monthly-revenue-status")
+def api_monthly_revenue_status():
+    """
+    Returns paid/unpaid revenue arrays for Jan..Dec for the current year:
+    { labels: ["Jan",...,"Dec"], paid: [0.0,...], unpaid: [0.0,...] }
+    Carries an ETag (hash of the body) and Last-Modified, so polling
+    clients revalidate with a 304 instead of a new body.
+    """
+    labels = [calendar.month_abbr[m] for m in range(1, 13)]
+    paid = [0.0] * 12
+    unpaid = [0.0] * 12
+    year = datetime.now().year
+
+    overview = _revenue_overview(year)
+    for status, values in overview.value["year_monthly"].items():
+        target = paid if status.strip().lower() == "paid" else unpaid
+        for idx, value in enumerate(values):
+            target[idx] += value
+
+    response = jsonify({"labels": labels, "paid": paid, "unpaid": unpaid})
+    response.set_etag(hashlib.sha256(response.get_data()).hexdigest()[:32])
+    response.last_modified = overview.created
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+# --- Edit Invoice ---
+@bp.route("/invoice/<int:invoice_id>/edit", methods=["GET", "POST"])
+def edit_invoice(invoice_id):
+    invoice = get_invoice_with_items(invoice_id)
+    if request.method == "POST":
+        try:
+            before = rollups.snapshot(invoice)
+            invoice.client_name = request.form.get("client_name")
+            invoice.client_email = request.form.get("client_email")
+            invoice.description = request.form.get("description")
+
+            issue_date_str = request.form.get("issue_date")
+            due_date_str = request.form.get("due_date")
+            if issue_date_str:
+                try:
+                    invoice.issue_date = datetime.strptime(issue_date_str, "%Y-%m-%d").date()
+                except ValueError:
+                    pass
+            if due_date_str:
+                try:
+                    invoice.due_date = datetime.strptime(due_date_str, "%Y-%m-%d").date()
+                except ValueError:
+                    pass
+
+            # Apply only the item inserts/updates/deletes the form implies
+            rows = parse_item_rows(request.form)
+            items_changed = sync_items(invoice, rows)
+            if items_changed:
+                invoice.amount_cents = rows_total(rows)
+
+            if items_changed or db.session.is_modified(invoice):
+                rollups.record(before, rollups.snapshot(invoice))
+                search.reindex([invoice.id])
+                db.session.commit()
+                result_cache.clear()
+                pdf_cache.invalidate(invoice.id)
+            return redirect(url_for(".invoice_detail", invoice_id=invoice.id))
+        except Exception as e:
+            db.session.rollback()
+            return f"Error updating invoice: {e}", 500
+
+    return render_template("edit_invoice.html", invoice=invoice)
+
+
+@bp.route("/")
+def intro():
+    return render_template("intro.html")